@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import re
+from typing import Dict, Iterator, List, Any, Tuple
+
+# Every statement the regex fallback recognises, as one pattern. Each alternative starts at the '.'
+# of `page.<method>(` or at an '_' of a `text_fields_*`, `dropdowns_*` or `file_uploads` dict and
+# checks the word before it with a lookbehind, so the regex engine only tries a match at those two
+# characters rather than at every letter a statement could start with. The last group to match
+# names the statement.
+_STATEMENT = re.compile(
+    r'\.(?<=page\.)(?:'
+    r'goto\("(?P<goto>[^"]+)"\)'
+    r'|fill\(f"(?P<fill_selector>[^"]+)",\s*f"(?P<fill>[^"]+)"\)'
+    r'|select_option\(f"(?P<select_selector>[^"]+)",\s*"(?P<select_option>[^"]+)"\)'
+    r'|click\("(?P<click>[^"]+)"\)'
+    r'|hover\("(?P<hover>[^"]+)"\)'
+    r')'
+    r'|_(?:(?<=text_)fields_\w+\s*=\s*\{(?P<text_fields>[^}]+)\}'
+    r'|(?<=dropdowns_)\w+\s*=\s*\{(?P<dropdowns>[^}]+)\}'
+    r'|(?<=file_)uploads\s*=\s*\{(?P<file_uploads>[^}]+)\})'
+)
+
+# "selector": "value" entries of a dict section
+_ENTRY = re.compile(r'"([^"]+)":\s*"([^"]+)"')
+
+# Dict section -> action its entries become
+_SECTIONS = {'text_fields': 'fill', 'dropdowns': 'select_option', 'file_uploads': 'upload'}
+
+# Characters between where a call starts and where _STATEMENT matched it ('page')
+_LEAD = len('page')
+
+# Action -> description, formatted with the selector and value
+DESCRIPTIONS = {
+    'goto': "Navigate to page",
+    'fill': "Fill {0}",
+    'select_option': "Select {1} in {0}",
+    'upload': "Upload file to {0}",
+    'click': "Click {0}",
+    'hover': "Hover {0}",
+}
+
+
+def _statements(source: str) -> Iterator[Tuple[int, str, str, str]]:
+    """(index, action, selector, value) of each statement _STATEMENT finds, in source order"""
+    seen_goto = False
+    for match in _STATEMENT.finditer(source):
+        kind = match.lastgroup
+        if kind in _SECTIONS:
+            action = _SECTIONS[kind]
+            for entry in _ENTRY.finditer(source, match.start(kind), match.end(kind)):
+                yield entry.start(), action, entry.group(1), entry.group(2)
+        elif kind == 'goto':
+            if not seen_goto:
+                seen_goto = True
+                yield match.start() - _LEAD, kind, "", match.group(kind)
+        elif kind == 'fill':
+            yield match.start() - _LEAD, kind, match.group('fill_selector'), match.group(kind)
+        elif kind == 'select_option':
+            yield match.start() - _LEAD, kind, match.group('select_selector'), match.group(kind)
+        else:
+            yield match.start() - _LEAD, kind, match.group(kind), ""
+
+
+def scan_actions(source: str) -> List[Dict[str, Any]]:
+    """Actions found by matching known statement shapes in the source, in source order.
+
+    Recognises the first page.goto("..."), the entries of `text_fields_*`, `dropdowns_*` and
+    `file_uploads` dicts, f-string page.fill/page.select_option calls (as written in loops over
+    those dicts) and page.click/page.hover with a literal selector. The source is walked once;
+    each action has the 1-based `line` and `column` its call (or dict entry) starts at.
+    """
+    actions = []
+    # Lines are counted on from the previous action, so they are found in the same walk over the source
+    line, line_start, counted = 1, 0, 0
+    for index, action, selector, value in _statements(source):
+        newlines = source.count('\n', counted, index)
+        if newlines:
+            line += newlines
+            line_start = source.rindex('\n', counted, index) + 1
+        counted = index
+        actions.append({
+            "action": action,
+            "selector": selector,
+            "value": value,
+            "description": DESCRIPTIONS[action].format(selector, value),
+            "line": line,
+            "column": index - line_start + 1
+        })
+    return actions
+
+
+def base_url(actions: List[Dict[str, Any]]) -> str:
+    """scheme://host of the first goto among the actions, or "" if there is none or it is relative.
+
+    Taken from the extracted actions rather than the source, so the goto the scan (or another
+    engine) already found isn't searched for again.
+    """
+    url = next((action.get('value') for action in actions if action['action'] == 'goto'), "")
+    if isinstance(url, str) and '://' in url:
+        parts = url.split('/')
+        return f"{parts[0]}//{parts[2]}"
+    return ""
@@ -1,140 +1,371 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool
+from typing import Optional, AsyncIterator, Iterator, List
+import asyncio
 import tempfile
 import os
+import time
 from contextlib import asynccontextmanager
 from playwright_to_schema_migrator import PlaywrightToSchemaMigrator
+from async_migrator import AsyncPlaywrightToSchemaMigrator
+from llm_backend import OpenAIBackend
+from job_queue import JobQueue, JOB_STATUSES
+from metrics import metrics, process_memory
+from result_cache import CachedResult, ResultCache
+from schema_model import dumps
+from bulk_migrator import DEFAULT_PATTERNS
+from uploads import RequestSizeLimit, UploadError, archive_kind, iter_archive, read_script
 
 class CodeInput(BaseModel):
     code: str
+    chunk_size: Optional[int] = None
+
+class ScriptInput(BaseModel):
+    code: str
+    name: Optional[str] = None
+
+class JobInput(BaseModel):
+    scripts: List[ScriptInput] = Field(..., min_length=1)
+    # Higher runs first; within a priority, clients take turns
+    priority: int = Field(0, ge=-10, le=10)
+    chunk_size: Optional[int] = None
 
 class MigratorWithOpenAI(PlaywrightToSchemaMigrator):
     def __init__(self, openai_api_key: str):
-        import openai
-        self.client = openai.OpenAI(api_key=openai_api_key)
-    
-    def extract_playwright_actions(self, script_content: str):
-        prompt = f"""
-        Analyze this Playwright test script and extract all the actions in a structured format.
-        
-        Script:
-        {script_content}
-        
-        Extract each action with:
-        1. Action type (goto, fill, click, select_option, upload, hover, etc.)
-        2. Selector (CSS selector, ID, etc.)
-        3. Value (if applicable)
-        4. Description
-        
-        Return as JSON array with format:
-        [
-            {{
-                "action": "goto",
-                "selector": "",
-                "value": "https://example.com/onboarding/complex",
-                "description": "Navigate to onboarding page"
-            }},
-            {{
-                "action": "fill",
-                "selector": "#firstName",
-                "value": "Gul",
-                "description": "Fill first name field"
-            }}
-        ]
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0
-            )
-            
-            content = response.choices[0].message.content
-            json_start = content.find('[')
-            json_end = content.rfind(']') + 1
-            if json_start != -1 and json_end != -1:
-                import json
-                return json.loads(content[json_start:json_end])
-        except:
-            pass
-        
-        return []
+        super().__init__(backend=OpenAIBackend(api_key=openai_api_key))
+
+class AsyncMigratorWithOpenAI(AsyncPlaywrightToSchemaMigrator):
+    def __init__(self, openai_api_key: str):
+        super().__init__(backend=OpenAIBackend(api_key=openai_api_key))
+
+# Seconds without a new step before /migrate/stream sends a progress event
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', '10'))
+# Archive members /migrate/archive migrates at once (and so holds in memory)
+ARCHIVE_CONCURRENCY = int(os.getenv('API_ARCHIVE_CONCURRENCY', '4'))
+# Archive members /jobs/files reads before queueing them
+JOB_SUBMIT_BATCH = 50
+# Seconds shutdown gives running jobs to finish before putting them back in the queue
+DRAIN_TIMEOUT = float(os.getenv('API_DRAIN_TIMEOUT', '30'))
+
+# Gauge name for each process_memory() value
+PROCESS_MEMORY_GAUGES = {
+    'rss': 'process_resident_memory_bytes',
+    'pss': 'process_proportional_memory_bytes',
+    'private': 'process_private_memory_bytes'
+}
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
 
 # Move app initialization after lifespan definition
 
 # Initialize migrator (API key will be set via environment variable)
 migrator = None
+job_queue = None
+# Finished /migrate/text and /migrate/file responses, and the migrations still running for them
+result_cache = ResultCache()
+# When this process started; run_api.py resets it in every worker it forks so startup is measured per worker
+process_started = time.time()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global migrator
+    global migrator, job_queue
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY environment variable is required")
-    migrator = MigratorWithOpenAI(api_key)
+    migrator = AsyncMigratorWithOpenAI(api_key)
+    job_queue = JobQueue(migrator)
+    await job_queue.start()
+    startup = time.time() - process_started
+    metrics.set('process_startup_seconds', startup)
+    memory = _record_process_memory()
+    # One write with its newline, so lines from workers sharing stdout don't run together
+    print(f"Worker {os.getpid()} ready in {startup:.3f}s ("
+          + ", ".join(f"{kind} {value / 2 ** 20:.1f} MiB" for kind, value in memory.items()) + ")\n", end="")
     yield
+    await job_queue.stop(drain=DRAIN_TIMEOUT)
+    await migrator.aclose()
+
+def preload():
+    """Import what the workers would otherwise load on their first request; run_api.py calls this before forking"""
+    OpenAIBackend.preload()
+
+def _record_process_memory() -> dict:
+    memory = process_memory()
+    for kind, value in memory.items():
+        metrics.set(PROCESS_MEMORY_GAUGES[kind], value)
+    return memory
 
 app = FastAPI(title="Playwright to Schema Migrator API", lifespan=lifespan)
+# Bounds every request body (API_MAX_REQUEST_MB); uploads are spooled to disk past 1 MB while parsed
+app.add_middleware(RequestSizeLimit)
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    # Streaming responses are timed until their headers are sent, not until the last event
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    metrics.observe('http_request_seconds', time.perf_counter() - start, method=request.method,
+                    path=getattr(route, 'path', 'unmatched'), status=response.status_code)
+    return response
 
 @app.post("/migrate/text")
-async def migrate_from_text(input_data: CodeInput):
+async def migrate_from_text(input_data: CodeInput, request: Request):
     """Migrate Playwright code from text input"""
-    try:
-        actions = migrator.extract_playwright_actions(input_data.code)
-        
-        if not actions:
-            actions = migrator._manual_parse(input_data.code)
-        
-        schema_steps = []
-        for i, action in enumerate(actions, 1):
-            schema_command = migrator.map_to_schema_command(action)
-            if schema_command:
-                schema_command['order'] = i
-                schema_steps.append(schema_command)
-        
-        schema = [{
-            "steps": schema_steps,
-            "name": "migratedTest",
-            "description": "Migrated from Playwright test",
-            "base_url": migrator._extract_base_url(input_data.code)
-        }]
-        
-        return {"schema": schema}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _migrate(request, input_data.code, input_data.chunk_size)
 
 @app.post("/migrate/file")
-async def migrate_from_file(file: UploadFile = File(...)):
+async def migrate_from_file(request: Request, file: UploadFile = File(...), chunk_size: Optional[int] = Query(None)):
     """Migrate Playwright code from uploaded file"""
+    return await _migrate(request, await _read_upload(file), chunk_size)
+
+async def _read_upload(file: UploadFile) -> str:
+    """The uploaded script, decoded as it is read; 413 past API_MAX_SCRIPT_MB, 400 for archives and non-UTF-8 files"""
+    try:
+        return await read_script(file)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+async def _migrate(request: Request, script_content: str, chunk_size: Optional[int]) -> Response:
+    """Shared by the migrate endpoints: identical requests (same script, chunk size and migrator settings)
+    share one migration while it runs and get the cached response for API_RESULT_CACHE_TTL seconds after.
+
+    The response carries an ETag; a matching If-None-Match gets 304 Not Modified. X-Cache tells
+    whether the body came from the cache (hit), another request's migration (coalesced) or this one (miss).
+    """
+    async def run() -> CachedResult:
+        run = migrator.for_run()
+        schema = dumps(await run.amigrate_content(script_content, chunk_size), compact=True)
+        # The ETag covers the schema only; the stats (timings, cache hits) differ from run to run
+        return CachedResult(b'{"schema":' + schema + b',"stats":' + dumps(run.stats, compact=True) + b'}', schema)
+
+    key = ResultCache.make_key(script_content, chunk_size, migrator.migration_settings())
     try:
-        content = await file.read()
-        script_content = content.decode('utf-8')
-        
-        actions = migrator.extract_playwright_actions(script_content)
-        
-        if not actions:
-            actions = migrator._manual_parse(script_content)
-        
-        schema_steps = []
-        for i, action in enumerate(actions, 1):
-            schema_command = migrator.map_to_schema_command(action)
-            if schema_command:
-                schema_command['order'] = i
-                schema_steps.append(schema_command)
-        
-        schema = [{
-            "steps": schema_steps,
-            "name": "migratedTest",
-            "description": "Migrated from Playwright test",
-            "base_url": migrator._extract_base_url(script_content)
-        }]
-        
-        return {"schema": schema}
-    
+        entry, source = await result_cache.get_or_run(key, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    metrics.inc('api_result_cache_total', outcome=source)
+
+    headers = {"ETag": entry.etag, "X-Cache": source}
+    if _etag_matches(request.headers.get('if-none-match', ''), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix (added by compressing proxies) still matches"""
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+def _stream_format(request: Request, format: Optional[str]) -> str:
+    if format is None:
+        return 'sse' if 'text/event-stream' in request.headers.get('accept', '') else 'ndjson'
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}', expected ndjson or sse")
+    return format
+
+async def _encode_events(script_content: str, chunk_size: Optional[int], format: str) -> AsyncIterator[str]:
+    run = migrator.for_run()
+    try:
+        async for event in run.amigrate_events(script_content, chunk_size, heartbeat=STREAM_HEARTBEAT):
+            yield _encode_event(event, format)
+    except Exception as e:
+        # Headers are already sent, so failures are reported in the stream
+        yield _encode_event({"type": "error", "detail": str(e), "stats": run.stats}, format)
+
+def _encode_event(event: dict, format: str) -> str:
+    data = dumps(event, compact=True).decode('utf-8')
+    if format == 'sse':
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+def _streaming_response(request: Request, script_content: str, chunk_size: Optional[int], format: Optional[str]):
+    format = _stream_format(request, format)
+    return StreamingResponse(
+        _encode_events(script_content, chunk_size, format),
+        media_type=STREAM_FORMATS[format],
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/migrate/stream")
+async def migrate_stream(input_data: CodeInput, request: Request, format: Optional[str] = Query(None)):
+    """Migrate Playwright code from text input, streaming each step as NDJSON or Server-Sent Events"""
+    return _streaming_response(request, input_data.code, input_data.chunk_size, format)
+
+@app.post("/migrate/file/stream")
+async def migrate_file_stream(request: Request, file: UploadFile = File(...), chunk_size: Optional[int] = Query(None),
+                              format: Optional[str] = Query(None)):
+    """Migrate an uploaded Playwright file, streaming each step as NDJSON or Server-Sent Events"""
+    return _streaming_response(request, await _read_upload(file), chunk_size, format)
+
+@app.post("/migrate/archive")
+async def migrate_archive(request: Request, file: UploadFile = File(...), chunk_size: Optional[int] = Query(None),
+                          format: Optional[str] = Query(None), pattern: Optional[List[str]] = Query(None)):
+    """Migrate the test scripts in an uploaded zip or tar archive, streaming one result per script as NDJSON or Server-Sent Events"""
+    format = _stream_format(request, format)
+    if archive_kind(file.file) is None:
+        raise HTTPException(status_code=400, detail=f"{file.filename} is not a zip or tar archive")
+    members = iter_archive(file.file, tuple(pattern or DEFAULT_PATTERNS))
+    return StreamingResponse(
+        _encode_archive_events(members, chunk_size, format),
+        media_type=STREAM_FORMATS[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _encode_archive_events(members: Iterator[dict], chunk_size: Optional[int], format: str) -> AsyncIterator[str]:
+    async for event in _archive_events(members, chunk_size):
+        yield _encode_event(event, format)
+
+async def _archive_events(members: Iterator[dict], chunk_size: Optional[int]) -> AsyncIterator[dict]:
+    """Migrate archive members ARCHIVE_CONCURRENCY at a time and yield each result as it finishes.
+
+    The next member is only read from the archive once a migration slot is free, so however large
+    the archive, at most ARCHIVE_CONCURRENCY scripts are held at once.
+    """
+    start = time.perf_counter()
+    counts = {"scripts": 0, "migrated": 0, "failed": 0}
+
+    async def migrate(member: dict) -> dict:
+        if 'error' in member:
+            return {"type": "error", "name": member['name'], "detail": member['error']}
+        run = migrator.for_run()
+        try:
+            schema = await run.amigrate_content(member['code'], chunk_size)
+        except Exception as e:
+            return {"type": "error", "name": member['name'], "detail": str(e), "stats": run.stats}
+        return {"type": "script", "name": member['name'], "schema": schema, "stats": run.stats}
+
+    def finished(task: asyncio.Future) -> dict:
+        event = task.result()
+        counts["scripts"] += 1
+        counts["migrated" if event['type'] == 'script' else "failed"] += 1
+        return event
+
+    pending = set()
+    try:
+        archive_error = None
+        try:
+            async for member in iterate_in_threadpool(members):
+                pending.add(asyncio.ensure_future(migrate(member)))
+                if len(pending) >= ARCHIVE_CONCURRENCY:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield finished(task)
+        except UploadError as e:
+            # Scripts read before the archive turned out bad or too large are still migrated
+            archive_error = str(e)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield finished(task)
+        if archive_error is not None:
+            yield {"type": "error", "detail": archive_error}
+        yield dict(type="summary", **counts, elapsed=round(time.perf_counter() - start, 3))
+    finally:
+        # The client went away: stop the migrations still running
+        for task in pending:
+            task.cancel()
+
+def _client_id(request: Request) -> str:
+    """Jobs are scheduled fairly per client: the X-Client-Id header, else the caller's address"""
+    return request.headers.get('x-client-id') or (request.client.host if request.client else 'anonymous')
+
+@app.post("/jobs", status_code=202)
+async def submit_jobs(input_data: JobInput, request: Request):
+    """Queue one job per script; returns the batch id and job ids to poll"""
+    scripts = [{"name": script.name, "code": script.code} for script in input_data.scripts]
+    return await job_queue.submit(scripts, _client_id(request), input_data.priority, input_data.chunk_size)
+
+@app.post("/jobs/files", status_code=202)
+async def submit_job_files(request: Request, files: List[UploadFile] = File(...),
+                           priority: int = Query(0, ge=-10, le=10), chunk_size: Optional[int] = Query(None),
+                           pattern: Optional[List[str]] = Query(None)):
+    """Queue one job per uploaded file, or per test script in an uploaded zip or tar archive.
+
+    Archive members are queued as they are read, JOB_SUBMIT_BATCH at a time. Members that are too
+    large or not UTF-8 are listed under `skipped`; an unreadable or oversized archive cancels
+    everything queued by the request.
+    """
+    client = _client_id(request)
+    archives = [file for file in files if archive_kind(file.file) is not None]
+    submitted = {"batch": None, "jobs": [], "skipped": []}
+    scripts = [{"name": file.filename, "code": await _read_upload(file)} for file in files if file not in archives]
+    if scripts:
+        await _queue_scripts(submitted, scripts, client, priority, chunk_size)
+    for file in archives:
+        pending = []
+        try:
+            async for member in iterate_in_threadpool(iter_archive(file.file, tuple(pattern or DEFAULT_PATTERNS))):
+                name = f"{file.filename}/{member['name']}"
+                if 'error' in member:
+                    submitted["skipped"].append({"name": name, "error": member['error']})
+                    continue
+                pending.append({"name": name, "code": member['code']})
+                if len(pending) >= JOB_SUBMIT_BATCH:
+                    await _queue_scripts(submitted, pending, client, priority, chunk_size)
+                    pending = []
+        except UploadError as e:
+            for job_id in submitted["jobs"]:
+                await job_queue.cancel(job_id)
+            raise HTTPException(status_code=e.status_code, detail=f"{file.filename}: {e}")
+        if pending:
+            await _queue_scripts(submitted, pending, client, priority, chunk_size)
+    if not submitted["jobs"]:
+        raise HTTPException(status_code=400, detail="No test scripts in the upload")
+    return submitted
+
+async def _queue_scripts(submitted: dict, scripts: List[dict], client: str, priority: int, chunk_size: Optional[int]):
+    """Queue scripts under the request's batch (a new one the first time)"""
+    queued = await job_queue.submit(scripts, client, priority, chunk_size, batch=submitted["batch"])
+    submitted["batch"] = queued["batch"]
+    submitted["jobs"].extend(queued["jobs"])
+
+@app.get("/jobs")
+async def list_jobs(request: Request, batch: Optional[str] = Query(None), status: Optional[str] = Query(None),
+                    limit: int = Query(100, ge=1, le=1000)):
+    """The calling client's jobs, newest first"""
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status '{status}', expected one of {', '.join(JOB_STATUSES)}")
+    return {"jobs": await job_queue.list(client=_client_id(request), batch=batch, status=status, limit=limit)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}" + (f": {job['error']}" if job['error'] else ""))
+    return {"schema": await job_queue.result(job_id), "stats": job['stats']}
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; finished jobs are left as they are"""
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics of this process: stage and LLM timings, LLM calls, tokens, cache hits, parse failures,
+    fallbacks, startup time and memory. With several workers each scrape is answered by one of them."""
+    _record_process_memory()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,713 @@
+#!/usr/bin/env python3
+
+import ast
+import re
+import string
+from collections import ChainMap
+from typing import Dict, List, Any, Tuple
+
+# Guards against pathological scripts
+MAX_ACTIONS = 20000
+MAX_CALL_DEPTH = 20
+# Statements and loop iterations run before the rest of the script is left to the LLM
+MAX_STEPS = 200000
+# Longest list, tuple or string an expression may build
+MAX_ITEMS = 100000
+# Largest integer (in bits) arithmetic may produce
+MAX_INT_BITS = 4096
+
+# Width and precision of a format spec ('>20', '08.3f') and of a %-format conversion ('%-20.5s')
+_SPEC_SIZES = re.compile(r'(?:.?[<>=^])?[-+ ]?z?#?0?(\d*)[,_]?(?:\.(\d+))?')
+_PERCENT_SIZES = re.compile(r'%(?:\([^)]*\))?[-+ #0]*(\*|\d*)(?:\.(\*|\d*))?')
+
+# Playwright method -> action type emitted by the extractor
+ACTION_METHODS = {
+    'goto': 'goto',
+    'fill': 'fill',
+    'type': 'fill',
+    'press_sequentially': 'fill',
+    'click': 'click',
+    'check': 'click',
+    'uncheck': 'click',
+    'set_checked': 'click',
+    'tap': 'click',
+    'dblclick': 'dblclick',
+    'select_option': 'select_option',
+    'set_input_files': 'upload',
+    'hover': 'hover',
+    'press': 'press',
+    'focus': 'focus',
+    'clear': 'clear',
+    'drag_and_drop': 'drag_and_drop',
+    'wait_for_selector': 'wait_for_selector',
+    'wait_for_url': 'wait_for_url',
+    'wait_for_load_state': 'wait_for_load_state',
+    'wait_for_timeout': 'wait',
+}
+
+# Methods that only take a value (no selector) when called on the page
+PAGE_VALUE_METHODS = {'goto', 'wait_for_url', 'wait_for_load_state', 'wait_for_timeout'}
+
+# Page/locator methods returning a narrower locator
+LOCATOR_METHODS = {
+    'locator', 'frame_locator', 'get_by_role', 'get_by_text', 'get_by_label', 'get_by_placeholder',
+    'get_by_alt_text', 'get_by_title', 'get_by_test_id', 'nth', 'filter', 'first', 'last'
+}
+
+DESCRIPTIONS = {
+    'goto': "Navigate to page",
+    'fill': "Fill {selector}",
+    'click': "Click {selector}",
+    'dblclick': "Double click {selector}",
+    'select_option': "Select {value} in {selector}",
+    'upload': "Upload file to {selector}",
+    'hover': "Hover {selector}",
+    'press': "Press {value}",
+    'focus': "Focus {selector}",
+    'clear': "Clear {selector}",
+    'drag_and_drop': "Drag {selector} to {value}",
+    'wait_for_selector': "Wait for {selector}",
+    'wait_for_url': "Wait for URL {value}",
+    'wait_for_load_state': "Wait for load state {value}",
+    'wait': "Wait {value} ms",
+    'mouse_move': "Move mouse to {value}",
+    'mouse_click': "Click mouse at {value}",
+    'keyboard_type': "Type {value}",
+    'assert': "Assert {selector} {value}",
+}
+
+
+class _Unresolved(Exception):
+    """Raised when an expression can't be evaluated statically"""
+
+
+class _Page:
+    """A Playwright page, frame or browser context"""
+
+
+class _Device:
+    """page.keyboard or page.mouse"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+
+class _Locator:
+    def __init__(self, selector: str):
+        self.selector = selector
+
+    def narrow(self, selector: str) -> '_Locator':
+        return _Locator(f"{self.selector} >> {selector}" if self.selector else selector)
+
+
+class _Expect:
+    """expect(locator_or_page), waiting for its assertion method"""
+
+    def __init__(self, target: Any):
+        self.target = target
+
+
+class _Source:
+    """An argument that couldn't be evaluated, kept as its source text"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+PAGE = _Page()
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, _Source):
+        return value.text
+    return value if isinstance(value, str) else str(value)
+
+
+def _quote(text: Any) -> str:
+    return '"' + str(text).replace('"', '\\"') + '"'
+
+
+def _check_size(value: Any, times: int = 1):
+    """Raise _Unresolved if `times` copies of value are too big to build, e.g. list(range(10**9)) or 'x' * 10**9"""
+    try:
+        size = len(value) * times
+    except TypeError:
+        return
+    except OverflowError:
+        raise _Unresolved()
+    if size > MAX_ITEMS:
+        raise _Unresolved()
+
+
+def _check_sizes(*sizes: str):
+    """Raise _Unresolved if a width or precision read from a format is '*' or pads past MAX_ITEMS"""
+    for size in sizes:
+        if size == '*' or (size and int(size) > MAX_ITEMS):
+            raise _Unresolved()
+
+
+def _check_spec(spec: str):
+    """Raise _Unresolved for a format spec padding to more than MAX_ITEMS characters, e.g. '>300000000'"""
+    _check_sizes(*_SPEC_SIZES.match(spec).groups())
+
+
+def _check_template(template: str):
+    """_check_spec for every replacement field of a str.format template; nested fields aren't followed"""
+    try:
+        fields = list(string.Formatter().parse(template))
+    except ValueError:
+        raise _Unresolved()
+    for _, _, spec, _ in fields:
+        if spec and '{' in spec:
+            raise _Unresolved()
+        _check_spec(spec or '')
+
+
+def _check_result(left: Any, right: Any, op: ast.operator):
+    """Raise _Unresolved if left <op> right would be too big to build"""
+    if isinstance(op, ast.Mult) and isinstance(left, int) and isinstance(right, int):
+        if abs(left).bit_length() + abs(right).bit_length() > MAX_INT_BITS:
+            raise _Unresolved()
+    elif isinstance(op, ast.Mult) and isinstance(right, int):
+        _check_size(left, right)
+    elif isinstance(op, ast.Mult) and isinstance(left, int):
+        _check_size(right, left)
+    elif isinstance(op, ast.Add) and hasattr(left, '__len__') and hasattr(right, '__len__'):
+        if len(left) + len(right) > MAX_ITEMS:
+            raise _Unresolved()
+    elif isinstance(op, ast.Mod) and isinstance(left, str):
+        for sizes in _PERCENT_SIZES.findall(left):
+            _check_sizes(*sizes)
+
+
+def _role_selector(role: str, kwargs: Dict[str, Any]) -> str:
+    attributes = ''.join(f"[{key}={_quote(value)}]" for key, value in kwargs.items() if key in ('name', 'checked', 'pressed', 'level'))
+    return f"role={role}{attributes}"
+
+
+class PlaywrightASTExtractor:
+    """Single-pass static interpreter for Playwright scripts.
+
+    Walks the script in execution order, inlining calls to helper functions defined in the
+    module, resolving dict/list literals and unrolling loops over literal iterables, and
+    emits one action per Playwright call. Statements it can't resolve statically are
+    reported with their source so the caller can hand just those to the LLM.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tree = ast.parse(source)
+        self.functions: Dict[str, ast.FunctionDef] = {}
+        self.globals: Dict[str, Any] = {'__name__': '__main__'}
+        self.actions: List[Dict[str, Any]] = []
+        self.unresolved: List[Dict[str, Any]] = []
+        self._depth = 0
+        self._steps = 0
+        # Line of the statement in a test (or module code) that called the helper being run, 0 outside helpers
+        self._call_line = 0
+        self._action_nodes: Dict[ast.AST, bool] = {}
+
+    def extract(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return (actions, unresolved statements) in execution order"""
+        body = self.tree.body
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.functions[node.name] = node
+
+        env = self.globals
+        tests = [name for name in self.functions if name.startswith('test')]
+        if tests:
+            # Run module-level setup, then each test once (not again from the __main__ block)
+            self._exec_block([node for node in body if not self._is_main_guard(node)], env)
+            for name in tests:
+                self._call_function(self.functions[name], [], {}, env)
+        else:
+            self._exec_block(body, env)
+        return self.actions, self.unresolved
+
+    def _is_main_guard(self, node: ast.stmt) -> bool:
+        return isinstance(node, ast.If) and '__main__' in ast.dump(node.test)
+
+    # ---------- statements ----------
+
+    def _exec_block(self, statements: List[ast.stmt], env: Dict[str, Any]):
+        for position, statement in enumerate(statements):
+            if len(self.actions) >= MAX_ACTIONS:
+                return
+            if self._out_of_steps():
+                # Whatever wasn't run yet goes to the LLM
+                for rest in statements[position:]:
+                    if self._has_actions(rest):
+                        self._mark_unresolved(rest)
+                return
+            if self._exec(statement, env) == 'return':
+                return 'return'
+
+    def _out_of_steps(self) -> bool:
+        self._steps += 1
+        return self._steps > MAX_STEPS
+
+    def _exec(self, node: ast.stmt, env: Dict[str, Any]):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)):
+            return
+        if isinstance(node, ast.Expr):
+            value = node.value.value if isinstance(node.value, ast.Await) else node.value
+            if isinstance(value, ast.Call):
+                self._exec_call(value, node, env)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            self._exec_assign(node, env)
+        elif isinstance(node, (ast.With, ast.AsyncWith)):
+            for item in node.items:
+                if item.optional_vars is not None and isinstance(item.optional_vars, ast.Name):
+                    env.pop(item.optional_vars.id, None)
+            return self._exec_block(node.body, env)
+        elif isinstance(node, ast.Try):
+            result = self._exec_block(node.body, env)
+            self._exec_block(node.finalbody, env)
+            return result
+        elif isinstance(node, ast.If):
+            try:
+                branch = node.body if self._eval(node.test, env) else node.orelse
+            except _Unresolved:
+                # Assume the happy path of an unknown condition
+                branch = node.body
+            return self._exec_block(branch, env)
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            return self._exec_for(node, env)
+        elif isinstance(node, ast.Return):
+            return 'return'
+        elif isinstance(node, ast.AugAssign):
+            try:
+                value = self._eval(ast.BinOp(left=ast.Name(id=node.target.id, ctx=ast.Load()), op=node.op, right=node.value), env)
+                env[node.target.id] = value
+            except (_Unresolved, AttributeError):
+                self._unbind(node.target, env)
+        elif isinstance(node, ast.While) and self._has_actions(node):
+            self._mark_unresolved(node)
+
+    def _exec_assign(self, node: ast.stmt, env: Dict[str, Any]):
+        value_node = node.value
+        if value_node is None:
+            return
+        if isinstance(value_node, ast.Await):
+            value_node = value_node.value
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+
+        if isinstance(value_node, ast.Call) and self._is_side_effect_call(value_node, env):
+            self._exec_call(value_node, node, env)
+            value: Any = None
+        else:
+            try:
+                value = self._eval(value_node, env)
+            except _Unresolved:
+                for target in targets:
+                    self._unbind(target, env)
+                return
+        for target in targets:
+            try:
+                self._bind(target, value, env)
+            except _Unresolved:
+                self._unbind(target, env)
+
+    def _exec_for(self, node: ast.stmt, env: Dict[str, Any]):
+        if not self._has_actions(node):
+            # Nothing to emit, only forget what the loop would have assigned
+            for child in ast.walk(node):
+                if isinstance(child, (ast.For, ast.AsyncFor)):
+                    self._unbind(child.target, env)
+                elif isinstance(child, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+                    for target in child.targets if isinstance(child, ast.Assign) else [child.target]:
+                        self._unbind(target, env)
+            return
+        try:
+            items = iter(self._eval(node.iter, env))
+        except (_Unresolved, TypeError):
+            self._mark_unresolved(node)
+            return
+        actions, unresolved = len(self.actions), len(self.unresolved)
+        for item in items:
+            if len(self.actions) >= MAX_ACTIONS:
+                return
+            if self._out_of_steps():
+                # Hand the whole loop to the LLM rather than the iterations that weren't run
+                del self.actions[actions:], self.unresolved[unresolved:]
+                self._mark_unresolved(node)
+                return
+            try:
+                self._bind(node.target, item, env)
+            except _Unresolved:
+                self._mark_unresolved(node)
+                return
+            if self._exec_block(node.body, env) == 'return':
+                return 'return'
+
+    def _bind(self, target: ast.expr, value: Any, env: Dict[str, Any]):
+        if isinstance(target, ast.Name):
+            env[target.id] = value
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            values = list(value)
+            if len(values) != len(target.elts):
+                raise _Unresolved()
+            for element, element_value in zip(target.elts, values):
+                self._bind(element, element_value, env)
+        else:
+            raise _Unresolved()
+
+    def _unbind(self, target: ast.expr, env: Dict[str, Any]):
+        for node in ast.walk(target):
+            if isinstance(node, ast.Name):
+                env.pop(node.id, None)
+
+    # ---------- calls ----------
+
+    def _is_side_effect_call(self, call: ast.Call, env: Dict[str, Any]) -> bool:
+        """Calls that perform actions rather than compute a value"""
+        func = call.func
+        if isinstance(func, ast.Name):
+            return func.id in self.functions
+        if isinstance(func, ast.Attribute):
+            return func.attr in ACTION_METHODS or func.attr in ('move', 'down', 'up', 'insert_text')
+        return False
+
+    def _exec_call(self, call: ast.Call, statement: ast.stmt, env: Dict[str, Any]):
+        func = call.func
+
+        if isinstance(func, ast.Name) and func.id in self.functions:
+            # Arguments that can't be evaluated are passed as their source text, so only the
+            # statements that actually depend on them become unresolved
+            args = [self._eval_or_source(arg, env) for arg in call.args]
+            kwargs = {kw.arg: self._eval_or_source(kw.value, env) for kw in call.keywords if kw.arg}
+            outermost = not self._call_line
+            if outermost:
+                self._call_line = statement.lineno
+            try:
+                self._call_function(self.functions[func.id], args, kwargs, env)
+            finally:
+                if outermost:
+                    self._call_line = 0
+            return
+
+        if isinstance(func, ast.Attribute):
+            try:
+                receiver = self._eval(func.value, env)
+            except _Unresolved:
+                receiver = None
+            if isinstance(receiver, (_Page, _Locator, _Device, _Expect)):
+                try:
+                    self._emit(receiver, func.attr, call, env)
+                except _Unresolved:
+                    self._mark_unresolved(statement)
+                return
+
+        # Unknown calls only matter if they get hold of the page
+        if self._passes_page(call, env):
+            self._mark_unresolved(statement)
+
+    def _call_function(self, function: ast.FunctionDef, args: List[Any], kwargs: Dict[str, Any], env: Dict[str, Any]):
+        if self._depth >= MAX_CALL_DEPTH:
+            return
+        params = function.args
+        positional = getattr(params, 'posonlyargs', []) + params.args
+        # Locals shadow module globals; assignments stay local
+        local = ChainMap({}, self.globals)
+
+        defaults = params.defaults
+        for param, default in zip(positional[len(positional) - len(defaults):], defaults):
+            local[param.arg] = self._eval_or_source(default, self.globals)
+        for param, default in zip(params.kwonlyargs, params.kw_defaults):
+            if default is not None:
+                local[param.arg] = self._eval_or_source(default, self.globals)
+        for param, value in zip(positional, args):
+            local[param.arg] = value
+        local.update(kwargs)
+
+        self._depth += 1
+        try:
+            self._exec_block(function.body, local)
+        finally:
+            self._depth -= 1
+
+    def _passes_page(self, call: ast.Call, env: Dict[str, Any]) -> bool:
+        for arg in list(call.args) + [kw.value for kw in call.keywords]:
+            try:
+                if isinstance(self._eval(arg, env), (_Page, _Locator)):
+                    return True
+            except _Unresolved:
+                continue
+        return False
+
+    def _emit(self, receiver: Any, method: str, call: ast.Call, env: Dict[str, Any]):
+        args = [self._eval_or_source(arg, env) for arg in call.args]
+        kwargs = {kw.arg: self._eval_or_source(kw.value, env) for kw in call.keywords if kw.arg}
+
+        if isinstance(receiver, _Expect):
+            target = receiver.target
+            selector = target.selector if isinstance(target, _Locator) else ''
+            value = args[0] if args else ''
+            self._add('assert', selector, value, call, description=f"Expect {selector or 'page'} {method}")
+            return
+
+        if isinstance(receiver, _Device):
+            if receiver.kind == 'keyboard' and method in ('press', 'type', 'insert_text'):
+                self._add('press' if method == 'press' else 'keyboard_type', '', args[0] if args else '', call)
+            elif receiver.kind == 'mouse' and method in ('move', 'click', 'dblclick'):
+                position = ','.join(_text(arg) for arg in args[:2])
+                self._add('mouse_move' if method == 'move' else 'mouse_click', '', position, call)
+            return
+
+        action = ACTION_METHODS.get(method)
+        if action is None:
+            return
+
+        if isinstance(receiver, _Locator):
+            selector, rest = receiver.selector, args
+        elif method in PAGE_VALUE_METHODS:
+            selector, rest = '', args
+        else:
+            if not args:
+                raise _Unresolved()
+            selector, rest = args[0], args[1:]
+        if isinstance(selector, _Locator):
+            selector = selector.selector
+        if not isinstance(selector, str):
+            # Without a selector the action is useless, let the LLM look at the statement
+            raise _Unresolved()
+
+        # Runtime values (env vars, fixtures) are kept as the expression that produces them
+        value: Any = rest[0] if rest else ''
+        if method == 'select_option' and not rest:
+            value = kwargs.get('value', kwargs.get('label', kwargs.get('index', '')))
+        elif method in ('goto', 'wait_for_url') and not rest:
+            value = kwargs.get('url', '')
+        elif method == 'fill' and not rest:
+            value = kwargs.get('value', '')
+        elif method == 'drag_and_drop' and isinstance(value, _Locator):
+            value = value.selector
+        if isinstance(value, (list, tuple)):
+            value = value[0] if len(value) == 1 else ','.join(str(item) for item in value)
+        if isinstance(value, (_Page, _Locator, _Device)):
+            raise _Unresolved()
+
+        self._add(action, selector, value, call)
+
+    def _add(self, action: str, selector: str, value: Any, node: ast.AST, description: str = ""):
+        value = _text(value)
+        self.actions.append({
+            "action": action,
+            "selector": selector,
+            "value": value,
+            "description": description or DESCRIPTIONS.get(action, action).format(selector=selector, value=value),
+            # Actions of a helper belong to the statement calling it
+            "line": self._call_line or node.lineno
+        })
+
+    def _mark_unresolved(self, node: ast.stmt):
+        self.unresolved.append({
+            "index": len(self.actions),
+            "line": self._call_line or node.lineno,
+            "source": ast.get_source_segment(self.source, node) or ''
+        })
+
+    def _has_actions(self, node: ast.AST) -> bool:
+        if node not in self._action_nodes:
+            self._action_nodes[node] = any(
+                isinstance(child, ast.Call) and (
+                    (isinstance(child.func, ast.Attribute) and child.func.attr in ACTION_METHODS)
+                    or (isinstance(child.func, ast.Name) and child.func.id in self.functions))
+                for child in ast.walk(node))
+        return self._action_nodes[node]
+
+    # ---------- expressions ----------
+
+    def _eval_or_source(self, node: ast.expr, env: Dict[str, Any]) -> Any:
+        if isinstance(node, ast.Name) and isinstance(env.get(node.id), _Source):
+            return env[node.id]
+        try:
+            return self._eval(node, env)
+        except _Unresolved:
+            return _Source(ast.get_source_segment(self.source, node) or '')
+
+    def _eval(self, node: ast.expr, env: Dict[str, Any]) -> Any:
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in env:
+                if isinstance(env[node.id], _Source):
+                    raise _Unresolved()
+                return env[node.id]
+            if node.id.endswith('page'):
+                # A page obtained in a way we can't follow (fixture, context.pages[0], ...)
+                return PAGE
+            if node.id in ('True', 'False', 'None'):
+                return {'True': True, 'False': False, 'None': None}[node.id]
+            raise _Unresolved()
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for value in node.values:
+                if isinstance(value, ast.Constant):
+                    parts.append(str(value.value))
+                else:
+                    parts.append(self._format(value, env))
+            return ''.join(parts)
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            items = [self._eval(element, env) for element in node.elts]
+            return tuple(items) if isinstance(node, ast.Tuple) else items
+        if isinstance(node, ast.Dict):
+            if any(key is None for key in node.keys):
+                raise _Unresolved()
+            return {self._eval(key, env): self._eval(value, env) for key, value in zip(node.keys, node.values)}
+        if isinstance(node, ast.BinOp):
+            left, right = self._eval(node.left, env), self._eval(node.right, env)
+            _check_result(left, right, node.op)
+            try:
+                if isinstance(node.op, ast.Add):
+                    return left + right
+                if isinstance(node.op, ast.Sub):
+                    return left - right
+                if isinstance(node.op, ast.Mult):
+                    return left * right
+                if isinstance(node.op, ast.Mod):
+                    return left % right
+            except Exception:
+                raise _Unresolved()
+            raise _Unresolved()
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self._eval(node.operand, env)
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.Eq, ast.NotEq)):
+            equal = self._eval(node.left, env) == self._eval(node.comparators[0], env)
+            return equal if isinstance(node.ops[0], ast.Eq) else not equal
+        if isinstance(node, ast.Subscript):
+            container = self._eval(node.value, env)
+            try:
+                return container[self._eval(node.slice, env)]
+            except Exception:
+                raise _Unresolved()
+        if isinstance(node, ast.Attribute):
+            receiver = self._eval(node.value, env)
+            if isinstance(receiver, _Page) and node.attr in ('keyboard', 'mouse'):
+                return _Device(node.attr)
+            if isinstance(receiver, _Page) and node.attr in ('main_frame', 'context'):
+                return receiver
+            if isinstance(receiver, _Locator) and node.attr in ('first', 'last'):
+                return receiver.narrow('nth=0' if node.attr == 'first' else 'nth=-1')
+            raise _Unresolved()
+        if isinstance(node, ast.Await):
+            return self._eval(node.value, env)
+        if isinstance(node, ast.Call):
+            return self._eval_call(node, env)
+        raise _Unresolved()
+
+    def _format(self, node: ast.FormattedValue, env: Dict[str, Any]) -> str:
+        value = self._eval(node.value, env)
+        if node.conversion == ord('r'):
+            value = repr(value)
+        elif node.conversion == ord('s'):
+            value = str(value)
+        spec = self._eval(node.format_spec, env) if node.format_spec is not None else ''
+        _check_spec(spec)
+        try:
+            return format(value, spec)
+        except Exception:
+            raise _Unresolved()
+
+    def _eval_call(self, node: ast.Call, env: Dict[str, Any]) -> Any:
+        func = node.func
+        if isinstance(func, ast.Name):
+            if func.id == 'expect' and node.args:
+                return _Expect(self._eval(node.args[0], env))
+            builtins = {'range': range, 'len': len, 'str': str, 'int': int, 'list': list, 'tuple': tuple,
+                        'enumerate': enumerate, 'zip': zip, 'reversed': reversed, 'sorted': sorted, 'dict': dict}
+            if func.id in builtins:
+                args = [self._eval(arg, env) for arg in node.args]
+                kwargs = {kw.arg: self._eval(kw.value, env) for kw in node.keywords if kw.arg}
+                if func.id != 'len':
+                    # The others copy their arguments into a new list, string or dict
+                    for arg in args:
+                        _check_size(arg)
+                try:
+                    result = builtins[func.id](*args, **kwargs)
+                except Exception:
+                    raise _Unresolved()
+                # Materialize iterators so they can be looped over more than once
+                return list(result) if func.id in ('enumerate', 'zip', 'reversed') else result
+            raise _Unresolved()
+
+        if not isinstance(func, ast.Attribute):
+            raise _Unresolved()
+        method = func.attr
+        if method == 'new_page':
+            return PAGE
+
+        receiver = self._eval(func.value, env)
+        args = [self._eval(arg, env) for arg in node.args]
+        kwargs = {kw.arg: self._eval(kw.value, env) for kw in node.keywords if kw.arg}
+
+        if isinstance(receiver, dict) and method in ('items', 'keys', 'values', 'get'):
+            return list(getattr(receiver, method)(*args)) if method != 'get' else receiver.get(*args)
+        if isinstance(receiver, str) and method in ('format', 'lower', 'upper', 'strip', 'replace', 'join'):
+            self._check_str_call(receiver, method, args)
+            try:
+                return getattr(receiver, method)(*args, **kwargs)
+            except Exception:
+                raise _Unresolved()
+        if isinstance(receiver, (_Page, _Locator)) and method in LOCATOR_METHODS:
+            base = receiver if isinstance(receiver, _Locator) else _Locator('')
+            return base.narrow(self._locator_selector(method, args, kwargs))
+        raise _Unresolved()
+
+    @staticmethod
+    def _check_str_call(receiver: str, method: str, args: List[Any]):
+        """Raise _Unresolved if the str method would build more than MAX_ITEMS characters"""
+        if method == 'format':
+            _check_template(receiver)
+        elif method == 'replace' and len(args) >= 2 and isinstance(args[0], str) and isinstance(args[1], str):
+            # Every occurrence (or, for an empty old, every gap) gets the new text
+            count = receiver.count(args[0]) if args[0] else len(receiver) + 1
+            _check_size(receiver, 1)
+            _check_size(args[1], count)
+        elif method == 'join' and args and isinstance(args[0], (list, tuple)):
+            _check_size(args[0])
+            if len(receiver) * len(args[0]) + sum(len(item) for item in args[0] if isinstance(item, str)) > MAX_ITEMS:
+                raise _Unresolved()
+
+    def _locator_selector(self, method: str, args: List[Any], kwargs: Dict[str, Any]) -> str:
+        first = args[0] if args else ''
+        if isinstance(first, _Locator):
+            first = first.selector
+        if method in ('locator', 'frame_locator'):
+            return str(first)
+        if method == 'get_by_role':
+            return _role_selector(str(first), kwargs)
+        if method == 'get_by_text':
+            return f"text={_quote(first)}"
+        if method == 'get_by_label':
+            return f"label={_quote(first)}"
+        if method == 'get_by_placeholder':
+            return f"[placeholder={_quote(first)}]"
+        if method == 'get_by_alt_text':
+            return f"[alt={_quote(first)}]"
+        if method == 'get_by_title':
+            return f"[title={_quote(first)}]"
+        if method == 'get_by_test_id':
+            return f"[data-testid={_quote(first)}]"
+        if method == 'nth':
+            return f"nth={first}"
+        if method in ('first', 'last'):
+            return 'nth=0' if method == 'first' else 'nth=-1'
+        if method == 'filter':
+            has_text = kwargs.get('has_text')
+            if has_text is None:
+                raise _Unresolved()
+            return f"has-text={_quote(has_text)}"
+        raise _Unresolved()
+
+
+def extract_actions(source: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Statically extract Playwright actions in execution order.
+
+    Returns (actions, unresolved) where each unresolved entry has the `index` in actions at
+    which its statement ran, its `line` and its `source`. Raises SyntaxError for invalid code.
+    """
+    return PlaywrightASTExtractor(source).extract()
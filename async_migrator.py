@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+import asyncio
+import copy
+import time
+from typing import AsyncIterator, Callable, Dict, List, Any, Optional, Tuple
+
+from json_stream import JSONArrayStream
+from metrics import metrics
+from output_schemas import BATCH_MAPPING_SCHEMA, EXTRACTION_SCHEMA, MAPPING_SCHEMA, validate_action
+from playwright_to_schema_migrator import PlaywrightToSchemaMigrator
+from script_chunker import split_script
+
+# Called with (action index, command) as soon as a command is known
+CommandCallback = Callable[[int, Dict[str, Any]], None]
+
+
+class AsyncPlaywrightToSchemaMigrator(PlaywrightToSchemaMigrator):
+    """Migrator whose LLM calls are non-blocking and bounded by the backend's max_concurrency"""
+
+    async def aclose(self):
+        await self.llm.aclose()
+
+    async def _agenerate(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        """Send a prompt to the LLM backend without blocking the event loop"""
+        return await self.llm.agenerate(prompt, schema=schema)
+
+    async def aextract_and_map(self, script_content: str, chunk_size: Optional[int] = None,
+                               reuse: Optional[Dict[str, Dict[str, Any]]] = None,
+                               extracted: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None,
+                               on_command: Optional[CommandCallback] = None
+                               ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Async counterpart of extract_and_map; `extracted` is a precomputed ast_extractor result"""
+        if self.extraction_engine == 'race':
+            with metrics.span('extract'):
+                actions = await self._arace_extraction(script_content, extracted)
+            with metrics.span('map'):
+                return actions, await self.amap_actions(actions, chunk_size, reuse, on_command)
+
+        with metrics.span('extract'):
+            actions, unresolved = extracted if extracted is not None else await self._aextract_ast(script_content)
+            if actions:
+                actions = await self.aextract_actions(script_content, (actions, unresolved))
+        if actions:
+            with metrics.span('map'):
+                return actions, await self.amap_actions(actions, chunk_size, reuse, on_command)
+
+        with metrics.span('extract_map'):
+            actions, commands = await self.amap_action_stream(self.astream_playwright_actions(script_content),
+                                                              chunk_size, reuse, on_command)
+        if not actions:
+            self._count('manual_parses')
+            with metrics.span('extract'):
+                actions = self._manual_parse(script_content)
+            with metrics.span('map'):
+                commands = await self.amap_actions(actions, chunk_size, reuse, on_command)
+        return actions, commands
+
+    async def _aextract_ast(self, script_content: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """_extract_ast run off the event loop, which interpreting a large script would otherwise hold up"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._extract_ast, script_content)
+
+    async def _acache_get(self, key: str) -> Optional[Any]:
+        """_cache_get off the event loop, where a lookup may wait on another process's write to the cache"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._cache_get, key)
+
+    async def _acache_set(self, key: str, kind: str, value: Any):
+        await asyncio.get_running_loop().run_in_executor(None, self.cache.set, key, kind, value)
+
+    async def aextract_actions(self, script_content: str,
+                               extracted: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """Async counterpart of extract_actions, resolving the unresolved statements concurrently.
+
+        `extracted` is a precomputed ast_extractor result, e.g. from a worker process.
+        """
+        if self.extraction_engine == 'race':
+            return await self._arace_extraction(script_content, extracted)
+
+        actions, unresolved = extracted if extracted is not None else await self._aextract_ast(script_content)
+        if actions:
+            resolved = await asyncio.gather(*(self.aextract_playwright_actions(entry['source']) for entry in unresolved))
+            return self._splice_unresolved(actions, unresolved, list(resolved))
+
+        actions = await self.aextract_playwright_actions(script_content)
+        if not actions:
+            self._count('manual_parses')
+            actions = self._manual_parse(script_content)
+        return actions
+
+    async def _arace_extraction(self, script_content: str,
+                                extracted: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None
+                                ) -> List[Dict[str, Any]]:
+        """Async counterpart of _race_extraction; the LLM task is cancelled as soon as it isn't needed"""
+        llm_task = asyncio.ensure_future(self.aextract_playwright_actions(script_content))
+        try:
+            if extracted is None:
+                # Parsing holds the GIL for a while: run it off the loop so the LLM request goes out meanwhile
+                local, complete, manual = await asyncio.get_running_loop().run_in_executor(
+                    None, self._local_extraction, script_content)
+            else:
+                local, complete, manual = self._local_extraction(script_content, extracted)
+            if complete:
+                return self._race_result(local, manual, [])
+            return self._race_result(local, manual, await llm_task)
+        finally:
+            llm_task.cancel()
+
+    async def aextract_playwright_actions(self, script_content: str) -> List[Dict[str, Any]]:
+        return [action async for action in self.astream_playwright_actions(script_content)]
+
+    async def astream_playwright_actions(self, script_content: str) -> AsyncIterator[Dict[str, Any]]:
+        """Async counterpart of stream_playwright_actions"""
+        context, chunks = split_script(script_content, self._extract_chunk_limit(script_content))
+        if len(chunks) == 1:
+            async for action in self._astream_extraction(script_content):
+                yield action
+            return
+
+        tasks = [asyncio.ensure_future(self._aextract_chunk(chunk, context)) for chunk in chunks]
+        try:
+            for task in tasks:
+                for action in await task:
+                    yield action
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _aextract_chunk(self, chunk: str, context: str) -> List[Dict[str, Any]]:
+        return [action async for action in self._astream_extraction(chunk, context)]
+
+    async def _astream_extraction(self, script_content: str, context: str = "") -> AsyncIterator[Dict[str, Any]]:
+        cache_key = self._cache_key('extract', {"context": context, "chunk": script_content} if context else script_content)
+        cached = await self._acache_get(cache_key)
+        if cached is not None:
+            for action in cached:
+                yield action
+            return
+
+        prompt = self._extract_prompt(script_content, context)
+        if prompt is None:
+            for action in self._manual_parse(script_content):
+                yield action
+            return
+
+        self._count('llm_calls')
+        parser = JSONArrayStream()
+        received = False
+        actions: List[Dict[str, Any]] = []
+        async for fragment in self.llm.astream(prompt, schema=EXTRACTION_SCHEMA):
+            received = received or bool(fragment)
+            for action in filter(None, map(validate_action, parser.feed(fragment))):
+                actions.append(action)
+                yield action
+
+        if not actions and received:
+            self._count('parse_failures')
+        if actions and parser.complete:
+            await self._acache_set(cache_key, 'extract', actions)
+
+    async def amap_to_schema_command(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        cache_key = self._cache_key('map', action)
+        cached = await self._acache_get(cache_key)
+        if cached is not None:
+            return self._with_targets(cached, action)
+
+        prompt = self._map_prompt(action)
+        if prompt is None:
+            return self._unmapped(action)
+
+        self._count('llm_calls')
+        with metrics.span('map_call'):
+            content = await self._agenerate(prompt, MAPPING_SCHEMA)
+        command = self._parse_command(content)
+        if command is not None:
+            await self._acache_set(cache_key, 'map', command)
+            return self._with_targets(command, action)
+        if content:
+            self._count('parse_failures')
+
+        return self._unmapped(action)
+
+    async def amap_actions_batch(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        cache_keys = [self._cache_key('map', action) for action in actions]
+        loop = asyncio.get_running_loop()
+        commands: List[Optional[Dict[str, Any]]] = await loop.run_in_executor(
+            None, lambda: [self._cache_get(key) for key in cache_keys])
+
+        missing = [i for i, command in enumerate(commands) if command is None]
+        for group, prompt in self._batch_prompts([actions[i] for i in missing]):
+            indexes = [missing[position] for position in group]
+            content = ""
+            if prompt is not None:
+                self._count('llm_calls')
+                with metrics.span('map_batch_call'):
+                    content = await self._agenerate(prompt, BATCH_MAPPING_SCHEMA)
+            # Caches what the model got right, so it goes off the loop too
+            await loop.run_in_executor(None, self._store_batch, actions, commands, cache_keys, indexes, content)
+
+        return [self._with_targets(command, action) for command, action in zip(commands, actions)]
+
+    async def _amap_group(self, actions: List[Dict[str, Any]], indexes: List[int], chunk_size: int,
+                          commands: List[Dict[str, Any]], on_command: Optional[CommandCallback]):
+        """Map one action (chunk_size <= 1) or one chunk with the LLM and store the results in `commands`"""
+        batch = [actions[i] for i in indexes]
+        if chunk_size <= 1:
+            results = [await self.amap_to_schema_command(batch[0])]
+        else:
+            results = await self.amap_actions_batch(batch)
+        for i, command in zip(indexes, results):
+            commands[i] = command
+            if on_command is not None:
+                on_command(i, command)
+
+    async def amap_actions(self, actions: List[Dict[str, Any]], chunk_size: Optional[int] = None,
+                           reuse: Optional[Dict[str, Dict[str, Any]]] = None,
+                           on_command: Optional[CommandCallback] = None) -> List[Dict[str, Any]]:
+        """Map actions concurrently (per action or per chunk), keeping the input order.
+
+        `on_command(index, command)` is called as soon as each command is known, in completion order.
+        """
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        commands, pending = self._apply_rules(actions, reuse)
+        if on_command is not None:
+            waiting = set(pending)
+            for i, command in enumerate(commands):
+                if i not in waiting:
+                    on_command(i, command)
+
+        size = max(1, chunk_size)
+        groups = [pending[start:start + size] for start in range(0, len(pending), size)]
+        await asyncio.gather(*(self._amap_group(actions, group, chunk_size, commands, on_command) for group in groups))
+        return commands
+
+    async def amap_action_stream(self, action_stream: AsyncIterator[Dict[str, Any]], chunk_size: Optional[int] = None,
+                                 reuse: Optional[Dict[str, Dict[str, Any]]] = None,
+                                 on_command: Optional[CommandCallback] = None
+                                 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Async counterpart of map_action_stream, mapping on tasks while the stream is still producing"""
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        actions: List[Dict[str, Any]] = []
+        commands: List[Dict[str, Any]] = []
+        tasks: List[asyncio.Future] = []
+        chunk: List[int] = []
+
+        async for action in action_stream:
+            actions.append(action)
+            action_commands, pending = self._apply_rules([action], reuse)
+            commands.append(action_commands[0])
+            if not pending:
+                if on_command is not None:
+                    on_command(len(actions) - 1, action_commands[0])
+                continue
+            chunk.append(len(actions) - 1)
+            if len(chunk) >= max(1, chunk_size):
+                tasks.append(asyncio.ensure_future(self._amap_group(actions, chunk, chunk_size, commands, on_command)))
+                chunk = []
+        if chunk:
+            tasks.append(asyncio.ensure_future(self._amap_group(actions, chunk, chunk_size, commands, on_command)))
+
+        await asyncio.gather(*tasks)
+        return actions, commands
+
+    async def amigrate_content(self, script_content: str, chunk_size: Optional[int] = None,
+                               extracted: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """Async counterpart of migrate_content"""
+        actions, commands = await self.aextract_and_map(script_content, chunk_size, extracted=extracted)
+        return self._build_schema(commands, actions)
+
+    async def amigrate_events(self, script_content: str, chunk_size: Optional[int] = None,
+                              heartbeat: float = 10.0) -> AsyncIterator[Dict[str, Any]]:
+        """Migrate while yielding events for streaming clients:
+
+        - {"type": "step", "step": {..., "order": n}, "elapsed": s} as soon as each step is mapped
+          (in completion order; `order` is the step's final position)
+        - {"type": "progress", "steps": n, "elapsed": s} at the start and whenever nothing happened for
+          `heartbeat` seconds, which also keeps proxies from timing the request out
+        - {"type": "summary", "test": {...}, "steps": n, "stats": {...}, "timings": {...}} at the end
+        """
+        start = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+        emitted = 0
+        first_step: Optional[float] = None
+
+        def on_command(index: int, command: Dict[str, Any]):
+            if command:
+                queue.put_nowait(dict(copy.deepcopy(command), order=index + 1))
+
+        def elapsed() -> float:
+            return round(time.perf_counter() - start, 3)
+
+        migration = asyncio.ensure_future(self.aextract_and_map(script_content, chunk_size, on_command=on_command))
+        getter: Optional[asyncio.Future] = None
+        try:
+            yield {"type": "progress", "steps": 0, "elapsed": 0.0}
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, migration}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    step, getter = getter.result(), None
+                elif migration in done:
+                    if queue.empty():
+                        break
+                    step = queue.get_nowait()
+                else:
+                    yield {"type": "progress", "steps": emitted, "elapsed": elapsed()}
+                    continue
+                emitted += 1
+                if first_step is None:
+                    first_step = elapsed()
+                yield {"type": "step", "step": step, "elapsed": elapsed()}
+
+            actions, commands = migration.result()
+            schema = self._build_schema(commands, actions)[0]
+            yield {
+                "type": "summary",
+                "test": {key: value for key, value in schema.items() if key != 'steps'},
+                "actions": len(actions),
+                "steps": len(schema['steps']),
+                "stats": self.stats,
+                "timings": {"first_step": first_step, "total": elapsed()}
+            }
+        finally:
+            # The client went away or the migration failed: stop whatever is still running
+            for future in (getter, migration):
+                if future is not None and not future.done():
+                    future.cancel()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Measure /migrate/text throughput against the fake LLM server at increasing client concurrency"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import FakeLLMServer
+
+SCRIPT = '''
+page.goto("https://example.com/onboarding")
+page.fill("#firstName", "Gul")
+page.select_option("#country", "PK")
+page.click("#submit")
+'''
+
+# Numbers the requests of every level, so no script is posted twice
+_request_ids = itertools.count(1)
+
+
+async def run_level(client, concurrency: int, requests_per_client: int, duplicate: bool) -> dict:
+    latencies = []
+
+    async def worker():
+        for _ in range(requests_per_client):
+            # A distinct comment per request keeps the API's response cache and coalescing out of the measurement
+            code = SCRIPT if duplicate else f"{SCRIPT}# request {next(_request_ids)}\n"
+            start = time.perf_counter()
+            response = await client.post('/migrate/text', json={"code": code})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1)
+    }
+
+
+async def run(levels, requests_per_client: int, latency: float, max_concurrency: int, duplicate: bool) -> list:
+    server = FakeLLMServer(latency=latency).start()
+    os.environ['OPENAI_API_KEY'] = 'fake'
+    os.environ['OPENAI_BASE_URL'] = f"{server.url}/v1"
+    os.environ['LLM_CACHE'] = '0'
+    os.environ['LLM_MAX_CONCURRENCY'] = str(max_concurrency)
+
+    import httpx
+    import api
+
+    results = []
+    try:
+        async with api.lifespan(api.app):
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://migrator', timeout=None) as client:
+                # Warm up lazily created LLM clients so they don't count against the first level
+                (await client.post('/migrate/text', json={"code": SCRIPT})).raise_for_status()
+                for concurrency in levels:
+                    results.append(await run_level(client, concurrency, requests_per_client, duplicate))
+    finally:
+        server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--levels', default='1,2,4,8,16', help="Comma-separated client concurrency levels")
+    parser.add_argument('--requests', type=int, default=4, help="Requests sent by each client")
+    parser.add_argument('--latency', type=float, default=0.05, help="Fake LLM latency in seconds")
+    parser.add_argument('--max-concurrency', type=int, default=32, help="LLM_MAX_CONCURRENCY for the API")
+    parser.add_argument('--duplicate', action='store_true',
+                        help="Post the same script every time, so identical requests are coalesced and cached")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(',')]
+    results = asyncio.run(run(levels, args.requests, args.latency, args.max_concurrency, args.duplicate))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Ollama /api/generate and OpenAI chat completions endpoints"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Returned for every extraction prompt
+CANNED_ACTIONS = [
+    {"action": "goto", "selector": "", "value": "https://example.com/onboarding", "description": "Navigate to onboarding page"},
+    {"action": "fill", "selector": "#firstName", "value": "Gul", "description": "Fill first name field"},
+    {"action": "select_option", "selector": "#country", "value": "PK", "description": "Select country"},
+    {"action": "click", "selector": "#submit", "value": "", "description": "Submit form"},
+]
+
+CANNED_COMMAND = {
+    "command": {
+        "name": "click",
+        "fields": [
+            {"name": "name", "type": "text", "label": "Name", "value": "Click element", "required": True},
+            {"name": "css_path", "type": "text", "label": "CSS Path", "value": "#submit", "required": True}
+        ]
+    }
+}
+
+
+def canned_response(prompt: str, actions: Optional[List[Dict[str, Any]]] = None,
+                    command: Optional[Dict[str, Any]] = None, structured: bool = False) -> str:
+    """Pick a completion that looks like what the real model returns for this kind of prompt.
+
+    With `structured` (the request asked for a JSON schema or JSON mode) lists come wrapped in an
+    object, the only shape structured output allows at the root; otherwise they are bare arrays.
+    """
+    actions = CANNED_ACTIONS if actions is None else actions
+    command = CANNED_COMMAND if command is None else command
+    if 'Analyze this Playwright test script' in prompt:
+        return json.dumps({"actions": actions} if structured else actions)
+    if 'Map each of these Playwright actions' in prompt:
+        count = len(re.findall(r'"index":\s*\d+', prompt))
+        commands = [dict(command, index=i) for i in range(count)]
+        return json.dumps({"commands": commands} if structured else commands)
+    return json.dumps(command)
+
+
+def load_responses(path: str) -> Dict[str, Any]:
+    """Canned responses from a JSON file with optional "actions" (extraction) and "command" (mapping) keys"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under concurrent load
+    request_queue_size = 256
+
+
+class FakeLLMServer:
+    """Threaded HTTP server answering after a fixed latency, recording how many calls it served"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.05, fragment_delay: float = 0.0,
+                 responses: Optional[Dict[str, Any]] = None):
+        self.latency = latency
+        # Streamed completions are sent in fragments this far apart, like tokens from a real model
+        self.fragment_delay = fragment_delay
+        self.responses = responses or {}
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with server._lock:
+                    server.calls += 1
+                time.sleep(server.latency)
+
+                if self.path.rstrip('/').endswith('/api/generate'):
+                    content = server.respond(body.get('prompt', ''), structured='format' in body)
+                    if body.get('stream'):
+                        chunks = [{"model": body.get('model'), "response": fragment, "done": False} for fragment in _fragments(content)]
+                        chunks.append({"model": body.get('model'), "response": "", "done": True})
+                        self._stream('application/x-ndjson', (json.dumps(chunk) + "\n" for chunk in chunks))
+                    else:
+                        self._send({"model": body.get('model'), "response": content, "done": True})
+                elif self.path.rstrip('/').endswith('/chat/completions'):
+                    prompt = "\n".join(m.get('content', '') for m in body.get('messages', []))
+                    content = server.respond(prompt, structured='response_format' in body)
+                    if body.get('stream'):
+                        events = [f"data: {json.dumps(chat_completion_chunk(body.get('model', ''), fragment))}\n\n"
+                                  for fragment in _fragments(content)]
+                        events.append("data: [DONE]\n\n")
+                        self._stream('text/event-stream', events)
+                    else:
+                        self._send(chat_completion(body.get('model', ''), content))
+                else:
+                    self._send({"error": "not found"}, status=404)
+
+            def _send(self, payload: Dict[str, Any], status: int = 200):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, content_type: str, parts):
+                # No Content-Length: the response ends when the connection closes
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.end_headers()
+                try:
+                    for part in parts:
+                        self.wfile.write(part.encode('utf-8'))
+                        self.wfile.flush()
+                        if server.fragment_delay:
+                            time.sleep(server.fragment_delay)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading, e.g. a cancelled extraction
+                    pass
+
+        return Handler
+
+    def respond(self, prompt: str, structured: bool = False) -> str:
+        return canned_response(prompt, self.responses.get('actions'), self.responses.get('command'), structured)
+
+    def start(self) -> 'FakeLLMServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def _fragments(content: str, size: int = 16) -> List[str]:
+    return [content[start:start + size] for start in range(0, len(content), size)]
+
+
+def chat_completion_chunk(model: str, content: str) -> Dict[str, Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    }
+
+
+def chat_completion(model: str, content: str) -> Dict[str, Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama/OpenAI server for benchmarks")
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds to wait before answering")
+    parser.add_argument('--fragment-delay', type=float, default=0.0, help="Seconds between streamed fragments")
+    parser.add_argument('--responses', help="JSON file with canned \"actions\" and/or \"command\" responses")
+    args = parser.parse_args()
+
+    responses = load_responses(args.responses) if args.responses else None
+    server = FakeLLMServer(port=args.port, latency=args.latency, fragment_delay=args.fragment_delay,
+                           responses=responses).start()
+    print(f"Fake LLM server listening on {server.url} (latency {args.latency}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Benchmark migrate_script and the /migrate/text and /migrate/file endpoints on synthetic scripts of increasing size"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import FakeLLMServer, load_responses
+
+# Actions in each generated test function
+ACTIONS_PER_TEST = 10
+
+
+def synthetic_script(actions: int) -> str:
+    """A pytest Playwright script with `actions` actions spread over tests of ACTIONS_PER_TEST.
+
+    Uses module-level data and a helper function like real suites do, so the AST engine and
+    the extraction chunker have something to resolve.
+    """
+    lines = [
+        "from playwright.sync_api import Page",
+        "",
+        'BASE_URL = "https://example.com"',
+        'COUNTRIES = ["PK", "US", "DE"]',
+        "",
+        "def submit(page: Page, button: str):",
+        '    page.click(f"#{button}")',
+        "",
+    ]
+    for test in range((actions + ACTIONS_PER_TEST - 1) // ACTIONS_PER_TEST):
+        count = min(ACTIONS_PER_TEST, actions - test * ACTIONS_PER_TEST)
+        lines.append(f"def test_form_{test}(page: Page):")
+        lines.append(f'    page.goto(f"{{BASE_URL}}/forms/{test}")')
+        for i in range(1, count):
+            kind = i % 4
+            if kind == 1:
+                lines.append(f'    page.fill("#field_{test}_{i}", "value {i}")')
+            elif kind == 2:
+                lines.append(f'    page.select_option("#country_{test}_{i}", COUNTRIES[{i % 3}])')
+            elif kind == 3:
+                lines.append(f'    page.hover("[data-testid=menu-{test}-{i}]")')
+            else:
+                lines.append(f'    submit(page, "next_{test}_{i}")')
+        lines.append("")
+    return "\n".join(lines)
+
+
+def summarize(path: str, actions: int, script: str, latencies: List[float], llm_calls: List[int],
+              peak_bytes: int) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "path": path,
+        "actions": actions,
+        "script_chars": len(script),
+        "runs": len(latencies),
+        "actions_per_sec": round(actions * len(latencies) / total, 1) if total else None,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        # Nearest rank, so a handful of runs still reports the slowest one rather than the median
+        "p95_ms": round(latencies[math.ceil(len(latencies) * 0.95) - 1] * 1000, 1),
+        "llm_calls_per_script": round(sum(llm_calls) / len(llm_calls), 1),
+        "peak_memory_mb": round(peak_bytes / 2 ** 20, 2)
+    }
+
+
+def bench_cli(scripts: Dict[int, str], args: argparse.Namespace, server: FakeLLMServer,
+              workdir: str) -> List[Dict[str, Any]]:
+    from llm_backend import OllamaBackend
+    from llm_cache import LLMCache
+    from playwright_to_schema_migrator import PlaywrightToSchemaMigrator
+
+    migrator = PlaywrightToSchemaMigrator(
+        chunk_size=args.chunk_size, mapping_policy=args.policy, cache=LLMCache(enabled=False),
+        backend=OllamaBackend(url=server.url), workers=args.workers, extraction_engine=args.engine
+    )
+    results = []
+    for actions, script in scripts.items():
+        script_path = os.path.join(workdir, f"test_synthetic_{actions}.py")
+        output_path = os.path.join(workdir, f"schema_{actions}.json")
+        with open(script_path, 'w') as f:
+            f.write(script)
+
+        latencies, llm_calls = [], []
+        tracemalloc.reset_peak()
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                migrator.migrate_script(script_path, output_path, incremental=False)
+            latencies.append(time.perf_counter() - start)
+            llm_calls.append(migrator.stats['llm_calls'])
+        results.append(summarize('cli', actions, script, latencies, llm_calls, tracemalloc.get_traced_memory()[1]))
+    return results
+
+
+async def bench_api(scripts: Dict[int, str], args: argparse.Namespace, server: FakeLLMServer,
+                    workdir: str) -> List[Dict[str, Any]]:
+    os.environ['OPENAI_API_KEY'] = 'fake'
+    os.environ['OPENAI_BASE_URL'] = f"{server.url}/v1"
+    os.environ['JOB_STORE_PATH'] = os.path.join(workdir, 'jobs.sqlite3')
+    # Every run posts the same script; measure the pipeline rather than the response cache
+    os.environ['API_RESULT_CACHE_SIZE'] = '0'
+
+    import httpx
+    import api
+
+    async def post_text(client, script: str):
+        return await client.post('/migrate/text', json={"code": script, "chunk_size": args.chunk_size})
+
+    async def post_file(client, script: str):
+        return await client.post('/migrate/file', params={"chunk_size": args.chunk_size},
+                                 files={"file": ("test_synthetic.py", script.encode('utf-8'), "text/x-python")})
+
+    results = []
+    async with api.lifespan(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://migrator', timeout=None) as client:
+            with contextlib.redirect_stdout(io.StringIO()):
+                # Warm up lazily created LLM clients so they don't count against the first script
+                (await post_text(client, next(iter(scripts.values())))).raise_for_status()
+            for path, post in (('api:/migrate/text', post_text), ('api:/migrate/file', post_file)):
+                for actions, script in scripts.items():
+                    latencies, llm_calls = [], []
+                    tracemalloc.reset_peak()
+                    for _ in range(args.runs):
+                        start = time.perf_counter()
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            response = await post(client, script)
+                        latencies.append(time.perf_counter() - start)
+                        response.raise_for_status()
+                        llm_calls.append(response.json()['stats']['llm_calls'])
+                    results.append(summarize(path, actions, script, latencies, llm_calls,
+                                             tracemalloc.get_traced_memory()[1]))
+    return results
+
+
+def max_rss_mb() -> Optional[float]:
+    """Peak RSS of the benchmark process, None where getrusage isn't available (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10,50,200', help="Comma-separated action counts of the synthetic scripts")
+    parser.add_argument('--runs', type=int, default=3, help="Migrations of each script per path")
+    parser.add_argument('--paths', default='cli,api', help="Which of cli and api to benchmark")
+    parser.add_argument('--latency', type=float, default=0.01, help="Fake LLM latency in seconds")
+    parser.add_argument('--responses', help="JSON file with canned \"actions\" and/or \"command\" responses")
+    parser.add_argument('--engine', default='ast', help="Extraction engine")
+    parser.add_argument('--policy', default='llm-first', help="Mapping policy")
+    parser.add_argument('--chunk-size', type=int, default=0, help="Actions mapped per LLM call")
+    parser.add_argument('--workers', type=int, default=1, help="Mapping workers for the CLI path")
+    parser.add_argument('--output', help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    # The migrator reads its defaults from the environment when it is first imported
+    os.environ['LLM_CACHE'] = '0'
+    os.environ['MAPPING_POLICY'] = args.policy
+    os.environ['EXTRACTION_ENGINE'] = args.engine
+
+    scripts = {int(size): synthetic_script(int(size)) for size in args.sizes.split(',')}
+    paths = args.paths.split(',')
+    responses = load_responses(args.responses) if args.responses else None
+    server = FakeLLMServer(latency=args.latency, responses=responses).start()
+    tracemalloc.start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            if 'cli' in paths:
+                results.extend(bench_cli(scripts, args, server, workdir))
+            if 'api' in paths:
+                results.extend(asyncio.run(bench_api(scripts, args, server, workdir)))
+    finally:
+        tracemalloc.stop()
+        server.stop()
+
+    report = {
+        "settings": {"latency": args.latency, "engine": args.engine, "policy": args.policy,
+                     "chunk_size": args.chunk_size, "workers": args.workers, "runs": args.runs},
+        "results": results,
+        "max_rss_mb": max_rss_mb(),
+        "llm_requests": server.calls
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
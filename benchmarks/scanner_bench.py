@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Compare the single-pass regex fallback scanner with the multi-pass parser it replaced on synthetic
+scripts of increasing size"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from action_scanner import base_url, scan_actions
+
+# Dict entries and page calls in each generated form step
+ACTIONS_PER_STEP = 12
+
+
+def synthetic_script(actions: int) -> str:
+    """A Playwright form test in the shape the regex fallback reads (like sample_scripts/test_2.py):
+    steps of text_fields/dropdowns dicts filled in f-string loops, clicks, hovers and other code."""
+    lines = [
+        "from playwright.sync_api import sync_playwright",
+        "",
+        "def test_onboarding():",
+        "    with sync_playwright() as p:",
+        "        page = p.chromium.launch().new_page()",
+        '        page.goto("https://example.com/onboarding")',
+    ]
+    for step in range(max(1, actions // ACTIONS_PER_STEP)):
+        lines.append(f"        # ---------- STEP {step}: DETAILS ----------")
+        lines.append(f"        text_fields_step{step} = {{")
+        lines.extend(f'            "#field_{step}_{i}": "value {i}",' for i in range(6))
+        lines.append("        }")
+        lines.append(f'        dropdowns_step{step} = {{"#country_{step}": "PK", "#city_{step}": "Karachi"}}')
+        lines.append(f"        for selector, value in text_fields_step{step}.items():")
+        lines.append('            page.fill(f"{selector}", f"{value}")')
+        lines.append(f'        page.select_option(f"#currency_{step}", "PKR")')
+        lines.append("        page.mouse.move(200, 200)")
+        lines.append(f'        page.hover("[data-testid=help-{step}]")')
+        lines.append(f'        expect(page.locator("#step-{step}")).to_be_visible()')
+        lines.append(f'        page.click("#next-step-{step}")')
+    lines.append('        file_uploads = {"#avatar": "/tmp/avatar.png", "#cv": "/tmp/cv.pdf"}')
+    return "\n".join(lines) + "\n"
+
+
+# The parser before the scanner: one re call per statement shape, compiled through re's cache on every call
+_SECTIONS = [(r'text_fields_\w+\s*=\s*{([^}]+)}', 'fill', "Fill {selector}"),
+             (r'dropdowns_\w+\s*=\s*{([^}]+)}', 'select_option', "Select {value} in {selector}"),
+             (r'file_uploads\s*=\s*{([^}]+)}', 'upload', "Upload file to {selector}")]
+_CALLS = [(r'page\.fill\(f"([^"]+)",\s*f"([^"]+)"\)', 'fill', "Fill {selector}"),
+          (r'page\.select_option\(f"([^"]+)",\s*"([^"]+)"\)', 'select_option', "Select {value} in {selector}"),
+          (r'page\.click\("([^"]+)"\)', 'click', "Click {selector}"),
+          (r'page\.hover\("([^"]+)"\)', 'hover', "Hover {selector}")]
+
+
+def multi_pass(script_content: str) -> List[Dict[str, Any]]:
+    actions = []
+    goto_match = re.search(r'page\.goto\("([^"]+)"\)', script_content)
+    if goto_match:
+        actions.append({"action": "goto", "selector": "", "value": goto_match.group(1),
+                        "description": "Navigate to page"})
+    for pattern, action, description in _SECTIONS:
+        for section in re.findall(pattern, script_content, re.DOTALL):
+            for selector, value in re.findall(r'"([^"]+)":\s*"([^"]+)"', section):
+                actions.append({"action": action, "selector": selector, "value": value,
+                                "description": description.format(selector=selector, value=value)})
+    for pattern, action, description in _CALLS:
+        for match in re.findall(pattern, script_content):
+            selector, value = match if isinstance(match, tuple) else (match, "")
+            actions.append({"action": action, "selector": selector, "value": value,
+                            "description": description.format(selector=selector, value=value)})
+    # _extract_base_url matched the goto a second time
+    re.search(r'page\.goto\("([^"]+)"\)', script_content)
+    return actions
+
+
+def single_pass(script_content: str) -> List[Dict[str, Any]]:
+    actions = scan_actions(script_content)
+    # The base URL comes from the goto the scan already found
+    base_url(actions)
+    return actions
+
+
+def _identity(action: Dict[str, Any]) -> str:
+    return json.dumps({key: action[key] for key in ('action', 'selector', 'value', 'description')}, sort_keys=True)
+
+
+def time_parser(parse: Callable[[str], Any], script: str, min_seconds: float) -> Dict[str, Any]:
+    """Parse the script until min_seconds have passed (at least 3 times)"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        parse(script)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if runs >= 3 and elapsed >= min_seconds:
+            break
+    per_parse = elapsed / runs
+    return {
+        "parses": runs,
+        "ms_per_parse": round(per_parse * 1000, 4),
+        "us_per_kb": round(per_parse * 1e6 / (len(script) / 1024), 2)
+    }
+
+
+def bench(actions: int, min_seconds: float) -> Dict[str, Any]:
+    script = synthetic_script(actions)
+    found = single_pass(script)
+    if sorted(map(_identity, found)) != sorted(map(_identity, multi_pass(script))):
+        raise AssertionError(f"The parsers disagree on the {actions}-action script")
+    old = time_parser(multi_pass, script, min_seconds)
+    new = time_parser(single_pass, script, min_seconds)
+    return {
+        "actions": len(found),
+        "script_kb": round(len(script) / 1024, 1),
+        "multi_pass": old,
+        "single_pass": new,
+        "speedup": round(old["ms_per_parse"] / new["ms_per_parse"], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='12,120,1200,12000,120000', help="Comma-separated actions per script")
+    parser.add_argument('--min-seconds', type=float, default=1.0, help="Time each parser for at least this long per size")
+    parser.add_argument('--output', help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    results = [bench(int(size), args.min_seconds) for size in args.sizes.split(',')]
+    report = json.dumps({"python": sys.version.split()[0], "results": results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Start run_api.py with increasing worker counts against the fake LLM server and report startup time,
+per-worker memory, /migrate/text throughput and shutdown time"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_llm_server import FakeLLMServer
+from api_load import run_level
+from metrics import process_memory
+
+LOADED = re.compile(r"Loaded the app in ([\d.]+)s")
+READY = re.compile(r"Worker (\d+) ready in ([\d.]+)s")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory_mib(pids: List[int]) -> Dict[str, float]:
+    """Mean memory of the processes in MiB"""
+    samples = [process_memory(pid) for pid in pids]
+    samples = [sample for sample in samples if sample]
+    if not samples:
+        return {}
+    return {kind: round(sum(sample[kind] for sample in samples) / len(samples) / 2 ** 20, 1) for kind in samples[0]}
+
+
+class Server:
+    """run_api.py in a subprocess, with its output read in the background"""
+
+    def __init__(self, workers: int, port: int, env: Dict[str, str]):
+        self.workers = workers
+        self.start = time.perf_counter()
+        self.process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'run_api.py'), '--workers', str(workers),
+                                         '--host', '127.0.0.1', '--port', str(port)],
+                                        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        self.load_seconds = None
+        self.ready: Dict[int, float] = {}
+        self.ready_seconds = None
+        self._ready = threading.Event()
+        self.output: List[str] = []
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.output.append(line)
+            loaded = LOADED.search(line)
+            if loaded:
+                self.load_seconds = float(loaded.group(1))
+            for ready in READY.finditer(line):
+                self.ready[int(ready.group(1))] = float(ready.group(2))
+                if len(self.ready) == self.workers and self.ready_seconds is None:
+                    self.ready_seconds = time.perf_counter() - self.start
+                    self._ready.set()
+        self._ready.set()
+
+    def wait_ready(self, timeout: float = 60):
+        if not self._ready.wait(timeout) or len(self.ready) < self.workers:
+            self.process.kill()
+            raise RuntimeError("Server didn't start:\n" + "".join(self.output[-20:]))
+
+    def stop(self) -> float:
+        """SIGTERM the server and return the seconds it took to exit"""
+        start = time.perf_counter()
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=120)
+        return time.perf_counter() - start
+
+
+async def load(port: int, levels: List[int], requests_per_client: int) -> List[Dict[str, Any]]:
+    import httpx
+    results = []
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+        for concurrency in levels:
+            results.append(await run_level(client, concurrency, requests_per_client, duplicate=False))
+    return results
+
+
+def bench(workers: int, args: argparse.Namespace, env: Dict[str, str]) -> Dict[str, Any]:
+    port = free_port()
+    server = Server(workers, port, env)
+    try:
+        server.wait_ready()
+        pids = list(server.ready)
+        result = {
+            "workers": workers,
+            "app_load_s": server.load_seconds,
+            "ready_s": round(server.ready_seconds, 3),
+            "worker_startup_ms": round(max(server.ready.values()) * 1000, 1),
+            "supervisor_mib": memory_mib([server.process.pid]),
+            "worker_idle_mib": memory_mib(pids)
+        }
+        result["load"] = asyncio.run(load(port, args.levels, args.requests))
+        result["worker_loaded_mib"] = memory_mib(pids)
+    finally:
+        shutdown = server.stop()
+    result["shutdown_s"] = round(shutdown, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', default='1,2,4', help="Comma-separated worker counts")
+    parser.add_argument('--levels', default='8,32', help="Comma-separated client concurrency levels")
+    parser.add_argument('--requests', type=int, default=8, help="Requests sent by each client")
+    parser.add_argument('--latency', type=float, default=0.05, help="Fake LLM latency in seconds")
+    parser.add_argument('--output', help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(',')]
+
+    llm = FakeLLMServer(latency=args.latency).start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, OPENAI_API_KEY='fake', OPENAI_BASE_URL=f"{llm.url}/v1", LLM_CACHE='0',
+                       API_RESULT_CACHE_SIZE='0', LLM_MAX_CONCURRENCY='32', PYTHONUNBUFFERED='1',
+                       JOB_STORE_PATH=os.path.join(workdir, 'jobs.sqlite3'))
+            results = [bench(int(workers), args, env) for workers in args.workers.split(',')]
+    finally:
+        llm.stop()
+
+    report = json.dumps({"cpus": os.cpu_count(), "results": results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
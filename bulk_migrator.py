@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from ast_extractor import extract_actions
+from async_migrator import AsyncPlaywrightToSchemaMigrator
+from llm_backend import create_backend
+from manifest import MigrationManifest, action_hash, diff_summary
+from metrics import metrics, print_summary as print_metrics_summary
+from playwright_to_schema_migrator import add_migration_arguments, cache_from_args
+from schema_model import dump as dump_json
+
+# Files picked up when a directory is given
+DEFAULT_PATTERNS = ('test_*.py', '*_test.py')
+
+REPORT_NAME = 'migration_report.json'
+MANIFEST_NAME = 'migration_manifest.json'
+DIFF_NAME = 'migration_diff.json'
+
+
+def discover_scripts(targets: List[str], patterns=DEFAULT_PATTERNS) -> List[str]:
+    """Expand directories (recursively, by pattern), globs and plain paths into a sorted list of files"""
+    found = set()
+    for target in targets:
+        if os.path.isdir(target):
+            for pattern in patterns:
+                found.update(glob.glob(os.path.join(target, '**', pattern), recursive=True))
+        elif glob.has_magic(target):
+            found.update(path for path in glob.glob(target, recursive=True) if os.path.isfile(path))
+        elif os.path.isfile(target):
+            found.add(target)
+        else:
+            print(f"Warning: {target} matched no files")
+    return sorted(os.path.normpath(path) for path in found)
+
+
+def parse_script(path: str, engine: str, recorded_sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Read, hash and statically extract one script; runs in a worker process.
+
+    A script whose hash is still `recorded_sha256` comes back `unchanged`, without its content or
+    extraction, so the file is read once whether or not it needs migrating.
+    """
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"path": path, "content": "", "sha256": "", "unchanged": False, "extracted": None,
+                              "error": ""}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        result["sha256"] = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        if result["sha256"] == recorded_sha256:
+            result["unchanged"] = True
+        elif engine in ('ast', 'race'):
+            try:
+                result["extracted"] = extract_actions(content)
+            except SyntaxError:
+                # Left to the LLM, like AsyncPlaywrightToSchemaMigrator._extract_ast does
+                result["extracted"] = ([], [])
+        else:
+            result["extracted"] = ([], [])
+        if not result["unchanged"]:
+            result["content"] = content
+    except (OSError, UnicodeDecodeError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["parse_seconds"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+class BulkMigrator:
+    """Migrates many scripts: static parsing on a process pool, LLM work on the async migrator.
+
+    The backend's max_concurrency bounds LLM requests across all files and `concurrency` bounds
+    how many files are in the LLM stage at once, so results complete steadily instead of all at the end.
+    """
+
+    def __init__(self, migrator: AsyncPlaywrightToSchemaMigrator, output_dir: str = "",
+                 combined_path: str = "", processes: Optional[int] = None, concurrency: int = 4,
+                 chunk_size: Optional[int] = None, force: bool = False, root: str = "", compact: bool = False):
+        self.migrator = migrator
+        self.output_dir = output_dir
+        self.combined_path = combined_path
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = max(1, concurrency)
+        self.chunk_size = chunk_size
+        self.force = force
+        self.root = root
+        # Write schemas without indentation
+        self.compact = compact
+        directory = output_dir or os.path.dirname(combined_path) or '.'
+        self.report_path = os.path.join(directory, REPORT_NAME)
+        self.diff_path = os.path.join(directory, DIFF_NAME)
+        self.manifest = MigrationManifest(os.path.join(directory, MANIFEST_NAME), migrator.migration_settings())
+        if force:
+            self.manifest.files = {}
+        self.diffs: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+
+    def _output_path(self, path: str) -> str:
+        relative = os.path.relpath(path, self.root) if self.root else os.path.basename(path)
+        return os.path.join(self.output_dir, os.path.splitext(relative)[0] + '.json')
+
+    def _schema_name(self, path: str) -> str:
+        relative = os.path.relpath(path, self.root) if self.root else os.path.basename(path)
+        return os.path.splitext(relative)[0].replace(os.sep, '/')
+
+    def _recorded_sha256(self, path: str) -> Optional[str]:
+        """The manifest's hash of a script whose last output is still there, so it can be skipped if it matches"""
+        if self.output_dir and not os.path.exists(self._output_path(path)):
+            return None
+        entry = self.manifest.entry(path)
+        return entry['sha256'] if entry is not None else None
+
+    def _skipped_entry(self, path: str, sha256: str) -> Dict[str, Any]:
+        """Report entry for a script whose manifest entry is still current"""
+        return {
+            "path": path,
+            "sha256": sha256,
+            "status": "skipped",
+            "output": self._output_path(path) if self.output_dir else "",
+            "steps": len(self.manifest.schema(path)[0]["steps"])
+        }
+
+    async def _migrate_parsed(self, parsed: Dict[str, Any], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        path = parsed["path"]
+        entry: Dict[str, Any] = {
+            "path": path,
+            "sha256": parsed["sha256"],
+            "status": "failed",
+            "output": self._output_path(path) if self.output_dir else "",
+            "parse_seconds": parsed["parse_seconds"],
+            "migrate_seconds": 0.0,
+            "error": parsed["error"]
+        }
+        if parsed["error"]:
+            return entry
+        # Parsing ran in a worker process, so its time is recorded here
+        metrics.observe('stage_seconds', parsed["parse_seconds"], stage='parse')
+
+        content = parsed["content"]
+        unresolved = parsed["extracted"][1]
+        async with semaphore:
+            start = time.perf_counter()
+            run = self.migrator.for_run()
+            try:
+                actions, commands = await run.aextract_and_map(content, self.chunk_size,
+                                                               reuse=self.manifest.reusable_commands(path),
+                                                               extracted=parsed["extracted"])
+                schema = run._build_schema(commands, actions)
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+                return entry
+            finally:
+                entry["migrate_seconds"] = round(time.perf_counter() - start, 4)
+
+        schema[0]["name"] = self._schema_name(path)
+        diff = self.manifest.record(path, parsed["sha256"], [action_hash(action) for action in actions], commands, schema)
+        if any(diff.values()):
+            self.diffs[path] = diff
+        if self.output_dir:
+            os.makedirs(os.path.dirname(entry["output"]), exist_ok=True)
+            with metrics.span('serialize'):
+                dump_json(schema, entry["output"], self.compact)
+
+        entry.update({
+            "status": "migrated",
+            "actions": len(actions),
+            "unresolved": len(unresolved),
+            "steps": len(schema[0]["steps"]),
+            **run.stats,
+            "diff": diff_summary(diff)
+        })
+        return entry
+
+    async def _run(self, paths: List[str]) -> List[Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        engine = self.migrator.extraction_engine
+        remaining = iter(paths)
+        entries: List[Dict[str, Any]] = []
+
+        async def process(pool: ProcessPoolExecutor):
+            # Each file is parsed and migrated before the next is taken, so only as many as there are
+            # of these loops are queued on the pool or held in memory at once
+            for path in remaining:
+                parsed = await loop.run_in_executor(pool, parse_script, path, engine, self._recorded_sha256(path))
+                if parsed["unchanged"]:
+                    entry = self._skipped_entry(path, parsed["sha256"])
+                else:
+                    entry = await self._migrate_parsed(parsed, semaphore)
+                entries.append(entry)
+                print(f"[{len(entries)}/{len(paths)}] {entry['status']} {path}"
+                      + (f" ({entry['error']})" if entry.get('error') else f" ({entry.get('steps', 0)} steps)"))
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                # Enough files in flight to keep every parser process and every LLM slot busy
+                await asyncio.gather(*(process(pool) for _ in range(min(len(paths), self.processes + self.concurrency))))
+            return entries
+        finally:
+            # The async HTTP client belongs to this event loop
+            await self.migrator.aclose()
+
+    def migrate(self, paths: List[str]) -> Dict[str, Any]:
+        """Migrate `paths`, skipping scripts unchanged since the manifest was written and re-mapping
+        only new or edited actions in the others, then write the manifest, step diff and report"""
+        start = time.perf_counter()
+        print(f"Migrating {len(paths)} scripts on {self.processes} parser processes, skipping unchanged ones")
+        entries = asyncio.run(self._run(paths)) if paths else []
+        files = sorted(entries, key=lambda entry: entry["path"])
+
+        self.manifest.save()
+        if self.combined_path:
+            self._write_combined(files)
+        dump_json(self.diffs, self.diff_path)
+        report = self._report(files, time.perf_counter() - start)
+        dump_json(report, self.report_path)
+        return report
+
+    def _write_combined(self, files: List[Dict[str, Any]]):
+        schemas = []
+        for entry in files:
+            if entry["status"] != "failed":
+                schemas.extend(self.manifest.schema(entry["path"]))
+        os.makedirs(os.path.dirname(self.combined_path) or '.', exist_ok=True)
+        with metrics.span('serialize'):
+            dump_json(schemas, self.combined_path, self.compact)
+
+    def _report(self, files: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+        counters = ("steps", "llm_calls", "rule_hits", "fallbacks", "manual_parses", "parse_failures", "reused",
+                    "cache_hits", "cache_misses")
+        migrated = [entry for entry in files if entry["status"] == "migrated"]
+        skipped = [entry for entry in files if entry["status"] == "skipped"]
+        summary = {
+            "files": len(files),
+            "migrated": len(migrated),
+            "skipped": len(skipped),
+            "failed": sum(1 for entry in files if entry["status"] == "failed"),
+            "seconds": round(seconds, 3),
+            # The counters cover the migrated files; unchanged files keep the steps of their last run
+            **{name: sum(entry.get(name) or 0 for entry in migrated) for name in counters},
+            "skipped_steps": sum(entry["steps"] for entry in skipped),
+            "diff": {kind: sum(entry["diff"][kind] for entry in migrated) for kind in ("added", "removed", "modified")}
+        }
+        return {"settings": self.migrator.migration_settings(), "summary": summary, "files": files}
+
+
+def print_summary(report: Dict[str, Any], report_path: str):
+    summary = report["summary"]
+    print("\nBulk Migration Summary:")
+    print(f"- Files: {summary['files']} ({summary['migrated']} migrated, {summary['skipped']} unchanged, "
+          f"{summary['failed']} failed) in {summary['seconds']}s")
+    print(f"- Generated {summary['steps']} steps for {summary['migrated']} migrated files, "
+          f"kept {summary['skipped_steps']} steps of {summary['skipped']} unchanged files")
+    print(f"- Rule hits: {summary['rule_hits']}")
+    print(f"- LLM calls: {summary['llm_calls']}")
+    print(f"- Fallback mappings: {summary['fallbacks']}")
+    print(f"- Manual parses: {summary['manual_parses']}")
+    print(f"- Reused from the last run: {summary['reused']} actions")
+    print(f"- Step changes: {summary['diff']['added']} added, {summary['diff']['removed']} removed, "
+          f"{summary['diff']['modified']} modified")
+    for entry in report["files"]:
+        if entry["status"] == "failed":
+            print(f"  FAILED {entry['path']}: {entry['error']}")
+    print(f"- Report saved to: {report_path}")
+    print_metrics_summary(metrics.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate many Playwright scripts to schema format")
+    parser.add_argument('targets', nargs='+', help="Script files, directories or glob patterns")
+    parser.add_argument('--output-dir', default='',
+                        help="Write one schema per script here, mirroring the directory layout")
+    parser.add_argument('--combined', default='',
+                        help="Write every schema into this single JSON file instead")
+    parser.add_argument('--pattern', action='append',
+                        help=f"File pattern used inside directories (default: {', '.join(DEFAULT_PATTERNS)})")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Parser processes (default: CPU count)")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('LLM_MAX_CONCURRENCY', '4')),
+                        help="LLM requests in flight across all scripts")
+    parser.add_argument('--force', action='store_true',
+                        help="Ignore the manifest and migrate every action of every script again")
+    add_migration_arguments(parser)
+    args = parser.parse_args()
+
+    if bool(args.output_dir) == bool(args.combined):
+        parser.error("pass exactly one of --output-dir or --combined")
+
+    paths = discover_scripts(args.targets, tuple(args.pattern or DEFAULT_PATTERNS))
+    if not paths:
+        print("No scripts found")
+        sys.exit(1)
+    # Output files mirror the layout below the deepest directory shared by all scripts
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+
+    migrator = AsyncPlaywrightToSchemaMigrator(
+        chunk_size=args.chunk_size, mapping_policy=args.policy, cache=cache_from_args(args),
+        backend=create_backend(args.backend, max_concurrency=args.concurrency), extraction_engine=args.engine,
+        extract_chunk_chars=args.extract_chunk_chars, prompt_token_budget=args.prompt_budget
+    )
+    bulk = BulkMigrator(migrator, output_dir=args.output_dir, combined_path=args.combined,
+                        processes=args.processes, concurrency=args.concurrency, force=args.force,
+                        root=root, compact=args.compact)
+    report = bulk.migrate(paths)
+    print_summary(report, bulk.report_path)
+    if report["summary"]["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, List, Any, Tuple
+
+from ast_extractor import ACTION_METHODS
+
+# `page.<method>(` in Python or JavaScript source; locator chains and page.keyboard/mouse are not counted
+_PAGE_CALL = re.compile(r'(?<![\w.])page\.(\w+)\s*\(')
+
+
+def page_calls(script_content: str) -> Counter:
+    """Action type -> number of page.* call sites in the script that produce an action of that type"""
+    return Counter(ACTION_METHODS[method] for method in _PAGE_CALL.findall(script_content) if method in ACTION_METHODS)
+
+
+def accounts_for_calls(script_content: str, actions: List[Dict[str, Any]]) -> bool:
+    """Whether a locally extracted action list covers every page.* call site in the script.
+
+    Each call site must have produced at least one action of its type; loops and helpers may
+    produce more. A script without any recognisable call site is never judged complete.
+    """
+    calls = page_calls(script_content)
+    if not calls:
+        return False
+    found = Counter(action.get('action') for action in actions)
+    return all(found[action] >= count for action, count in calls.items())
+
+
+def _key(action: Dict[str, Any]) -> Tuple[Any, Any]:
+    return action.get('action'), action.get('selector') or ''
+
+
+def reconcile(local: List[Dict[str, Any]], llm: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge the local and LLM action lists of the same script, in script order.
+
+    The lists are aligned on (action, selector). Actions found by both keep the local version,
+    whose values come straight from the source; actions only one side found are kept; where
+    the two disagree about a stretch of the script, the side with more actions there wins (the
+    LLM on a tie, since it sees the code the local parsers gave up on).
+    """
+    merged: List[Dict[str, Any]] = []
+    matcher = SequenceMatcher(None, [_key(action) for action in local], [_key(action) for action in llm], autojunk=False)
+    for tag, local_start, local_end, llm_start, llm_end in matcher.get_opcodes():
+        if tag == 'equal' or tag == 'delete':
+            merged.extend(local[local_start:local_end])
+        elif tag == 'insert' or llm_end - llm_start >= local_end - local_start:
+            merged.extend(llm[llm_start:llm_end])
+        else:
+            merged.extend(local[local_start:local_end])
+    return merged
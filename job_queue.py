@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional
+
+from async_migrator import AsyncPlaywrightToSchemaMigrator
+from llm_backend import BACKGROUND, request_priority
+from schema_model import dumps
+
+DEFAULT_JOB_STORE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'schema_migrator', 'jobs.sqlite3')
+DEFAULT_JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# Seconds an idle job worker waits before looking for jobs submitted through other API worker processes
+DEFAULT_JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+# Columns returned by status queries; the script and result can be large and are fetched separately
+_STATUS_COLUMNS = ('id', 'batch', 'client', 'name', 'priority', 'status', 'chunk_size', 'steps', 'stats',
+                   'error', 'created', 'started', 'finished')
+
+
+class JobStore:
+    """SQLite-backed store of migration jobs, so queued work and results survive restarts.
+
+    Several API worker processes can share one store: jobs are claimed in a write transaction and
+    record the pid of the process running them.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = os.path.expanduser(path or os.getenv('JOB_STORE_PATH', DEFAULT_JOB_STORE_PATH))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Other processes may hold the write lock for a moment; wait for it rather than fail
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # Readers don't block the writer (and the other way round) across processes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, batch TEXT NOT NULL, client TEXT NOT NULL, name TEXT NOT NULL, "
+                "priority INTEGER NOT NULL, status TEXT NOT NULL, chunk_size INTEGER, script TEXT NOT NULL, "
+                "result TEXT, steps INTEGER, stats TEXT, error TEXT NOT NULL DEFAULT '', "
+                "created REAL NOT NULL, started REAL, finished REAL, worker INTEGER)"
+            )
+            if 'worker' not in [column[1] for column in self._conn.execute("PRAGMA table_info(jobs)")]:
+                # Stores created before jobs recorded their worker process
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, client, created)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch)")
+            self._conn.commit()
+        return self._conn
+
+    def add(self, scripts: List[Dict[str, str]], client: str, priority: int = 0,
+            chunk_size: Optional[int] = None, batch: Optional[str] = None) -> Dict[str, Any]:
+        """Queue one job per {"name", "code"} script under `batch`, or a new batch id"""
+        batch = batch or uuid.uuid4().hex
+        now = time.time()
+        ids = [uuid.uuid4().hex for _ in scripts]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO jobs (id, batch, client, name, priority, status, chunk_size, script, created) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                [(job_id, batch, client, script.get('name') or f"script_{i + 1}", priority, chunk_size, script['code'], now)
+                 for i, (job_id, script) in enumerate(zip(ids, scripts))]
+            )
+            conn.commit()
+        return {"batch": batch, "jobs": ids}
+
+    def claim_next(self, running: Dict[str, int], last_served: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        """Mark the next job running and return it with its script.
+
+        Higher priority first; within a priority the client with the fewest running jobs, then the one
+        served longest ago, goes next, so a large batch from one client is interleaved with other clients' jobs.
+        """
+        with self._lock:
+            conn = self._connect()
+            # Take the write lock before choosing, so two processes can't claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT MAX(priority) FROM jobs WHERE status = 'queued'").fetchone()
+            if row[0] is None:
+                conn.rollback()
+                return None
+            priority = row[0]
+            clients = [client for (client,) in conn.execute(
+                "SELECT DISTINCT client FROM jobs WHERE status = 'queued' AND priority = ?", (priority,)
+            )]
+            client = min(clients, key=lambda name: (running.get(name, 0), last_served.get(name, 0.0)))
+            job_id, script, chunk_size = conn.execute(
+                "SELECT id, script, chunk_size FROM jobs WHERE status = 'queued' AND priority = ? AND client = ? "
+                "ORDER BY created, rowid LIMIT 1", (priority, client)
+            ).fetchone()
+            conn.execute("UPDATE jobs SET status = 'running', started = ?, worker = ? WHERE id = ?",
+                         (time.time(), os.getpid(), job_id))
+            conn.commit()
+        return {"id": job_id, "client": client, "script": script, "chunk_size": chunk_size}
+
+    def finish(self, job_id: str, status: str, result: Optional[List[Dict[str, Any]]] = None,
+               stats: Optional[Dict[str, int]] = None, error: str = ""):
+        """Record the outcome of a running job; a job cancelled meanwhile by another process stays cancelled"""
+        steps = len(result[0]['steps']) if result else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, steps = ?, stats = ?, error = ?, finished = ? "
+                "WHERE id = ? AND status = 'running'",
+                (status, dumps(result, compact=True).decode('utf-8') if result is not None else None, steps,
+                 json.dumps(stats) if stats is not None else None, error, time.time(), job_id)
+            )
+            conn.commit()
+
+    def requeue(self, job_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE jobs SET status = 'queued', started = NULL, worker = NULL "
+                         "WHERE id = ? AND status = 'running'", (job_id,))
+            conn.commit()
+
+    def requeue_running(self) -> int:
+        """Put jobs whose worker process is gone (it stopped or crashed while running them) back in the queue.
+
+        Jobs running in other live processes sharing the store are left alone. This process hasn't
+        started its workers yet, so jobs recorded under its pid are from an earlier process.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            orphaned = [(job_id,) for job_id, worker in conn.execute("SELECT id, worker FROM jobs WHERE status = 'running'")
+                        if worker is None or worker == os.getpid() or not _process_alive(worker)]
+            conn.executemany("UPDATE jobs SET status = 'queued', started = NULL, worker = NULL WHERE id = ?", orphaned)
+            conn.commit()
+        return len(orphaned)
+
+    def cancel_queued(self, job_id: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            cancelled = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id)
+            ).rowcount
+            conn.commit()
+        return bool(cancelled)
+
+    def cancel_running(self, job_id: str) -> bool:
+        """Mark a job running in another process cancelled; that process discards its result when it finishes"""
+        with self._lock:
+            conn = self._connect()
+            cancelled = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+            ).rowcount
+            conn.commit()
+        return bool(cancelled)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {', '.join(_STATUS_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._status(row) if row else None
+
+    def result(self, job_id: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            row = self._connect().execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def list(self, client: Optional[str] = None, batch: Optional[str] = None, status: Optional[str] = None,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        conditions, params = [], []
+        for column, value in (('client', client), ('batch', batch), ('status', status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {', '.join(_STATUS_COLUMNS)} FROM jobs {where} ORDER BY created DESC, rowid DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [self._status(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATUSES}
+
+    @staticmethod
+    def _status(row) -> Dict[str, Any]:
+        job = dict(zip(_STATUS_COLUMNS, row))
+        job['stats'] = json.loads(job['stats']) if job['stats'] else None
+        return job
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # os.kill() would terminate the process there; Windows runs a single API worker anyway
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """In-process worker pool running queued jobs on the async migrator.
+
+    Job LLM requests are made as BACKGROUND requests, so the backend keeps slots free for interactive
+    /migrate calls however many jobs are queued. Every API worker process runs its own pool on the
+    shared store; idle workers poll it every `poll_interval` seconds for jobs submitted elsewhere.
+
+    Store calls run on a thread of their own: another process holding the SQLite write lock then
+    only holds up the store, not this process's event loop.
+    """
+
+    def __init__(self, migrator: AsyncPlaywrightToSchemaMigrator, store: Optional[JobStore] = None,
+                 workers: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.migrator = migrator
+        self.store = store or JobStore()
+        self.workers = max(1, DEFAULT_JOB_WORKERS if workers is None else workers)
+        self.poll_interval = DEFAULT_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_by_client: Dict[str, int] = {}
+        self._last_served: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        # No new jobs are claimed while draining; running jobs are requeued once stopping
+        self._draining = False
+        self._stopping = False
+        # JobStore serializes its calls on one connection anyway
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-store')
+
+    async def _store_call(self, method: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a JobStore method on the store thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    async def start(self):
+        requeued = await self._store_call(self.store.requeue_running)
+        if requeued:
+            print(f"Requeued {requeued} jobs interrupted by the last shutdown")
+        self._draining = self._stopping = False
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._wakeup.set()
+
+    async def stop(self, drain: float = 0):
+        """Stop the workers, giving running jobs up to `drain` seconds to finish first.
+
+        Jobs still running after that go back to the queue and resume on the next start (or in another
+        API worker process).
+        """
+        self._draining = True
+        self._wakeup.set()
+        if drain > 0 and self._running:
+            await asyncio.wait(list(self._running.values()), timeout=drain)
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._store_call(self.store.close)
+
+    async def submit(self, scripts: List[Dict[str, str]], client: str, priority: int = 0,
+                     chunk_size: Optional[int] = None, batch: Optional[str] = None) -> Dict[str, Any]:
+        submitted = await self._store_call(self.store.add, scripts, client, priority, chunk_size, batch)
+        self._wakeup.set()
+        return submitted
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; returns its status, or None if it doesn't exist"""
+        if await self._store_call(self.store.cancel_queued, job_id):
+            return await self.get(job_id)
+        if job_id in self._running:
+            self._running[job_id].cancel()
+        else:
+            # Running in another API worker process, which keeps going but won't store the result
+            await self._store_call(self.store.cancel_running, job_id)
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._store_call(self.store.get, job_id)
+
+    async def result(self, job_id: str) -> Optional[List[Dict[str, Any]]]:
+        return await self._store_call(self.store.result, job_id)
+
+    async def list(self, client: Optional[str] = None, batch: Optional[str] = None, status: Optional[str] = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+        return await self._store_call(self.store.list, client, batch, status, limit)
+
+    async def _worker(self):
+        # Every LLM request made from this worker (and the tasks it starts) is a background request
+        request_priority.set(BACKGROUND)
+        while not self._draining:
+            # Cleared before claiming, so a submit() while the claim runs on the store thread isn't missed
+            self._wakeup.clear()
+            job = await self._claim_next()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _claim_next(self) -> Optional[Dict[str, Any]]:
+        claim = asyncio.ensure_future(
+            self._store_call(self.store.claim_next, dict(self._running_by_client), dict(self._last_served)))
+        try:
+            return await asyncio.shield(claim)
+        except asyncio.CancelledError:
+            # Stopped while the store thread was claiming: put what it claimed back in the queue
+            job = await claim
+            if job is not None:
+                await self._store_call(self.store.requeue, job['id'])
+            raise
+
+    async def _run(self, job: Dict[str, Any]):
+        client = job['client']
+        self._running_by_client[client] = self._running_by_client.get(client, 0) + 1
+        self._last_served[client] = time.monotonic()
+        run = self.migrator.for_run()
+        task = asyncio.ensure_future(run.amigrate_content(job['script'], job['chunk_size']))
+        self._running[job['id']] = task
+        try:
+            schema = await task
+        except asyncio.CancelledError:
+            if self._stopping:
+                # Shielded: this task is being cancelled, but the job must still go back in the queue
+                await asyncio.shield(self._store_call(self.store.requeue, job['id']))
+                raise
+            await self._store_call(self.store.finish, job['id'], 'cancelled', stats=run.stats)
+        except Exception as e:
+            await self._store_call(self.store.finish, job['id'], 'failed', stats=run.stats, error=f"{type(e).__name__}: {e}")
+        else:
+            await self._store_call(self.store.finish, job['id'], 'done', result=schema, stats=run.stats)
+        finally:
+            del self._running[job['id']]
+            self._running_by_client[client] -= 1
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import json
+from typing import Dict, List, Any, Optional
+
+
+class JSONArrayStream:
+    """Incremental parser for an LLM completion containing a JSON array of objects.
+
+    Text is fed in as it streams; feed() returns every record completed by the new text. Records
+    are the objects in a top-level array (`[{...}, ...]`) or in an array held by a top-level object
+    (`{"actions": [{...}, ...]}`, the shape structured output produces); a top-level object that
+    holds no records is a record itself. Brackets are matched string and escape aware, so prose,
+    code fences and stray brackets around the JSON don't matter, and a truncated completion still
+    keeps every record that finished before the cut.
+    """
+
+    def __init__(self):
+        self.complete = False
+        # Open containers ('{' or '[') of the current top-level value, with the buffer index where
+        # each record candidate started (None for containers that can't be records)
+        self._stack: List[str] = []
+        self._starts: List[Optional[int]] = []
+        self._buffer: List[str] = []
+        self._records = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        objects = []
+        for char in text:
+            if not self._stack:
+                if char in '{[':
+                    self._stack = [char]
+                    self._starts = [0 if char == '{' else None]
+                    self._buffer = [char]
+                    self._records = 0
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                record = char == '{' and self._stack in (['['], ['{', '['])
+                self._stack.append(char)
+                self._starts.append(len(self._buffer) - 1 if record else None)
+            elif char in '}]':
+                self._stack.pop()
+                start = self._starts.pop()
+                if self._stack:
+                    if start is not None:
+                        parsed = self._parse(''.join(self._buffer[start:]))
+                        if parsed is not None:
+                            self._records += 1
+                            objects.append(parsed)
+                    elif char == ']' and self._records and self._stack == ['{']:
+                        # The records array inside a wrapper object closed
+                        self.complete = True
+                elif char == ']':
+                    if self._records:
+                        # The array closed after at least one record: the model finished its answer
+                        self.complete = True
+                elif not self._records:
+                    parsed = self._parse(''.join(self._buffer))
+                    if parsed is not None:
+                        objects.append(parsed)
+        return objects
+
+    @staticmethod
+    def _parse(text: str):
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+
+def parse_objects(content: str) -> List[Dict[str, Any]]:
+    """Every complete record in a (possibly truncated or malformed) completion"""
+    return JSONArrayStream().feed(content)
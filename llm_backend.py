@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+from metrics import metrics
+from prompts import count_tokens
+
+DEFAULT_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '120'))
+DEFAULT_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+DEFAULT_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+DEFAULT_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+DEFAULT_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+DEFAULT_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+# Maximum number of in-flight LLM requests per backend
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+
+BACKENDS = ('ollama', 'openai')
+
+# How completions are constrained when the caller passes an output schema:
+# - schema: to the JSON schema (Ollama `format`, OpenAI `response_format` json_schema)
+# - json: to any JSON object (Ollama `format: "json"`, OpenAI json_object), for servers and models without schema support
+# - off: not at all, the prompt alone asks for JSON
+STRUCTURED_OUTPUT_MODES = ('schema', 'json', 'off')
+DEFAULT_STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', '')
+
+# Request classes for LLM concurrency slots: interactive API calls are served before background jobs
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+# Class of the LLM requests made by the current task; job workers set it to BACKGROUND
+request_priority: ContextVar[str] = ContextVar('llm_request_priority', default=INTERACTIVE)
+
+
+class LLMBackendError(Exception):
+    """A failed LLM request; retryable errors are retried with backoff before being reported"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CircuitBreaker:
+    """Stops calling a backend after repeated failures and lets a single trial call through after a cool-down"""
+
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_THRESHOLD, reset_timeout: float = DEFAULT_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> str:
+        """'call' for an ordinary call, 'trial' for the half-open trial call, '' if the call is rejected"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return 'call'
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return 'trial'
+            return ''
+
+    def release(self, admission: str):
+        """End a call allowed as `admission` that recorded no outcome (cancelled, or an unexpected error).
+
+        The breaker stays as it was; a trial call frees the half-open slot so the next call can be the trial.
+        """
+        if admission == 'trial':
+            with self._lock:
+                self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"LLM backend failed {self.failures} times in a row, "
+                          f"using local parsing for the next {self.reset_timeout:.0f}s")
+                self.opened_at = time.monotonic()
+
+
+class ConcurrencyLimiter:
+    """Async semaphore that gives free slots to interactive requests before background ones and never
+    lets background requests hold more than `background_limit` slots, so queued bulk jobs can't starve
+    interactive callers"""
+
+    def __init__(self, limit: int, background_limit: Optional[int] = None):
+        self.limit = limit
+        self.background_limit = background_limit or max(1, limit - 1)
+        self.active = 0
+        self.background_active = 0
+        self._waiters = {INTERACTIVE: deque(), BACKGROUND: deque()}
+
+    def _can_run(self, priority: str) -> bool:
+        if self.active >= self.limit:
+            return False
+        return priority == INTERACTIVE or self.background_active < self.background_limit
+
+    def _take(self, priority: str):
+        self.active += 1
+        if priority == BACKGROUND:
+            self.background_active += 1
+
+    def _wake(self):
+        for priority in (INTERACTIVE, BACKGROUND):
+            waiters: Deque[asyncio.Future] = self._waiters[priority]
+            while waiters and self._can_run(priority):
+                future = waiters.popleft()
+                if not future.done():
+                    self._take(priority)
+                    future.set_result(None)
+
+    async def acquire(self, priority: str):
+        waiters = self._waiters[priority]
+        # Interactive requests only queue behind each other, background ones behind everybody
+        queued = waiters or (priority == BACKGROUND and self._waiters[INTERACTIVE])
+        if not queued and self._can_run(priority):
+            self._take(priority)
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if future in waiters:
+                    waiters.remove(future)
+            else:
+                # Granted a slot just as the caller was cancelled
+                self.release(priority)
+            raise
+
+    def release(self, priority: str):
+        self.active -= 1
+        if priority == BACKGROUND:
+            self.background_active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        priority = request_priority.get()
+        start = time.perf_counter()
+        await self.acquire(priority)
+        metrics.observe('llm_queue_seconds', time.perf_counter() - start, priority=priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+
+class LLMBackend:
+    """Prompt -> completion transport with timeouts, retries with jittered backoff and a circuit breaker.
+
+    generate()/agenerate() never raise for transport problems: they return "" so callers fall
+    back to _manual_parse/_fallback_mapping, exactly as they do for an unusable completion.
+    """
+
+    name = ''
+
+    def __init__(self, model: str, timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, breaker: Optional[CircuitBreaker] = None,
+                 background_concurrency: Optional[int] = None, structured_output: str = ""):
+        self.model = model
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        self.max_retries = DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = DEFAULT_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = DEFAULT_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+        self.breaker = breaker or CircuitBreaker()
+        if background_concurrency is None and os.getenv('LLM_BACKGROUND_CONCURRENCY'):
+            background_concurrency = int(os.getenv('LLM_BACKGROUND_CONCURRENCY'))
+        self._limiter = ConcurrencyLimiter(self.max_concurrency, background_concurrency)
+        self.structured_output = structured_output or DEFAULT_STRUCTURED_OUTPUT or self._default_structured_output()
+        if self.structured_output not in STRUCTURED_OUTPUT_MODES:
+            raise ValueError(f"Unknown structured output mode '{self.structured_output}', "
+                             f"expected one of {', '.join(STRUCTURED_OUTPUT_MODES)}")
+
+    def _default_structured_output(self) -> str:
+        return 'schema'
+
+    @classmethod
+    def preload(cls):
+        """Import the client libraries the backend loads when first used.
+
+        For a server forking workers: loaded once before the fork, the workers share them instead of
+        each importing its own copy on their first request.
+        """
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, prompt: str, completion: str, start: float, outcome: str):
+        """Count one request with its time (including retries) and token usage"""
+        metrics.inc('llm_requests_total', backend=self.name, outcome=outcome)
+        metrics.observe('llm_request_seconds', time.perf_counter() - start, backend=self.name)
+        metrics.inc('llm_prompt_tokens_total', count_tokens(prompt), backend=self.name)
+        if completion:
+            metrics.inc('llm_completion_tokens_total', count_tokens(completion), backend=self.name)
+
+    def _admit(self) -> str:
+        """The circuit breaker's admission for this request, '' (and counted) if it stops it"""
+        admission = self.breaker.allow()
+        if not admission:
+            metrics.inc('llm_requests_total', backend=self.name, outcome='rejected')
+        return admission
+
+    def generate(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        """Completion text for prompt; `schema` (see output_schemas) constrains it per structured_output"""
+        admission = self._admit()
+        if not admission:
+            return ""
+        try:
+            start = time.perf_counter()
+            for attempt in range(self.max_retries + 1):
+                try:
+                    content = self._request(prompt, schema)
+                    self.breaker.record_success()
+                    self._record(prompt, content, start, 'ok')
+                    return content
+                except LLMBackendError as e:
+                    if not e.retryable or attempt == self.max_retries:
+                        print(f"{self.name} request failed: {e}")
+                        break
+                    time.sleep(self._backoff(attempt))
+            self.breaker.record_failure()
+            self._record(prompt, "", start, 'error')
+            return ""
+        except BaseException:
+            self.breaker.release(admission)
+            raise
+
+    async def agenerate(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        """Async generate, waiting for one of the backend's max_concurrency slots first"""
+        admission = self._admit()
+        if not admission:
+            return ""
+        try:
+            async with self._limiter.slot():
+                start = time.perf_counter()
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        content = await self._arequest(prompt, schema)
+                        self.breaker.record_success()
+                        self._record(prompt, content, start, 'ok')
+                        return content
+                    except LLMBackendError as e:
+                        if not e.retryable or attempt == self.max_retries:
+                            print(f"{self.name} request failed: {e}")
+                            break
+                        await asyncio.sleep(self._backoff(attempt))
+                self._record(prompt, "", start, 'error')
+            self.breaker.record_failure()
+            return ""
+        except BaseException:
+            # Cancelled (or failed unexpectedly) before an outcome, e.g. while waiting for a slot
+            self.breaker.release(admission)
+            raise
+
+    def stream(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield the completion in fragments as the model produces them.
+
+        Failures before the first fragment are retried like generate(); a failure after it ends the
+        stream early, so callers keep whatever was complete by then.
+        """
+        admission = self._admit()
+        if not admission:
+            return
+        try:
+            start = time.perf_counter()
+            fragments = []
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    for fragment in self._stream_request(prompt, schema):
+                        started = True
+                        fragments.append(fragment)
+                        yield fragment
+                    self.breaker.record_success()
+                    self._record(prompt, ''.join(fragments), start, 'ok')
+                    return
+                except LLMBackendError as e:
+                    if started or not e.retryable or attempt == self.max_retries:
+                        print(f"{self.name} request failed: {e}")
+                        break
+                    time.sleep(self._backoff(attempt))
+                except GeneratorExit:
+                    # The caller stopped reading, the backend itself was fine
+                    self.breaker.record_success()
+                    self._record(prompt, ''.join(fragments), start, 'ok')
+                    raise
+            self.breaker.record_failure()
+            self._record(prompt, ''.join(fragments), start, 'error')
+        except BaseException:
+            self.breaker.release(admission)
+            raise
+
+    async def astream(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Async stream(), holding one of the backend's max_concurrency slots until the stream ends"""
+        admission = self._admit()
+        if not admission:
+            return
+        try:
+            async with self._limiter.slot():
+                start = time.perf_counter()
+                fragments = []
+                for attempt in range(self.max_retries + 1):
+                    started = False
+                    try:
+                        async for fragment in self._astream_request(prompt, schema):
+                            started = True
+                            fragments.append(fragment)
+                            yield fragment
+                        self.breaker.record_success()
+                        self._record(prompt, ''.join(fragments), start, 'ok')
+                        return
+                    except LLMBackendError as e:
+                        if started or not e.retryable or attempt == self.max_retries:
+                            print(f"{self.name} request failed: {e}")
+                            break
+                        await asyncio.sleep(self._backoff(attempt))
+                    except GeneratorExit:
+                        self.breaker.record_success()
+                        self._record(prompt, ''.join(fragments), start, 'ok')
+                        raise
+                self._record(prompt, ''.join(fragments), start, 'error')
+            self.breaker.record_failure()
+        except BaseException:
+            self.breaker.release(admission)
+            raise
+
+    def _request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        raise NotImplementedError
+
+    async def _arequest(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        raise NotImplementedError
+
+    def _stream_request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+    def _astream_request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+def _status_error(status_code: int, detail: str) -> LLMBackendError:
+    # Rate limits and server errors are worth retrying, other client errors are not
+    retryable = status_code == 429 or status_code >= 500
+    return LLMBackendError(f"HTTP {status_code}: {detail[:200]}", retryable=retryable)
+
+
+class OllamaBackend(LLMBackend):
+    name = 'ollama'
+
+    def __init__(self, url: str = "", model: str = "", **kwargs):
+        super().__init__(model or os.getenv('OLLAMA_MODEL', 'llama3.2'), **kwargs)
+        self.url = (url or os.getenv('OLLAMA_URL', 'http://localhost:11434')).rstrip('/')
+        self._session = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _payload(self, prompt: str, stream: bool = False, schema: Optional[Dict[str, Any]] = None) -> dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream
+        }
+        if schema is not None and self.structured_output != 'off':
+            payload["format"] = schema["schema"] if self.structured_output == 'schema' else "json"
+        return payload
+
+    @staticmethod
+    def _fragment(line) -> str:
+        """Text of one line of Ollama's NDJSON stream"""
+        try:
+            chunk = json.loads(line)
+        except ValueError:
+            raise LLMBackendError(f"Malformed stream line: {line[:200]!r}", retryable=False)
+        if not isinstance(chunk, dict):
+            raise LLMBackendError(f"Unexpected stream line: {line[:200]!r}", retryable=False)
+        if 'error' in chunk:
+            raise LLMBackendError(str(chunk['error']), retryable=False)
+        return chunk.get('response', '')
+
+    @staticmethod
+    def _completion(body: str) -> str:
+        """Text of a non-streaming /api/generate response body"""
+        try:
+            response = json.loads(body)
+        except ValueError:
+            raise LLMBackendError(f"Malformed response: {body[:200]!r}", retryable=False)
+        if not isinstance(response, dict):
+            raise LLMBackendError(f"Unexpected response: {body[:200]!r}", retryable=False)
+        return response.get('response', '')
+
+    @classmethod
+    def preload(cls):
+        import httpx
+        import requests
+
+    def _get_session(self):
+        # requests (like httpx and openai) is imported when first used, so the API server doesn't load it
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self._lock:
+            if self._session is None:
+                # Keep-alive pool sized for the number of concurrent callers
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                self._session = requests.Session()
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
+
+    def _request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        import requests
+        try:
+            response = self._get_session().post(f"{self.url}/api/generate", json=self._payload(prompt, schema=schema),
+                                             timeout=self.timeout)
+        except requests.RequestException as e:
+            raise LLMBackendError(str(e))
+        if response.status_code != 200:
+            raise _status_error(response.status_code, response.text)
+        return self._completion(response.text)
+
+    def _stream_request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        import requests
+        try:
+            with self._get_session().post(f"{self.url}/api/generate", json=self._payload(prompt, stream=True, schema=schema),
+                                          timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    raise _status_error(response.status_code, response.text)
+                for line in response.iter_lines():
+                    if line:
+                        yield self._fragment(line)
+        except requests.RequestException as e:
+            raise LLMBackendError(str(e))
+
+    def _get_async_client(self):
+        import httpx
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+            )
+        return self._async_client
+
+    async def _arequest(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        import httpx
+        try:
+            response = await self._get_async_client().post(f"{self.url}/api/generate", json=self._payload(prompt, schema=schema))
+        except httpx.HTTPError as e:
+            raise LLMBackendError(str(e) or type(e).__name__)
+        if response.status_code != 200:
+            raise _status_error(response.status_code, response.text)
+        return self._completion(response.text)
+
+    async def _astream_request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        import httpx
+        try:
+            async with self._get_async_client().stream('POST', f"{self.url}/api/generate",
+                                                       json=self._payload(prompt, stream=True, schema=schema)) as response:
+                if response.status_code != 200:
+                    raise _status_error(response.status_code, (await response.aread()).decode('utf-8', 'replace'))
+                async for line in response.aiter_lines():
+                    if line:
+                        yield self._fragment(line)
+        except httpx.HTTPError as e:
+            raise LLMBackendError(str(e) or type(e).__name__)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+class OpenAIBackend(LLMBackend):
+    name = 'openai'
+
+    def __init__(self, api_key: str = "", model: str = "", **kwargs):
+        super().__init__(model or os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'), **kwargs)
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY', '')
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _default_structured_output(self) -> str:
+        # json_schema response formats need gpt-4o-mini or newer; older chat models only have JSON mode
+        return 'json' if self.model.startswith(('gpt-3.5', 'gpt-4-')) or self.model == 'gpt-4' else 'schema'
+
+    @classmethod
+    def preload(cls):
+        import openai
+
+    def _create_args(self, prompt: str, schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        args: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0
+        }
+        if schema is not None and self.structured_output == 'schema':
+            args["response_format"] = {"type": "json_schema", "json_schema": dict(schema, strict=True)}
+        elif schema is not None and self.structured_output == 'json':
+            args["response_format"] = {"type": "json_object"}
+        return args
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                import openai
+                # Retries are handled here so they share the backoff and circuit breaker
+                self._client = openai.OpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+            return self._client
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            import openai
+            self._async_client = openai.AsyncOpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+        return self._async_client
+
+    def _error(self, e: Exception) -> LLMBackendError:
+        status_code = getattr(e, 'status_code', None)
+        if status_code is None:
+            # Connection problems and timeouts
+            return LLMBackendError(str(e) or type(e).__name__)
+        return _status_error(status_code, str(e))
+
+    @staticmethod
+    def _content(response) -> str:
+        """Message text of a chat completion"""
+        try:
+            return response.choices[0].message.content or ""
+        except (AttributeError, IndexError, TypeError):
+            raise LLMBackendError(f"Completion without a message: {str(response)[:200]!r}", retryable=False)
+
+    def _request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        import openai
+        try:
+            response = self._get_client().chat.completions.create(**self._create_args(prompt, schema))
+        except openai.OpenAIError as e:
+            raise self._error(e)
+        return self._content(response)
+
+    async def _arequest(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        import openai
+        try:
+            response = await self._get_async_client().chat.completions.create(**self._create_args(prompt, schema))
+        except openai.OpenAIError as e:
+            raise self._error(e)
+        return self._content(response)
+
+    def _stream_request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        import openai
+        try:
+            for chunk in self._get_client().chat.completions.create(**self._create_args(prompt, schema), stream=True):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.OpenAIError as e:
+            raise self._error(e)
+
+    async def _astream_request(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        import openai
+        try:
+            async for chunk in await self._get_async_client().chat.completions.create(**self._create_args(prompt, schema),
+                                                                                 stream=True):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.OpenAIError as e:
+            raise self._error(e)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+
+def create_backend(name: str = "", **kwargs) -> LLMBackend:
+    """Build the backend named by `name` or the LLM_BACKEND environment variable"""
+    name = name or os.getenv('LLM_BACKEND', 'ollama')
+    if name == 'ollama':
+        return OllamaBackend(**kwargs)
+    if name == 'openai':
+        return OpenAIBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend '{name}', expected one of {', '.join(BACKENDS)}")
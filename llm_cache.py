@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'schema_migrator', 'llm_cache.sqlite3')
+DEFAULT_CACHE_MAX_MB = 256
+# Hits only record their access time in memory; it's written once this many have piled up
+# (or with the next set), so a warm run doesn't commit a transaction per lookup
+TOUCH_BATCH = 256
+
+
+class LLMCache:
+    """Persistent content-addressed cache of LLM results, evicted least-recently-used by total size"""
+
+    def __init__(self, path: str = "", max_bytes: Optional[int] = None, enabled: bool = True):
+        self.path = os.path.expanduser(path or os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('LLM_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._touched: Dict[str, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Every migrator process shares the cache; wait for another's write rather than fail
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # Readers don't block the writer (and the other way round) across processes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(kind: str, payload: Any, model: str, backend: str, prompt_version: str) -> str:
+        """Hash the normalized input together with everything that can change the LLM output"""
+        if isinstance(payload, str):
+            # Line endings and trailing whitespace don't change what the model sees as code
+            normalized = "\n".join(line.rstrip() for line in payload.strip().splitlines())
+        else:
+            normalized = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha256()
+        for part in (kind, backend, model, prompt_version, normalized):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            except sqlite3.OperationalError as e:
+                # The cache only saves LLM calls; a lookup that can't get through is a miss
+                print(f"Warning: LLM cache unavailable: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self._write_touches(conn)
+        return json.loads(row[0])
+
+    def set(self, key: str, kind: str, value: Any):
+        if not self.enabled:
+            return
+        data = json.dumps(value)
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, kind, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, data, len(data), time.time())
+                )
+                # Pending hits go in first so eviction sees them as recently used
+                self._update_touches(conn)
+                self._evict(conn)
+                conn.commit()
+                self._touched.clear()
+            except sqlite3.OperationalError as e:
+                if self._conn is not None:
+                    self._conn.rollback()
+                print(f"Warning: not caching the LLM result: {e}")
+
+    def flush(self):
+        """Write the access times of hits not yet recorded"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._touched:
+                self._write_touches(self._connect())
+
+    def _write_touches(self, conn: sqlite3.Connection):
+        try:
+            self._update_touches(conn)
+            conn.commit()
+            self._touched.clear()
+        except sqlite3.OperationalError as e:
+            # They only order eviction; retrying on every later hit would wait out the timeout each time
+            conn.rollback()
+            self._touched.clear()
+            print(f"Warning: LLM cache access times not saved: {e}")
+
+    def _update_touches(self, conn: sqlite3.Connection):
+        if self._touched:
+            conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?",
+                             [(accessed, key) for key, accessed in self._touched.items()])
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def purge(self):
+        """Remove every cached entry"""
+        with self._lock:
+            conn = self._connect()
+            self._touched.clear()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+            conn.execute("VACUUM")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current size of the cache"""
+        entries, size = 0, 0
+        if self.enabled:
+            self.flush()
+            with self._lock:
+                entries, size = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes
+        }
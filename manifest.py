@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import copy
+import difflib
+import hashlib
+import json
+import os
+from typing import Dict, List, Any, Optional
+
+MANIFEST_VERSION = 1
+
+# Where an action was found in the script, not part of what it does
+POSITION_KEYS = ('line', 'column')
+
+
+def action_hash(action: Dict[str, Any]) -> str:
+    """Identity of an extracted action; its position is ignored so moving code doesn't change it"""
+    payload = {key: value for key, value in action.items() if key not in POSITION_KEYS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+
+
+def manifest_path(output_path: str) -> str:
+    """Manifest kept next to a single-script output, e.g. schema.json -> schema.manifest.json"""
+    return os.path.splitext(output_path)[0] + '.manifest.json'
+
+
+class MigrationManifest:
+    """Per-script record of file hash -> action hashes -> emitted commands from the last migration.
+
+    Each script migrates to one test, so a file entry holds that test's actions in order, each with
+    the command it was mapped to ({} when it was dropped). Entries are only reused when the
+    migration settings (engine, policy, backend, model, prompt version) match.
+    """
+
+    def __init__(self, path: str, settings: Dict[str, Any]):
+        self.path = path
+        self.settings = settings
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: ignoring unreadable manifest {self.path}: {e}")
+            return
+        if data.get('version') != MANIFEST_VERSION or data.get('settings') != self.settings:
+            print("Migration settings changed since the last run, migrating from scratch")
+            return
+        self.files = data.get('files', {})
+
+    @staticmethod
+    def _key(script_path: str) -> str:
+        return os.path.abspath(script_path)
+
+    def entry(self, script_path: str) -> Optional[Dict[str, Any]]:
+        return self.files.get(self._key(script_path))
+
+    def is_unchanged(self, script_path: str, sha256: str) -> bool:
+        entry = self.entry(script_path)
+        return entry is not None and entry['sha256'] == sha256
+
+    def reusable_commands(self, script_path: str) -> Dict[str, Dict[str, Any]]:
+        """Commands from the previous run keyed by action hash, for map_actions(reuse=...)"""
+        entry = self.entry(script_path)
+        if entry is None:
+            return {}
+        return {step['action']: step['command'] for step in entry['steps']}
+
+    def schema(self, script_path: str) -> List[Dict[str, Any]]:
+        """Rebuild the schema emitted for an unchanged script"""
+        entry = self.entry(script_path)
+        return [dict(entry['test'], steps=_numbered(entry['steps']))]
+
+    def record(self, script_path: str, sha256: str, hashes: List[str], commands: List[Dict[str, Any]],
+               schema: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Store the result of migrating a script and return the step diff against the previous run"""
+        previous = self.entry(script_path)
+        steps = [
+            {'action': action, 'command': {key: value for key, value in command.items() if key != 'order'}}
+            for action, command in zip(hashes, copy.deepcopy(commands))
+        ]
+        self.files[self._key(script_path)] = {
+            'sha256': sha256,
+            'test': {key: value for key, value in schema[0].items() if key != 'steps'},
+            'steps': steps
+        }
+        return diff_steps(previous['steps'] if previous else [], steps)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'settings': self.settings, 'files': self.files}, f, indent=2)
+
+
+def _numbered(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Emitted steps with their order, numbered like _build_schema (dropped actions keep their number)"""
+    numbered = []
+    for i, step in enumerate(steps, 1):
+        if step['command']:
+            numbered.append(dict(copy.deepcopy(step['command']), order=i))
+    return numbered
+
+
+def diff_steps(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Added, removed and modified steps, aligning the two runs by action hash so an insertion
+    shows up as one added step rather than every later step being renumbered"""
+    old_steps = [(i, step) for i, step in enumerate(old, 1) if step['command']]
+    new_steps = [(i, step) for i, step in enumerate(new, 1) if step['command']]
+    diff: Dict[str, List[Dict[str, Any]]] = {'added': [], 'removed': [], 'modified': []}
+
+    def added(order: int, step: Dict[str, Any]):
+        diff['added'].append({'order': order, 'step': step['command']})
+
+    def removed(order: int, step: Dict[str, Any]):
+        diff['removed'].append({'previous_order': order, 'step': step['command']})
+
+    def modified(old_order: int, old_step: Dict[str, Any], new_order: int, new_step: Dict[str, Any]):
+        diff['modified'].append({'order': new_order, 'previous_order': old_order,
+                                 'before': old_step['command'], 'after': new_step['command']})
+
+    matcher = difflib.SequenceMatcher(a=[step['action'] for _, step in old_steps],
+                                      b=[step['action'] for _, step in new_steps], autojunk=False)
+    for tag, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        before, after = old_steps[a_start:a_end], new_steps[b_start:b_end]
+        # Edited actions replace the old ones one for one (an edit that maps to the same command
+        # isn't a change to the schema); any surplus was added or removed
+        for (old_order, old_step), (new_order, new_step) in zip(before, after):
+            if old_step['command'] != new_step['command']:
+                modified(old_order, old_step, new_order, new_step)
+        for order, step in after[len(before):]:
+            added(order, step)
+        for order, step in before[len(after):]:
+            removed(order, step)
+    return diff
+
+
+def diff_summary(diff: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+    return {kind: len(entries) for kind, entries in diff.items()}
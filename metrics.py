@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+# Every exported metric name starts with this
+PREFIX = 'migrator_'
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DESCRIPTIONS = {
+    'stage_seconds': "Time spent in each migration stage",
+    'llm_request_seconds': "LLM request time including retries",
+    'llm_queue_seconds': "Time async LLM requests waited for a concurrency slot",
+    'http_request_seconds': "API request handling time",
+    'llm_requests_total': "LLM requests by outcome (ok, error, rejected by the open circuit breaker)",
+    'llm_prompt_tokens_total': "Prompt tokens sent to the LLM",
+    'llm_completion_tokens_total': "Completion tokens received from the LLM",
+    'llm_calls_total': "Extraction and mapping prompts sent (cache misses)",
+    'cache_hits_total': "LLM results served from the cache",
+    'cache_misses_total': "LLM results not found in the cache",
+    'rule_hits_total': "Actions mapped by the deterministic templates under rules-first",
+    'fallbacks_total': "Actions mapped by the fallback templates after the LLM failed",
+    'parse_failures_total': "LLM completions that could not be parsed",
+    'manual_parses_total': "Scripts or chunks extracted with the regex parser",
+    'api_result_cache_total': "/migrate/text and /migrate/file responses by source (hit, coalesced, miss)",
+    'extraction_race_total': "Race engine extractions by where the actions came from (local, llm, merged)",
+    'reused_total': "Actions whose command was reused from the previous run",
+    'actions_total': "Actions extracted from migrated scripts",
+    'steps_total': "Schema steps emitted",
+    'process_startup_seconds': "Seconds from the worker process starting to serving requests",
+    'process_resident_memory_bytes': "Resident memory of the worker process",
+    'process_proportional_memory_bytes': "Resident memory with pages shared with other workers split between them (PSS)",
+    'process_private_memory_bytes': "Resident memory not shared with any other process",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms for one process, rendered in the Prometheus text format.
+
+    Counters are named without the prefix, e.g. inc('llm_calls_total'); histograms are fed with
+    observe() or by timing a block with span().
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        # name -> labels -> [count per bucket..., count, sum]
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: Any):
+        """Set a gauge, e.g. set('process_resident_memory_bytes', rss)"""
+        key = _labels(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, seconds: float, **labels: Any):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += 1
+            values[-1] += seconds
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time a block as one occurrence of a migration stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Sum of a counter over every series matching the given labels"""
+        wanted = set(_labels(labels))
+        with self._lock:
+            return sum(value for key, value in self._counters.get(name, {}).items() if wanted <= set(key))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._gauges.items()):
+                self._header(lines, name, 'gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for key, values in sorted(series.items()):
+                    for bound, count in zip(self.buckets, values):
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, le=_format_value(bound))} {_format_value(count)}")
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, le='+Inf')} {_format_value(values[-2])}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {_format_value(values[-2])}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {values[-1]:.6f}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _header(lines: List[str], name: str, kind: str):
+        if name in DESCRIPTIONS:
+            lines.append(f"# HELP {PREFIX}{name} {DESCRIPTIONS[name]}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals for a CLI report: per-stage and LLM timings, token counts and failure rates"""
+        with self._lock:
+            timings = {}
+            for name in ('stage_seconds', 'llm_request_seconds'):
+                for key, values in self._histograms.get(name, {}).items():
+                    label = dict(key).get('stage') or f"llm {dict(key).get('backend', '')}".strip()
+                    entry = timings.setdefault(label, {"count": 0, "seconds": 0.0})
+                    entry["count"] += int(values[-2])
+                    entry["seconds"] += values[-1]
+        actions = self.counter('actions_total')
+        llm_calls = self.counter('llm_calls_total')
+        return {
+            "timings": {label: {"count": entry["count"], "seconds": round(entry["seconds"], 3),
+                                "mean_ms": round(entry["seconds"] / entry["count"] * 1000, 1) if entry["count"] else 0.0}
+                        for label, entry in timings.items()},
+            "llm_requests": int(self.counter('llm_requests_total')),
+            "llm_errors": int(self.counter('llm_requests_total', outcome='error')),
+            "prompt_tokens": int(self.counter('llm_prompt_tokens_total')),
+            "completion_tokens": int(self.counter('llm_completion_tokens_total')),
+            "parse_failures": int(self.counter('parse_failures_total')),
+            "parse_failure_rate": round(self.counter('parse_failures_total') / llm_calls, 3) if llm_calls else 0.0,
+            "fallback_rate": round(self.counter('fallbacks_total') / actions, 3) if actions else 0.0
+        }
+
+
+def _format_labels(key: Labels, **extra: str) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def print_summary(summary: Dict[str, Any]):
+    """Print a metrics summary under the CLI's migration summary"""
+    print("\nTimings:")
+    for label, entry in summary["timings"].items():
+        print(f"- {label}: {entry['count']} in {entry['seconds']}s (mean {entry['mean_ms']} ms)")
+    print(f"- LLM requests: {summary['llm_requests']} ({summary['llm_errors']} failed), "
+          f"{summary['prompt_tokens']} prompt / {summary['completion_tokens']} completion tokens")
+    print(f"- Parse failures: {summary['parse_failures']} ({summary['parse_failure_rate']:.1%} of LLM calls), "
+          f"fallback rate: {summary['fallback_rate']:.1%}")
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """Memory of a process (this one by default) in bytes: rss, and on Linux pss and private.
+
+    Pre-forked workers share the pages they inherited until they write to them, so their RSS
+    counts the shared app code once per worker; PSS splits shared pages between the processes
+    using them and `private` is what the worker alone costs. Empty where neither /proc nor
+    getrusage is available (Windows).
+    """
+    kilobytes: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid or 'self'}/smaps_rollup") as f:
+            # "Rss:   1444 kB" lines after the address range header
+            for line in f:
+                name, _, value = line.partition(':')
+                if value.endswith('kB\n'):
+                    kilobytes[name] = int(value.split()[0])
+    except OSError:
+        pass
+    if kilobytes:
+        return {"rss": kilobytes.get('Rss', 0) * 1024, "pss": kilobytes.get('Pss', 0) * 1024,
+                "private": (kilobytes.get('Private_Clean', 0) + kilobytes.get('Private_Dirty', 0)) * 1024}
+    if pid is not None and pid != os.getpid():
+        return {}
+    try:
+        import resource
+    except ImportError:
+        # Windows: no smaps_rollup and no getrusage
+        return {}
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"rss": peak if sys.platform == 'darwin' else peak * 1024}
+
+
+# Process-wide registry shared by the migrators, LLM backends and the API
+metrics = Metrics()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+from typing import Dict, Any, Optional
+
+# JSON schemas the LLM output is constrained to, in OpenAI's json_schema form ({"name", "schema"});
+# Ollama takes the "schema" part as its `format`. OpenAI's strict mode needs an object at the root,
+# every property required and no additional properties, so lists are wrapped in an object.
+
+_ACTION = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string"},
+        "selector": {"type": "string"},
+        "value": {"type": "string"},
+        "description": {"type": "string"}
+    },
+    "required": ["action", "selector", "value", "description"],
+    "additionalProperties": False
+}
+
+_COMMAND = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "fields": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "type": {"type": "string"},
+                    "label": {"type": "string"},
+                    "value": {"type": "string"},
+                    "required": {"type": "boolean"}
+                },
+                "required": ["name", "type", "label", "value", "required"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["name", "fields"],
+    "additionalProperties": False
+}
+
+EXTRACTION_SCHEMA = {
+    "name": "playwright_actions",
+    "schema": {
+        "type": "object",
+        "properties": {"actions": {"type": "array", "items": _ACTION}},
+        "required": ["actions"],
+        "additionalProperties": False
+    }
+}
+
+MAPPING_SCHEMA = {
+    "name": "schema_command",
+    "schema": {
+        "type": "object",
+        "properties": {"command": _COMMAND},
+        "required": ["command"],
+        "additionalProperties": False
+    }
+}
+
+BATCH_MAPPING_SCHEMA = {
+    "name": "schema_commands",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "commands": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"index": {"type": "integer"}, "command": _COMMAND},
+                    "required": ["index", "command"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["commands"],
+        "additionalProperties": False
+    }
+}
+
+
+def validate_action(entry: Any) -> Optional[Dict[str, Any]]:
+    """An extracted action with a non-empty action type and string selector/description, or None.
+
+    Missing selectors and descriptions become "" so downstream code can rely on them; the value is
+    kept as the model returned it (mapping treats None and "" differently).
+    """
+    if not isinstance(entry, dict) or not isinstance(entry.get('action'), str) or not entry['action']:
+        return None
+    for key in ('selector', 'description'):
+        if entry.get(key) is None:
+            entry = dict(entry, **{key: ""})
+        elif not isinstance(entry[key], str):
+            return None
+    return entry
+
+
+def validate_command(entry: Any) -> Optional[Dict[str, Any]]:
+    """The {"command": {"name", "fields"}} part of a mapping result, or None if it doesn't have that shape.
+
+    Every field must be an object with a string name; other keys (e.g. an "order" or "index" the
+    model added) are dropped.
+    """
+    command = entry.get('command') if isinstance(entry, dict) else None
+    if not isinstance(command, dict) or not isinstance(command.get('name'), str) or not command['name']:
+        return None
+    fields = command.get('fields')
+    if not isinstance(fields, list) or not all(isinstance(field, dict) and isinstance(field.get('name'), str)
+                                               for field in fields):
+        return None
+    return {"command": command}
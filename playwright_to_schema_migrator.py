@@ -1,444 +1,764 @@
 #!/usr/bin/env python3
 
-import json
+import argparse
+import copy
+import hashlib
 import os
-import re
-import requests
-from typing import Dict, List, Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 from dotenv import load_dotenv
+from schema_registry import SchemaRegistry, default_reference_schemas
+from llm_cache import LLMCache
+from llm_backend import BACKENDS, LLMBackend, OllamaBackend, create_backend
+from ast_extractor import extract_actions
+from action_scanner import base_url, scan_actions
+from manifest import POSITION_KEYS, MigrationManifest, action_hash, diff_summary, manifest_path
+from json_stream import JSONArrayStream, parse_objects
+from script_chunker import split_script
+from extraction_race import accounts_for_calls, reconcile
+from schema_model import FALLBACK_TEMPLATES, TEMPLATES_VERSION, Step, dump as dump_json, selector_targets
+from metrics import metrics, print_summary as print_metrics_summary
+from output_schemas import (BATCH_MAPPING_SCHEMA, EXTRACTION_SCHEMA, MAPPING_SCHEMA, validate_action,
+                            validate_command)
+from prompts import (BATCH_MAP_PROMPT, DEFAULT_PROMPT_TOKEN_BUDGET, EXTRACT_CHUNK_PROMPT, EXTRACT_PROMPT, MAP_PROMPT,
+                     PromptBudgetError, compact_json)
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Number of actions sent to the LLM in a single mapping prompt (0 or 1 = one call per action)
+DEFAULT_CHUNK_SIZE = int(os.getenv('MAPPING_CHUNK_SIZE', '0'))
+
+# Scripts longer than this many characters are extracted in chunks split on function/test
+# boundaries, so each prompt fits the model's context window (0 = never split)
+DEFAULT_EXTRACT_CHUNK_CHARS = int(os.getenv('EXTRACT_CHUNK_CHARS', '6000'))
+
+# Number of mapping LLM calls (single actions or chunks) in flight at once
+DEFAULT_WORKERS = int(os.getenv('MAPPING_WORKERS', '1'))
+
+# How actions are mapped to schema commands:
+# - rules-first: use the deterministic templates and only ask the LLM for unknown or ambiguous actions
+# - llm-first: ask the LLM for every action and fall back to the templates on failure
+# - llm-only: ask the LLM for every action and drop actions it cannot map
+MAPPING_POLICIES = ('rules-first', 'llm-first', 'llm-only')
+DEFAULT_MAPPING_POLICY = os.getenv('MAPPING_POLICY', 'llm-first')
+
+# Action types with an exact template in _fallback_mapping
+RULE_ACTIONS = tuple(FALLBACK_TEMPLATES)
+
+# How actions are extracted from the script:
+# - ast: walk the Python syntax tree and only ask the LLM about statements it cannot resolve
+# - llm: ask the LLM for the whole script and fall back to _manual_parse
+# - race: run the local parsers (ast, else _manual_parse) while the LLM extracts the whole script; the
+#   local result is used at once, cancelling the LLM, if it accounts for every page call, otherwise the two are reconciled
+EXTRACTION_ENGINES = ('ast', 'llm', 'race')
+DEFAULT_EXTRACTION_ENGINE = os.getenv('EXTRACTION_ENGINE', 'ast')
+
 class PlaywrightToSchemaMigrator:
-    def __init__(self, ollama_url: str = ""):
-        self.ollama_url = ollama_url or os.getenv('OLLAMA_URL', 'http://localhost:11434')
-        
-    def extract_playwright_actions(self, script_content: str) -> List[Dict[str, Any]]:
-        """Extract actions from Playwright script using OLLAMA"""
-        
-        prompt = f"""
-        Analyze this Playwright test script and extract all the actions in a structured format.
-        
-        Script:
-        {script_content}
-        
-        Extract each action with:
-        1. Action type (goto, fill, click, select_option, upload, hover, etc.)
-        2. Selector (CSS selector, ID, etc.)
-        3. Value (if applicable)
-        4. Description
-        
-        Return as JSON array with format:
-        [
-            {{
-                "action": "goto",
-                "selector": "",
-                "value": "https://example.com/onboarding/complex",
-                "description": "Navigate to onboarding page"
-            }},
-            {{
-                "action": "fill",
-                "selector": "#firstName",
-                "value": "Gul",
-                "description": "Fill first name field"
-            }}
-        ]
+    def __init__(self, ollama_url: str = "", chunk_size: Optional[int] = None, mapping_policy: str = "",
+                 reference_schemas: Optional[Dict[str, str]] = None, cache: Optional[LLMCache] = None,
+                 backend: Optional[LLMBackend] = None, workers: Optional[int] = None, extraction_engine: str = "",
+                 extract_chunk_chars: Optional[int] = None, prompt_token_budget: Optional[int] = None):
+        self.llm = backend or OllamaBackend(url=ollama_url)
+        self.workers = max(1, DEFAULT_WORKERS if workers is None else workers)
+        self._stats_lock = threading.Lock()
+        self.cache = cache if cache is not None else LLMCache(enabled=os.getenv('LLM_CACHE', '1') != '0')
+        self.schema_registry = SchemaRegistry(reference_schemas or default_reference_schemas())
+        self.chunk_size = DEFAULT_CHUNK_SIZE if chunk_size is None else chunk_size
+        self.extract_chunk_chars = DEFAULT_EXTRACT_CHUNK_CHARS if extract_chunk_chars is None else extract_chunk_chars
+        self.prompt_token_budget = DEFAULT_PROMPT_TOKEN_BUDGET if prompt_token_budget is None else prompt_token_budget
+        self.mapping_policy = mapping_policy or DEFAULT_MAPPING_POLICY
+        if self.mapping_policy not in MAPPING_POLICIES:
+            raise ValueError(f"Unknown mapping policy '{self.mapping_policy}', expected one of {', '.join(MAPPING_POLICIES)}")
+        self.extraction_engine = extraction_engine or DEFAULT_EXTRACTION_ENGINE
+        if self.extraction_engine not in EXTRACTION_ENGINES:
+            raise ValueError(f"Unknown extraction engine '{self.extraction_engine}', expected one of {', '.join(EXTRACTION_ENGINES)}")
+        # Step diff of the last incremental migrate_script call
+        self.last_diff: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self.reset_stats()
+        
+    def reset_stats(self):
+        """Reset the per-run counters of rule hits, LLM calls and fallbacks"""
+        self.stats = {
+            "rule_hits": 0,
+            "llm_calls": 0,
+            "fallbacks": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "manual_parses": 0,
+            "parse_failures": 0,
+            "reused": 0
+        }
+    
+    def _count(self, name: str):
+        # Mapping workers update the counters from several threads
+        with self._stats_lock:
+            self.stats[name] += 1
+        metrics.inc(f"{name}_total")
+    
+    def for_run(self) -> 'PlaywrightToSchemaMigrator':
+        """Shallow copy with its own stats, sharing clients and caches, for one concurrent migration"""
+        run = copy.copy(self)
+        run._stats_lock = threading.Lock()
+        run.reset_stats()
+        return run
+    
+    def _extract_prompt_version(self) -> str:
+        return f"{EXTRACT_PROMPT.version}+{EXTRACT_CHUNK_PROMPT.version}"
+    
+    def _map_prompt_version(self) -> str:
+        # Mapping prompts embed the reference schema catalogue, so it is part of the prompt version
+        catalogue = self.schema_registry.catalogue_text()
+        catalogue_hash = hashlib.sha256(catalogue.encode('utf-8')).hexdigest()[:16]
+        return f"{MAP_PROMPT.version}+{BATCH_MAP_PROMPT.version}:{catalogue_hash}"
+    
+    def migration_settings(self) -> Dict[str, Any]:
+        """Everything besides the script that decides the emitted steps; previous results are only reused if it matches"""
+        return {
+            "engine": self.extraction_engine,
+            "policy": self.mapping_policy,
+            "backend": self.llm.name,
+            "model": self.llm.model,
+            "extract_chunk_chars": self.extract_chunk_chars,
+            "prompt_token_budget": self.prompt_token_budget,
+            "prompts": [self._extract_prompt_version(), self._map_prompt_version()],
+            "templates": TEMPLATES_VERSION
+        }
+    
+    def _cache_key(self, kind: str, payload: Any) -> str:
+        """Cache key for an extraction (script text) or mapping (action dict) result"""
+        version = self._extract_prompt_version()
+        if kind == 'map':
+            version = self._map_prompt_version()
+            # Source positions don't change the mapping, so the same action anywhere in a script is one entry
+            payload = {key: value for key, value in payload.items() if key not in POSITION_KEYS}
+        return LLMCache.make_key(kind, payload, self.llm.model, self.llm.name, version)
+    
+    def _cache_get(self, key: str) -> Optional[Any]:
+        cached = self.cache.get(key)
+        if self.cache.enabled:
+            self._count('cache_hits' if cached is not None else 'cache_misses')
+        return cached
+    
+    def _generate(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        """Send a prompt to the LLM backend and return the raw completion text ("" on failure)"""
+        return self.llm.generate(prompt, schema=schema)
+    
+    def extract_and_map(self, script_content: str, chunk_size: Optional[int] = None,
+                        reuse: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Extract the script's actions and map them, returning both in order.
+        
+        Actions extracted by the LLM are mapped as soon as each one has streamed in, while the
+        rest of the extraction is still generating.
         """
+        if self.extraction_engine == 'race':
+            with metrics.span('extract'):
+                actions = self._race_extraction(script_content)
+            with metrics.span('map'):
+                return actions, self.map_actions(actions, chunk_size, reuse=reuse)
+        
+        with metrics.span('extract'):
+            actions, unresolved = self._extract_ast(script_content)
+            if actions:
+                resolved = [self.extract_playwright_actions(entry['source']) for entry in unresolved]
+                actions = self._splice_unresolved(actions, unresolved, resolved)
+        if actions:
+            with metrics.span('map'):
+                return actions, self.map_actions(actions, chunk_size, reuse=reuse)
+        
+        # Extraction and mapping overlap here, so they are timed as one stage
+        with metrics.span('extract_map'):
+            actions, commands = self.map_action_stream(self.stream_playwright_actions(script_content), chunk_size, reuse=reuse)
+        if not actions:
+            print("Failed to extract actions, using manual parsing...")
+            self._count('manual_parses')
+            with metrics.span('extract'):
+                actions = self._manual_parse(script_content)
+            with metrics.span('map'):
+                commands = self.map_actions(actions, chunk_size, reuse=reuse)
+        return actions, commands
+    
+    def extract_actions(self, script_content: str) -> List[Dict[str, Any]]:
+        """Extract actions with the configured engine, falling back to the LLM and then _manual_parse"""
         
-        response = requests.post(
-            f"{self.ollama_url}/api/generate",
-            json={
-                "model": "llama3.2",
-                "prompt": prompt,
-                "stream": False
-            }
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            try:
-                # Extract JSON from response
-                content = result['response']
-                json_start = content.find('[')
-                json_end = content.rfind(']') + 1
-                if json_start != -1 and json_end != -1:
-                    return json.loads(content[json_start:json_end])
-            except:
-                pass
+        if self.extraction_engine == 'race':
+            return self._race_extraction(script_content)
+        
+        actions, unresolved = self._extract_ast(script_content)
+        if actions:
+            resolved = [self.extract_playwright_actions(entry['source']) for entry in unresolved]
+            return self._splice_unresolved(actions, unresolved, resolved)
+        
+        actions = self.extract_playwright_actions(script_content)
+        if not actions:
+            print("Failed to extract actions, using manual parsing...")
+            self._count('manual_parses')
+            actions = self._manual_parse(script_content)
+        return actions
+    
+    def _extract_ast(self, script_content: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Static extraction; no actions means the script isn't Python Playwright and the LLM gets all of it"""
+        if self.extraction_engine == 'llm':
+            return [], []
+        try:
+            return extract_actions(script_content)
+        except SyntaxError as e:
+            print(f"Could not parse script ({e.msg} on line {e.lineno}), extracting with the LLM...")
+            return [], []
+    
+    def _splice_unresolved(self, actions: List[Dict[str, Any]], unresolved: List[Dict[str, Any]],
+                           resolved: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Insert the actions the LLM found in each unresolved statement where that statement ran"""
+        if unresolved:
+            print(f"Resolved {len(unresolved)} statements the AST extractor could not evaluate with the LLM")
+        # Insert from the back so earlier indices stay valid
+        for entry, entry_actions in sorted(zip(unresolved, resolved), key=lambda pair: pair[0]['index'], reverse=True):
+            for action in entry_actions:
+                action.setdefault('line', entry['line'])
+            actions[entry['index']:entry['index']] = entry_actions
+        return actions
+    
+    def _local_extraction(self, script_content: str,
+                          extracted: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None
+                          ) -> Tuple[List[Dict[str, Any]], bool, bool]:
+        """Actions found without the LLM: (actions, complete, manual).
+        
+        Uses the ast engine (or its precomputed `extracted` result) and _manual_parse for scripts it
+        finds nothing in. The result is complete when nothing was left unresolved and every page
+        call in the script is accounted for; `manual` tells whether _manual_parse produced it.
+        """
+        actions, unresolved = extracted if extracted is not None else self._extract_ast(script_content)
+        manual = not actions
+        if manual:
+            actions = self._manual_parse(script_content)
+        complete = bool(actions) and not unresolved and accounts_for_calls(script_content, actions)
+        return actions, complete, manual
+    
+    def _race_extraction(self, script_content: str) -> List[Dict[str, Any]]:
+        """Extract with the local parsers and the LLM at the same time (the race engine)"""
+        cancel = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        llm_future = executor.submit(self.extract_playwright_actions, script_content, cancel)
+        # Don't wait for a cancelled request to notice on shutdown
+        executor.shutdown(wait=False)
+        
+        local, complete, manual = self._local_extraction(script_content)
+        if complete:
+            cancel.set()
+            llm_future.cancel()
+            return self._race_result(local, manual, [])
+        return self._race_result(local, manual, llm_future.result())
+    
+    def _race_result(self, local: List[Dict[str, Any]], manual: bool, llm: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Reconcile the two sides of a race, recording which one the actions came from"""
+        if not llm:
+            winner, actions = 'local', local
+        elif not local:
+            winner, actions = 'llm', llm
+        else:
+            winner, actions = 'merged', reconcile(local, llm)
+        metrics.inc('extraction_race_total', winner=winner)
+        if manual and winner != 'llm':
+            self._count('manual_parses')
+        return actions
+    
+    def extract_playwright_actions(self, script_content: str, cancel: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """Extract actions from Playwright script using the LLM backend"""
+        return list(self.stream_playwright_actions(script_content, cancel))
+    
+    def stream_playwright_actions(self, script_content: str, cancel: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """Yield each action as soon as the LLM has finished generating it.
         
-        return []
+        Scripts larger than extract_chunk_chars, or whose prompt would be over the token budget, are
+        split into chunks that are extracted in parallel (up to the backend's max_concurrency) and
+        yielded in source order. Setting `cancel` stops every stream at its next fragment.
+        """
+        context, chunks = split_script(script_content, self._extract_chunk_limit(script_content))
+        if len(chunks) == 1:
+            yield from self._stream_extraction(script_content, cancel=cancel)
+            return
+        
+        print(f"Script is too large for one prompt, extracting it in {len(chunks)} chunks...")
+        with ThreadPoolExecutor(max_workers=min(len(chunks), self.llm.max_concurrency)) as executor:
+            futures = [executor.submit(lambda chunk: list(self._stream_extraction(chunk, context, cancel)), chunk)
+                       for chunk in chunks]
+            for future in futures:
+                yield from future.result()
+    
+    def _extract_chunk_limit(self, script_content: str) -> int:
+        """Largest chunk for split_script: extract_chunk_chars, or less if that would be over the token budget"""
+        budget_chars = EXTRACT_CHUNK_PROMPT.value_chars(self.prompt_token_budget, script_content)
+        limits = [limit for limit in (self.extract_chunk_chars, budget_chars) if limit > 0]
+        return min(limits) if limits else 0
+    
+    def _stream_extraction(self, script_content: str, context: str = "",
+                           cancel: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """One extraction prompt; `context` holds definitions shown to the model but not extracted"""
+        
+        cache_key = self._cache_key('extract', {"context": context, "chunk": script_content} if context else script_content)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            yield from cached
+            return
+        
+        prompt = self._extract_prompt(script_content, context)
+        if prompt is None:
+            yield from self._manual_parse(script_content)
+            return
+        if cancel is not None and cancel.is_set():
+            return
+        
+        self._count('llm_calls')
+        parser = JSONArrayStream()
+        received = False
+        actions: List[Dict[str, Any]] = []
+        with closing(self.llm.stream(prompt, schema=EXTRACTION_SCHEMA)) as fragments:
+            for fragment in fragments:
+                if cancel is not None and cancel.is_set():
+                    # Closing the stream drops the connection, so the model stops generating
+                    return
+                received = received or bool(fragment)
+                for action in filter(None, map(validate_action, parser.feed(fragment))):
+                    actions.append(action)
+                    yield action
+        
+        if not actions and received:
+            self._count('parse_failures')
+        # A truncated completion is used for this run but not cached, so the next run asks again
+        if actions and parser.complete:
+            self.cache.set(cache_key, 'extract', actions)
+    
+    def _extract_prompt(self, script_content: str, context: str = "") -> Optional[str]:
+        """Extraction prompt for a script or chunk, or None if it can't fit the token budget"""
+        try:
+            if context:
+                return EXTRACT_CHUNK_PROMPT.render(self.prompt_token_budget, script=script_content, context=context)
+            return EXTRACT_PROMPT.render(self.prompt_token_budget, script=script_content)
+        except PromptBudgetError as e:
+            # A single statement larger than the whole budget: parse it locally rather than send a prompt the model truncates
+            print(f"Warning: {e}, parsing this part of the script without the LLM")
+            self._count('manual_parses')
+            return None
     
     def map_to_schema_command(self, action: Dict[str, Any]) -> Dict[str, Any]:
-        """Map Playwright action to schema command using OLLAMA"""
-        
-        # Load sample schema for reference
-        sample_schema_path = os.getenv('SAMPLE_SCHEMA_PATH', '/Users/aarij.hussaan/development/schema_migrator/sample_schemas/CustomerCreate.json')
-        with open(sample_schema_path, 'r') as f:
-            sample_schema = json.load(f)
-        
-        prompt = f"""
-        Map this Playwright action to the schema format based on the sample schema structure.
-        
-        Playwright Action:
-        {json.dumps(action, indent=2)}
-        
-        Sample Schema Commands (for reference):
-        - visit: Navigate to URL
-        - type: Fill text input
-        - click: Click element
-        - select: Select dropdown option
-        - keypress: Press keyboard key
-        - upload: Upload file
-        
-        Generate a schema command in this exact format:
-        {{
-            "command": {{
-                "name": "type|click|visit|select|keypress",
-                "fields": [
-                    {{
-                        "name": "field_name",
-                        "type": "text",
-                        "label": "Label",
-                        "value": "actual_value",
-                        "required": true
-                    }}
-                ]
-            }},
-            "order": 1
-        }}
-        
-        Map the action type correctly:
-        - goto -> visit
-        - fill -> type
-        - click -> click
-        - select_option -> select
-        - upload -> upload (not in sample but infer structure)
+        """Map Playwright action to schema command using the LLM backend"""
+        
+        cache_key = self._cache_key('map', action)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return self._with_targets(cached, action)
+        
+        prompt = self._map_prompt(action)
+        if prompt is None:
+            return self._unmapped(action)
+        
+        self._count('llm_calls')
+        with metrics.span('map_call'):
+            content = self._generate(prompt, MAPPING_SCHEMA)
+        command = self._parse_command(content)
+        if command is not None:
+            self.cache.set(cache_key, 'map', command)
+            return self._with_targets(command, action)
+        if content:
+            self._count('parse_failures')
+        
+        return self._unmapped(action)
+    
+    def _map_prompt(self, action: Dict[str, Any]) -> Optional[str]:
+        """Mapping prompt for one action, or None if it can't fit the token budget"""
+        try:
+            return MAP_PROMPT.render(self.prompt_token_budget, action=compact_json(action),
+                                     catalogue=self.schema_registry.catalogue_text())
+        except PromptBudgetError as e:
+            print(f"Warning: {e}, not sending the action to the LLM")
+            return None
+    
+    def _with_targets(self, command: Dict[str, Any], action: Dict[str, Any]) -> Dict[str, Any]:
+        """An LLM mapping with the ranked targets of the action's selector on its css_path field.
+
+        The mapping schema has no targets, so they are added here as the templates add them. The
+        cache keeps the command without them, so a new selector analysis applies to cached mappings too.
         """
-        
-        response = requests.post(
-            f"{self.ollama_url}/api/generate",
-            json={
-                "model": "llama3.2",
-                "prompt": prompt,
-                "stream": False
-            }
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            try:
-                content = result['response']
-                json_start = content.find('{')
-                json_end = content.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    return json.loads(content[json_start:json_end])
-            except:
-                pass
+        selector = action.get('selector') or ''
+        fields = command.get('command', {}).get('fields', [])
+        if not selector or not any(field.get('name') == 'css_path' for field in fields):
+            return command
+        targets = [target.to_dict() for target in selector_targets(selector)]
+        fields = [dict(field, targets=targets) if field.get('name') == 'css_path' else field for field in fields]
+        return {"command": dict(command['command'], fields=fields)}
+    
+    def _parse_command(self, content: str) -> Optional[Dict[str, Any]]:
+        """The first well-formed {"command": ...} in a mapping completion, or None"""
+        return next(filter(None, map(validate_command, parse_objects(content))), None)
+    
+    def _unmapped(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """Result for an action the LLM could not map: a template, or {} under llm-only"""
+        if self.mapping_policy == 'llm-only':
+            return {}
         
         # Fallback mapping
-        return self._fallback_mapping(action)
+        self._count('fallbacks')
+        with metrics.span('fallback'):
+            return self._fallback_mapping(action)
     
-    def _fallback_mapping(self, action: Dict[str, Any]) -> Dict[str, Any]:
-        """Fallback mapping when OLLAMA fails"""
+    def map_actions(self, actions: List[Dict[str, Any]], chunk_size: Optional[int] = None,
+                    workers: Optional[int] = None, reuse: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Map actions in input order, batching when chunk_size > 1 and running up to `workers` LLM calls at once.
+        
+        `reuse` maps action hashes to the commands of a previous run (see MigrationManifest); those actions aren't re-mapped.
+        """
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        workers = self.workers if workers is None else max(1, workers)
+        commands, pending = self._apply_rules(actions, reuse)
+        
+        if chunk_size <= 1:
+            def map_one(i: int) -> Dict[str, Any]:
+                print(f"Converting action {i + 1}: {actions[i].get('action', 'unknown')}")
+                return self.map_to_schema_command(actions[i])
+            
+            for i, command in zip(pending, self._run_workers(map_one, pending, workers)):
+                commands[i] = command
+            return commands
+        
+        def map_chunk(chunk: List[int]) -> List[Dict[str, Any]]:
+            print(f"Converting {len(chunk)} actions in one batch")
+            return self.map_actions_batch([actions[i] for i in chunk])
+        
+        chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+        for chunk, chunk_commands in zip(chunks, self._run_workers(map_chunk, chunks, workers)):
+            for i, command in zip(chunk, chunk_commands):
+                commands[i] = command
+        return commands
+    
+    def map_action_stream(self, action_stream: Iterable[Dict[str, Any]], chunk_size: Optional[int] = None,
+                          workers: Optional[int] = None, reuse: Optional[Dict[str, Dict[str, Any]]] = None
+                          ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Like map_actions, but LLM mapping calls (per action or per full chunk) are started on the worker
+        pool while `action_stream` is still producing actions; returns the actions and their commands"""
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        workers = self.workers if workers is None else max(1, workers)
+        actions: List[Dict[str, Any]] = []
+        commands: List[Dict[str, Any]] = []
+        submitted: List[Tuple[List[int], Future]] = []
+        chunk: List[int] = []
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            def submit(indexes: List[int]):
+                batch = [actions[i] for i in indexes]
+                if chunk_size <= 1:
+                    print(f"Converting action {indexes[0] + 1}: {batch[0].get('action', 'unknown')}")
+                    future = executor.submit(lambda: [self.map_to_schema_command(batch[0])])
+                else:
+                    print(f"Converting {len(batch)} actions in one batch")
+                    future = executor.submit(self.map_actions_batch, batch)
+                submitted.append((indexes, future))
+            
+            for action in action_stream:
+                actions.append(action)
+                action_commands, pending = self._apply_rules([action], reuse)
+                commands.append(action_commands[0])
+                if pending:
+                    chunk.append(len(actions) - 1)
+                    if len(chunk) >= max(1, chunk_size):
+                        submit(chunk)
+                        chunk = []
+            if chunk:
+                submit(chunk)
+            
+            for indexes, future in submitted:
+                for i, command in zip(indexes, future.result()):
+                    commands[i] = command
+        return actions, commands
+    
+    def _run_workers(self, func, items: List[Any], workers: int) -> List[Any]:
+        """Apply func to every item on a bounded thread pool, returning results in item order"""
+        if workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+            return list(executor.map(func, items))
+    
+    def _apply_rules(self, actions: List[Dict[str, Any]],
+                     reuse: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """Map reused actions and what the mapping policy allows locally; returns the commands and the indexes still needing the LLM"""
+        commands: List[Dict[str, Any]] = [{} for _ in actions]
+        pending = []
+        for i, action in enumerate(actions):
+            if reuse:
+                key = action_hash(action)
+                if key in reuse:
+                    self._count('reused')
+                    commands[i] = copy.deepcopy(reuse[key])
+                    continue
+            if self.mapping_policy != 'rules-first':
+                pending.append(i)
+                continue
+            command = self._rule_mapping(action)
+            if command:
+                self._count('rule_hits')
+                commands[i] = command
+            else:
+                pending.append(i)
+        return commands, pending
+    
+    def _rule_mapping(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """Map an action with the deterministic templates, or return {} if it needs the LLM"""
         action_type = action.get('action', '')
+        if action_type not in RULE_ACTIONS:
+            return {}
         
+        selector = action.get('selector') or ''
+        value = action.get('value')
         if action_type == 'goto':
-            return {
-                "command": {
-                    "name": "visit",
-                    "fields": [
-                        {
-                            "name": "visit",
-                            "type": "text",
-                            "label": "Browse to URL",
-                            "value": action.get('value', ''),
-                            "required": True
-                        }
-                    ]
-                }
-            }
-        elif action_type == 'fill':
-            return {
-                "command": {
-                    "name": "type",
-                    "fields": [
-                        {
-                            "name": "name",
-                            "type": "text",
-                            "label": "Name",
-                            "value": action.get('value', ''),
-                            "required": True
-                        },
-                        {
-                            "name": "css_path",
-                            "type": "text",
-                            "label": "CSS Path",
-                            "value": action.get('selector', ''),
-                            "required": True
-                        }
-                    ]
-                }
-            }
-        elif action_type == 'click':
-            return {
-                "command": {
-                    "name": "click",
-                    "fields": [
-                        {
-                            "name": "name",
-                            "type": "text",
-                            "label": "Name",
-                            "value": action.get('description', 'Click element'),
-                            "required": True
-                        },
-                        {
-                            "name": "css_path",
-                            "type": "text",
-                            "label": "CSS Path",
-                            "value": action.get('selector', ''),
-                            "required": True
-                        }
-                    ]
-                }
-            }
-        elif action_type == 'select_option':
-            return {
-                "command": {
-                    "name": "select",
-                    "fields": [
-                        {
-                            "name": "name",
-                            "type": "text",
-                            "label": "Name",
-                            "value": action.get('description', 'Select option'),
-                            "required": True
-                        },
-                        {
-                            "name": "css_path",
-                            "type": "text",
-                            "label": "CSS Path",
-                            "value": action.get('selector', ''),
-                            "required": True
-                        },
-                        {
-                            "name": "value",
-                            "type": "text",
-                            "label": "Option Value",
-                            "value": action.get('value', ''),
-                            "required": True
-                        }
-                    ]
-                }
-            }
-        elif action_type == 'upload':
-            return {
-                "command": {
-                    "name": "upload",
-                    "fields": [
-                        {
-                            "name": "name",
-                            "type": "text",
-                            "label": "Name",
-                            "value": action.get('description', 'Upload file'),
-                            "required": True
-                        },
-                        {
-                            "name": "css_path",
-                            "type": "text",
-                            "label": "CSS Path",
-                            "value": action.get('selector', ''),
-                            "required": True
-                        },
-                        {
-                            "name": "file_path",
-                            "type": "text",
-                            "label": "File Path",
-                            "value": action.get('value', ''),
-                            "required": True
-                        }
-                    ]
-                }
-            }
-        elif action_type == 'hover':
-            return {
-                "command": {
-                    "name": "hover",
-                    "fields": [
-                        {
-                            "name": "name",
-                            "type": "text",
-                            "label": "Name",
-                            "value": action.get('description', 'Hover element'),
-                            "required": True
-                        },
-                        {
-                            "name": "css_path",
-                            "type": "text",
-                            "label": "CSS Path",
-                            "value": action.get('selector', ''),
-                            "required": True
-                        }
-                    ]
-                }
-            }
-        
-        return {}
-    
-    def migrate_script(self, script_path: str, output_path: str):
-        """Migrate Playwright script to schema format"""
+            if not value:
+                return {}
+        elif not selector:
+            return {}
+        elif action_type in ('fill', 'select_option', 'upload') and value is None:
+            return {}
+        
+        # Unresolved f-string placeholders such as "#employment_{i}_company" are ambiguous
+        if '{' in selector or '{' in str(value or ''):
+            return {}
+        
+        return self._fallback_mapping(action)
+    
+    def map_actions_batch(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Map several actions with a single LLM call, returning commands in input order"""
+        
+        cache_keys = [self._cache_key('map', action) for action in actions]
+        commands: List[Optional[Dict[str, Any]]] = [self._cache_get(key) for key in cache_keys]
+        
+        # Only actions without a cached result are sent to the model
+        missing = [i for i, command in enumerate(commands) if command is None]
+        for group, prompt in self._batch_prompts([actions[i] for i in missing]):
+            indexes = [missing[position] for position in group]
+            content = ""
+            if prompt is not None:
+                self._count('llm_calls')
+                with metrics.span('map_batch_call'):
+                    content = self._generate(prompt, BATCH_MAPPING_SCHEMA)
+            self._store_batch(actions, commands, cache_keys, indexes, content)
+        
+        return [self._with_targets(command, action) for command, action in zip(commands, actions)]
+    
+    def _store_batch(self, actions: List[Dict[str, Any]], commands: List[Optional[Dict[str, Any]]],
+                     cache_keys: List[str], missing: List[int], content: str):
+        """Fill the missing commands from a batch completion, caching what the model got right"""
+        for i, command in zip(missing, self._parse_batch(content, len(missing))):
+            if command is not None:
+                self.cache.set(cache_keys[i], 'map', command)
+                commands[i] = command
+            elif content:
+                self._count('parse_failures')
+        
+        # Actions the model dropped or garbled fall back one by one
+        for i in missing:
+            if commands[i] is None:
+                commands[i] = self._unmapped(actions[i])
+    
+    def _batch_prompt(self, actions: List[Dict[str, Any]]) -> str:
+        indexed_actions = [dict(action, index=i) for i, action in enumerate(actions)]
+        return BATCH_MAP_PROMPT.render(self.prompt_token_budget, actions=compact_json(indexed_actions),
+                                       catalogue=self.schema_registry.catalogue_text())
+    
+    def _batch_prompts(self, actions: List[Dict[str, Any]]) -> List[Tuple[List[int], Optional[str]]]:
+        """Split actions into consecutive groups whose batch prompt fits the token budget.
+        
+        Returns each group's positions in `actions` with its prompt; the prompt is None for an
+        action that doesn't fit even on its own.
+        """
+        groups: List[Tuple[List[int], Optional[str]]] = []
+        group: List[int] = []
+        prompt: Optional[str] = None
+        for position in range(len(actions)):
+            try:
+                prompt = self._batch_prompt([actions[i] for i in group + [position]])
+                group.append(position)
+                continue
+            except PromptBudgetError as e:
+                error = e
+            if group:
+                # The group is full: keep it and start the next one with this action
+                groups.append((group, prompt))
+                group = []
+                try:
+                    prompt = self._batch_prompt([actions[position]])
+                    group = [position]
+                    continue
+                except PromptBudgetError as e:
+                    error = e
+            print(f"Warning: {error}, not sending the action to the LLM")
+            groups.append(([position], None))
+        if group:
+            groups.append((group, prompt))
+        return groups
+    
+    def _parse_batch(self, content: str, count: int) -> List[Optional[Dict[str, Any]]]:
+        """Commands from a batch completion in input order; entries the model dropped or garbled are None"""
+        commands: List[Optional[Dict[str, Any]]] = [None] * count
+        for position, entry in enumerate(parse_objects(content)):
+            index = entry.get('index', position)
+            if not isinstance(index, int) or not 0 <= index < count or commands[index] is not None:
+                continue
+            commands[index] = validate_command(entry)
+        
+        return commands
+    
+    def _fallback_mapping(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """Fallback mapping when the LLM fails"""
+        template = FALLBACK_TEMPLATES.get(action.get('action', ''))
+        if template is None:
+            return {}
+        return {"command": template.build(action).to_dict()}
+    
+    def migrate_script(self, script_path: str, output_path: str, chunk_size: Optional[int] = None,
+                       incremental: bool = True, compact: bool = False):
+        """Migrate Playwright script to schema format.
+        
+        With `incremental`, a manifest next to the output records what was emitted for each action: an
+        unchanged script is not migrated again and an edited one only re-maps its new or changed actions.
+        The step diff against the previous run is saved as `<output>.diff.json`. `compact` writes the
+        schema without indentation.
+        """
         
         # Read the script
-        with open(script_path, 'r') as f:
+        with metrics.span('read'), open(script_path, 'r') as f:
             script_content = f.read()
         
-        print("Extracting actions from Playwright script...")
-        actions = self.extract_playwright_actions(script_content)
+        self.reset_stats()
+        self.last_diff = None
+        if not incremental:
+            schema = self.migrate_content(script_content, chunk_size)
+        else:
+            manifest = MigrationManifest(manifest_path(output_path), self.migration_settings())
+            sha256 = hashlib.sha256(script_content.encode('utf-8')).hexdigest()
+            if manifest.is_unchanged(script_path, sha256) and os.path.exists(output_path):
+                print(f"{script_path} is unchanged since the last migration, keeping {output_path}")
+                return manifest.schema(script_path)
+            
+            print("Extracting actions from Playwright script...")
+            actions, commands = self.extract_and_map(script_content, chunk_size, reuse=manifest.reusable_commands(script_path))
+            print(f"Extracted {len(actions)} actions")
+            schema = self._build_schema(commands, actions)
+            
+            with metrics.span('manifest'):
+                self.last_diff = manifest.record(script_path, sha256, [action_hash(action) for action in actions], commands, schema)
+                manifest.save()
+                diff_file = os.path.splitext(output_path)[0] + '.diff.json'
+                dump_json(self.last_diff, diff_file)
+            changes = diff_summary(self.last_diff)
+            print(f"Changes since the last migration: {changes['added']} added, {changes['removed']} removed, "
+                  f"{changes['modified']} modified (saved to {diff_file})")
         
-        if not actions:
-            print("Failed to extract actions, using manual parsing...")
-            actions = self._manual_parse(script_content)
+        # Save to file
+        with metrics.span('serialize'):
+            dump_json(schema, output_path, compact)
+        
+        print(f"Migration complete! Schema saved to {output_path}")
+        return schema
+    
+    def migrate_content(self, script_content: str, chunk_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Migrate Playwright source code to schema format without touching the filesystem"""
+        
+        print("Extracting actions from Playwright script...")
+        actions, commands = self.extract_and_map(script_content, chunk_size)
         
         print(f"Extracted {len(actions)} actions")
         
-        # Convert to schema format
-        schema_steps = []
-        for i, action in enumerate(actions, 1):
-            print(f"Converting action {i}: {action.get('action', 'unknown')}")
-            schema_command = self.map_to_schema_command(action)
-            if schema_command:
-                schema_command['order'] = i
-                schema_steps.append(schema_command)
+        return self._build_schema(commands, actions)
+    
+    def _build_schema(self, commands: List[Dict[str, Any]], actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Number the mapped commands and wrap them in the test envelope"""
+        
+        # Convert to schema format; dropped actions keep their number
+        schema_steps = [Step.from_mapping(command, i) for i, command in enumerate(commands, 1) if command]
+        metrics.inc('actions_total', len(commands))
+        metrics.inc('steps_total', len(schema_steps))
         
         # Create final schema
-        schema = [{
+        return [{
             "steps": schema_steps,
             "name": "migratedTest",
             "description": "Migrated from Playwright test",
-            "base_url": self._extract_base_url(script_content)
+            "base_url": self._extract_base_url(actions)
         }]
-        
-        # Save to file
-        with open(output_path, 'w') as f:
-            json.dump(schema, f, indent=2)
-        
-        print(f"Migration complete! Schema saved to {output_path}")
-        return schema
     
     def _manual_parse(self, script_content: str) -> List[Dict[str, Any]]:
         """Manual parsing as fallback"""
-        actions = []
-        
-        # Extract goto
-        goto_match = re.search(r'page\.goto\("([^"]+)"\)', script_content)
-        if goto_match:
-            actions.append({
-                "action": "goto",
-                "selector": "",
-                "value": goto_match.group(1),
-                "description": "Navigate to page"
-            })
-        
-        # Extract text fields sections
-        text_sections = re.findall(r'text_fields_\w+\s*=\s*{([^}]+)}', script_content, re.DOTALL)
-        for section in text_sections:
-            pairs = re.findall(r'"([^"]+)":\s*"([^"]+)"', section)
-            for selector, value in pairs:
-                actions.append({
-                    "action": "fill",
-                    "selector": selector,
-                    "value": value,
-                    "description": f"Fill {selector}"
-                })
-        
-        # Extract dropdown sections
-        dropdown_sections = re.findall(r'dropdowns_\w+\s*=\s*{([^}]+)}', script_content, re.DOTALL)
-        for section in dropdown_sections:
-            pairs = re.findall(r'"([^"]+)":\s*"([^"]+)"', section)
-            for selector, option in pairs:
-                actions.append({
-                    "action": "select_option",
-                    "selector": selector,
-                    "value": option,
-                    "description": f"Select {option} in {selector}"
-                })
-        
-        # Extract file upload sections
-        upload_sections = re.findall(r'file_uploads\s*=\s*{([^}]+)}', script_content, re.DOTALL)
-        for section in upload_sections:
-            pairs = re.findall(r'"([^"]+)":\s*"([^"]+)"', section)
-            for selector, file_path in pairs:
-                actions.append({
-                    "action": "upload",
-                    "selector": selector,
-                    "value": file_path,
-                    "description": f"Upload file to {selector}"
-                })
-        
-        # Extract direct page.fill calls (for loops)
-        fill_matches = re.findall(r'page\.fill\(f"([^"]+)",\s*f"([^"]+)"\)', script_content)
-        for selector, value in fill_matches:
-            actions.append({
-                "action": "fill",
-                "selector": selector,
-                "value": value,
-                "description": f"Fill {selector}"
-            })
-        
-        # Extract direct page.select_option calls (for loops)
-        select_matches = re.findall(r'page\.select_option\(f"([^"]+)",\s*"([^"]+)"\)', script_content)
-        for selector, option in select_matches:
-            actions.append({
-                "action": "select_option",
-                "selector": selector,
-                "value": option,
-                "description": f"Select {option} in {selector}"
-            })
-        
-        # Extract click actions
-        click_matches = re.findall(r'page\.click\("([^"]+)"\)', script_content)
-        for selector in click_matches:
-            actions.append({
-                "action": "click",
-                "selector": selector,
-                "value": "",
-                "description": f"Click {selector}"
-            })
-        
-        # Extract hover actions
-        hover_matches = re.findall(r'page\.hover\("([^"]+)"\)', script_content)
-        for selector in hover_matches:
-            actions.append({
-                "action": "hover",
-                "selector": selector,
-                "value": "",
-                "description": f"Hover {selector}"
-            })
-        
-        return actions
+        return scan_actions(script_content)
     
-    def _extract_base_url(self, script_content: str) -> str:
-        """Extract base URL from script"""
-        goto_match = re.search(r'page\.goto\("([^"]+)"\)', script_content)
-        if goto_match:
-            url = goto_match.group(1)
-            # Extract base URL
-            if '://' in url:
-                parts = url.split('/')
-                return f"{parts[0]}//{parts[2]}"
-        return ""
+    def _extract_base_url(self, actions: List[Dict[str, Any]]) -> str:
+        """Extract base URL from the script's first navigation"""
+        return base_url(actions)
+
+def add_migration_arguments(parser: argparse.ArgumentParser):
+    """Options shared by the single-script and bulk command lines"""
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Actions mapped per LLM call (0 or 1 = one call per action)")
+    parser.add_argument('--engine', choices=EXTRACTION_ENGINES, default=DEFAULT_EXTRACTION_ENGINE,
+                        help="How actions are extracted from the script")
+    parser.add_argument('--extract-chunk-chars', type=int, default=DEFAULT_EXTRACT_CHUNK_CHARS,
+                        help="Extract scripts longer than this in chunks (0 = one prompt per script)")
+    parser.add_argument('--prompt-budget', type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET,
+                        help="Most tokens one LLM prompt may use (0 = unlimited)")
+    parser.add_argument('--policy', choices=MAPPING_POLICIES, default=DEFAULT_MAPPING_POLICY,
+                        help="How actions are mapped to schema commands")
+    parser.add_argument('--backend', choices=BACKENDS, default=os.getenv('LLM_BACKEND', 'ollama'),
+                        help="LLM used for extraction and mapping")
+    parser.add_argument('--compact', action='store_true',
+                        help="Write schemas without indentation")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Bypass the LLM result cache for this run")
+    parser.add_argument('--purge-cache', action='store_true',
+                        help="Delete all cached LLM results before migrating")
+
+def cache_from_args(args: argparse.Namespace) -> LLMCache:
+    cache = LLMCache(enabled=not args.no_cache and os.getenv('LLM_CACHE', '1') != '0')
+    if args.purge_cache:
+        LLMCache(path=cache.path).purge()
+        print(f"Purged LLM cache at {cache.path}")
+    return cache
 
 def main():
-    migrator = PlaywrightToSchemaMigrator()
+    parser = argparse.ArgumentParser(description="Migrate a Playwright script to schema format")
+    parser.add_argument('script_path', nargs='?',
+                        default=os.getenv('SCRIPT_PATH', '/Users/aarij.hussaan/development/schema_migrator/sample_scripts/test_2.py'))
+    parser.add_argument('output_path', nargs='?',
+                        default=os.getenv('OUTPUT_PATH', '/Users/aarij.hussaan/development/schema_migrator/migrated_schema.json'))
+    add_migration_arguments(parser)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Mapping LLM calls run in parallel (match OLLAMA_NUM_PARALLEL or the API rate limit)")
+    parser.add_argument('--full', action='store_true',
+                        help="Ignore the manifest from the previous run and migrate every action again")
+    args = parser.parse_args()
     
-    script_path = os.getenv('SCRIPT_PATH', '/Users/aarij.hussaan/development/schema_migrator/sample_scripts/test_2.py')
-    output_path = os.getenv('OUTPUT_PATH', '/Users/aarij.hussaan/development/schema_migrator/migrated_schema.json')
+    cache = cache_from_args(args)
+    migrator = PlaywrightToSchemaMigrator(chunk_size=args.chunk_size, mapping_policy=args.policy, cache=cache,
+                                          backend=create_backend(args.backend), workers=args.workers,
+                                          extraction_engine=args.engine, extract_chunk_chars=args.extract_chunk_chars,
+                                          prompt_token_budget=args.prompt_budget)
+    script_path = args.script_path
+    output_path = args.output_path
     
     try:
-        schema = migrator.migrate_script(script_path, output_path)
+        schema = migrator.migrate_script(script_path, output_path, incremental=not args.full, compact=args.compact)
         print("\nMigration Summary:")
         print(f"- Generated {len(schema[0]['steps'])} steps")
+        print(f"- Rule hits: {migrator.stats['rule_hits']}")
+        print(f"- LLM calls: {migrator.stats['llm_calls']}")
+        print(f"- Fallback mappings: {migrator.stats['fallbacks']}")
+        if migrator.stats['reused']:
+            print(f"- Reused from the last run: {migrator.stats['reused']}")
+        if migrator.stats['manual_parses']:
+            print("- Actions extracted with manual parsing")
+        if cache.enabled:
+            cache_stats = cache.stats()
+            print(f"- Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                  f"{cache_stats['entries']} entries ({cache_stats['size_bytes']} bytes)")
         print(f"- Output saved to: {output_path}")
+        print_metrics_summary(metrics.summary())
         
     except Exception as e:
         print(f"Error during migration: {e}")
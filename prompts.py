@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import string
+from typing import Any, List, Optional, Tuple
+
+# Most tokens one rendered prompt may use (0 = unlimited). Keep it below the model's context
+# window so there is room left for the completion; Ollama's default window is 4096 tokens.
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3072'))
+
+# Characters per token assumed when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+_encoding: Any = None
+
+
+class PromptBudgetError(ValueError):
+    """A prompt is over the token budget even after trimming the parts that may be shortened"""
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text: counted with tiktoken's cl100k_base encoding if it is installed, otherwise estimated"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            # Not installed, or the encoding file can't be downloaded
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact(text: str) -> str:
+    """Template text without indentation, trailing spaces or runs of blank lines"""
+    lines: List[str] = []
+    for line in text.strip().splitlines():
+        line = line.strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def compact_json(value: Any) -> str:
+    """JSON for a prompt, without the indentation and spaces json.dumps adds by default"""
+    return json.dumps(value, separators=(',', ':'))
+
+
+class PromptTemplate:
+    """A prompt with `{field}` placeholders, compacted and parsed once when it is defined.
+
+    `version` hashes the compacted text, so cache keys change whenever the wording does.
+    render() fills in the fields and enforces a token budget: fields listed in `trimmable` lose
+    lines from their end (in that order) until the prompt fits, and a prompt that still doesn't
+    fit raises PromptBudgetError. Field values are inserted verbatim.
+    """
+
+    def __init__(self, name: str, text: str, trimmable: Tuple[str, ...] = ()):
+        self.name = name
+        self.text = compact(text)
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in string.Formatter().parse(self.text)
+        ]
+        self.fields = tuple(field for _, field in self._parts if field)
+        self.trimmable = trimmable
+        self.version = f"{name}-{hashlib.sha256(self.text.encode('utf-8')).hexdigest()[:12]}"
+        # Tokens used by the fixed text, whatever the fields hold
+        self.base_tokens = count_tokens(''.join(literal for literal, _ in self._parts))
+
+    def _fill(self, values: dict) -> str:
+        return ''.join(literal + (values[field] if field else '') for literal, field in self._parts)
+
+    def render(self, budget: Optional[int] = None, **values: str) -> str:
+        budget = DEFAULT_PROMPT_TOKEN_BUDGET if budget is None else budget
+        prompt = self._fill(values)
+        if budget <= 0:
+            return prompt
+
+        tokens = count_tokens(prompt)
+        for field in self.trimmable:
+            if tokens <= budget:
+                break
+            values[field] = _trim_lines(values[field], tokens - budget)
+            prompt = self._fill(values)
+            tokens = count_tokens(prompt)
+        if tokens > budget:
+            raise PromptBudgetError(f"{self.name} prompt needs {tokens} tokens, over the budget of {budget}")
+        return prompt
+
+    def value_chars(self, budget: int, sample: str) -> int:
+        """Characters of text like `sample` that fit in the fields within budget.
+
+        0 when there is no budget, or when the fixed text alone is over it and no amount of
+        splitting the field values would help.
+        """
+        if budget <= self.base_tokens:
+            return 0
+        chars_per_token = len(sample) / max(count_tokens(sample), 1)
+        return int((budget - self.base_tokens) * chars_per_token)
+
+
+def _trim_lines(text: str, excess: int) -> str:
+    """Drop lines from the end of text until about `excess` tokens are gone"""
+    lines = text.splitlines()
+    while lines and excess > 0:
+        # +1 for the newline joining it to the previous line
+        excess -= count_tokens(lines.pop()) + 1
+    return "\n".join(lines)
+
+
+# Shared by the single and batch mapping prompts
+_MAPPING_RULES = """
+Map the action type correctly: goto -> visit, fill -> type, click -> click, select_option -> select,
+upload -> upload (not in sample but infer structure)
+"""
+
+_EXTRACT_INSTRUCTIONS = """
+Extract each action with its type (goto, fill, click, select_option, upload, hover, etc.), selector
+(CSS selector, ID, etc.), value (if applicable) and description.
+
+Return as JSON with format:
+{{"actions":[{{"action":"goto","selector":"","value":"https://example.com/onboarding/complex","description":"Navigate to onboarding page"}},{{"action":"fill","selector":"#firstName","value":"Gul","description":"Fill first name field"}}]}}
+"""
+
+EXTRACT_PROMPT = PromptTemplate('extract', """
+Analyze this Playwright test script and extract all the actions in a structured format.
+
+Script:
+{script}
+""" + _EXTRACT_INSTRUCTIONS)
+
+# One chunk of a large script: the helpers it calls are shown separately and are the first
+# thing dropped when the prompt is over budget
+EXTRACT_CHUNK_PROMPT = PromptTemplate('extract-chunk', """
+Analyze this Playwright test script and extract all the actions in a structured format.
+
+Script:
+{script}
+
+Definitions used by the script above (imports, helpers, data). Only use them to resolve calls
+and variables in the script above, do not extract actions from them on their own:
+{context}
+""" + _EXTRACT_INSTRUCTIONS, trimmable=('context',))
+
+MAP_PROMPT = PromptTemplate('map', """
+Map this Playwright action to the schema format based on the sample schema structure.
+
+Playwright Action:
+{action}
+
+Sample Schema Commands and their fields (for reference):
+{catalogue}
+
+Generate a schema command in this exact format:
+{{"command":{{"name":"type|click|visit|select|keypress","fields":[{{"name":"field_name","type":"text","label":"Label","value":"actual_value","required":true}}]}}}}
+""" + _MAPPING_RULES, trimmable=('catalogue',))
+
+# Batches that don't fit are split into smaller batches rather than trimmed
+BATCH_MAP_PROMPT = PromptTemplate('batch-map', """
+Map each of these Playwright actions to the schema format based on the sample schema structure.
+
+Playwright Actions:
+{actions}
+
+Sample Schema Commands and their fields (for reference):
+{catalogue}
+
+Return JSON with exactly one entry per action in "commands", in the same order, keeping the "index"
+of the action it was generated from:
+{{"commands":[{{"index":0,"command":{{"name":"type|click|visit|select|keypress","fields":[{{"name":"field_name","type":"text","label":"Label","value":"actual_value","required":true}}]}}}}]}}
+""" + _MAPPING_RULES)
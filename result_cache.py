@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Finished API responses kept in memory (0 disables the cache; identical requests in flight are still coalesced)
+DEFAULT_RESULT_CACHE_SIZE = int(os.getenv('API_RESULT_CACHE_SIZE', '256'))
+# Seconds a finished response is served from memory
+DEFAULT_RESULT_CACHE_TTL = float(os.getenv('API_RESULT_CACHE_TTL', '600'))
+
+
+class CachedResult:
+    """A serialized response body with its ETag.
+
+    The ETag hashes `content`, the part of the body that identifies the result, or the whole body
+    if it isn't given; anything else in the body (like per-run stats) doesn't change it.
+    """
+
+    __slots__ = ('body', 'etag', 'created')
+
+    def __init__(self, body: bytes, content: Optional[bytes] = None):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body if content is None else content).hexdigest()[:32] + '"'
+        self.created = time.monotonic()
+
+
+class ResultCache:
+    """Single-flight coalescing and a bounded LRU with TTL for migration responses.
+
+    get_or_run() returns the cached body for a key, or joins the migration already running for
+    it, or starts one. The migration runs on its own task, so a caller going away doesn't cancel
+    it for the others; failures are passed to every waiting caller and not cached.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = DEFAULT_RESULT_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = DEFAULT_RESULT_CACHE_TTL if ttl is None else ttl
+        self._entries: 'OrderedDict[str, CachedResult]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_key(script_content: str, chunk_size: Optional[int], settings: Dict[str, Any]) -> str:
+        """Hash of the script and everything besides it that decides the response"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([settings, chunk_size], sort_keys=True, separators=(',', ':')).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(script_content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: str, entry: CachedResult):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_run(self, key: str, run: Callable[[], Awaitable[CachedResult]]) -> Tuple[CachedResult, str]:
+        """The response for key and where it came from: 'hit', 'coalesced' or 'miss'"""
+        entry = self.get(key)
+        if entry is not None:
+            return entry, 'hit'
+
+        task = self._inflight.get(key)
+        source = 'coalesced'
+        if task is None:
+            source = 'miss'
+            task = self._inflight[key] = asyncio.ensure_future(self._run(key, run))
+            # Every caller may have gone away by the time it fails; don't log the error as unretrieved
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task), source
+
+    async def _run(self, key: str, run: Callable[[], Awaitable[CachedResult]]) -> CachedResult:
+        try:
+            entry = await run()
+            self._put(key, entry)
+            return entry
+        finally:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,20 +1,165 @@
 #!/usr/bin/env python3
+import argparse
+import gc
 import os
+import signal
+import sys
+import time
+import traceback
+from typing import List, Optional, Set
+
 import uvicorn
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-if __name__ == "__main__":
+STARTED = time.time()
+
+# Seconds a stopping worker gives in-flight requests, and then running jobs, to finish
+DRAIN_TIMEOUT = float(os.getenv('API_DRAIN_TIMEOUT', '30'))
+
+# Exit status of a worker whose app failed to start (as with uvicorn); it isn't replaced
+STARTUP_FAILURE = 3
+
+
+def serve_worker(config: uvicorn.Config, started: float, sockets: Optional[List] = None) -> int:
+    """Serve until told to stop; returns the exit status"""
+    import api
+    api.process_started = started
+    server = uvicorn.Server(config)
+    server.run(sockets=sockets)
+    return 0 if server.started else STARTUP_FAILURE
+
+
+def prefork(config: uvicorn.Config, workers: int) -> int:
+    """Fork `workers` processes serving the socket of an app loaded once in this one.
+
+    The workers share the imported code with this process until they write to it, and each builds its
+    own migrator, LLM clients and job workers in the app's lifespan. A worker that exits unexpectedly
+    is replaced. SIGTERM or SIGINT stops them all, each finishing its requests and running jobs first.
+    """
+    import api
+    start = time.perf_counter()
+    api.preload()
+    print(f"Preloaded LLM client libraries in {time.perf_counter() - start:.3f}s")
+    sock = config.bind_socket()
+    # Objects the workers inherit are left out of garbage collection, which would copy their pages
+    gc.collect()
+    gc.freeze()
+
+    children: Set[int] = set()
+    stopping = False
+
+    def fork_worker():
+        # Output still buffered here would be written again by the worker
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, signal.SIG_DFL)
+            status = 1
+            try:
+                status = serve_worker(config, time.time(), [sock])
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+        children.add(pid)
+
+    def stop(signum=None, frame=None):
+        nonlocal stopping
+        if not stopping:
+            print(f"Stopping {len(children)} workers...")
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        fork_worker()
+
+    status = 0
+    deadline = None
+    while children:
+        pid, wait_status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping and deadline is None:
+                # Requests and then jobs get DRAIN_TIMEOUT each
+                deadline = time.monotonic() + 2 * DRAIN_TIMEOUT + 5
+            if deadline is not None and time.monotonic() > deadline:
+                print(f"Killing {len(children)} workers that didn't stop in time")
+                for child in children:
+                    try:
+                        os.kill(child, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                deadline = float('inf')
+            time.sleep(0.1)
+            continue
+        children.discard(pid)
+        code = os.waitstatus_to_exitcode(wait_status)
+        if stopping:
+            continue
+        if code == STARTUP_FAILURE:
+            print(f"Worker {pid} failed to start")
+            status = STARTUP_FAILURE
+            stop()
+        else:
+            print(f"Worker {pid} exited with status {code}, starting another")
+            fork_worker()
+    sock.close()
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Playwright to Schema Migrator API")
+    parser.add_argument('--host', default=os.getenv('API_HOST', '0.0.0.0'), help="Address to listen on")
+    parser.add_argument('--port', type=int, default=int(os.getenv('API_PORT', '8000')), help="Port to listen on")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('API_WORKERS', '1')),
+                        help="Server processes; more than one pre-forks them from a single loaded app")
+    parser.add_argument('--reload', action='store_true', help="Restart on code changes (development, single worker)")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.reload and args.workers > 1:
+        parser.error("--reload runs a single worker")
+
     # Set your OpenAI API key here or via environment variable
     if not os.getenv("OPENAI_API_KEY"):
         print("Please set OPENAI_API_KEY environment variable")
         print("Example: export OPENAI_API_KEY='your-api-key-here'")
         exit(1)
-    
+
     print("Starting API server...")
-    print("API will be available at: http://localhost:8000")
-    print("API docs at: http://localhost:8000/docs")
-    
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    print(f"API will be available at: http://localhost:{args.port}")
+    print(f"API docs at: http://localhost:{args.port}/docs")
+
+    if args.reload:
+        uvicorn.run("api:app", host=args.host, port=args.port, reload=True)
+        return
+    if args.workers > 1 and not hasattr(os, 'fork'):
+        # No fork on Windows: uvicorn starts each worker as a new process that imports the app itself
+        uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers,
+                    timeout_graceful_shutdown=DRAIN_TIMEOUT)
+        return
+
+    config = uvicorn.Config("api:app", host=args.host, port=args.port, timeout_graceful_shutdown=DRAIN_TIMEOUT)
+    start = time.perf_counter()
+    config.load()
+    print(f"Loaded the app in {time.perf_counter() - start:.3f}s")
+    if args.workers == 1:
+        sys.exit(serve_worker(config, STARTED))
+    print(f"Starting {args.workers} workers")
+    sys.exit(prefork(config, args.workers))
+
+
+if __name__ == "__main__":
+    main()
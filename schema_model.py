@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from selector_analysis import SELECTOR_ANALYSIS_VERSION, analyze_selector
+
+# Slotted dataclasses need Python 3.10; older versions get regular ones
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
+class Target:
+    """One way of locating a css_path field's element, e.g. {"id": 1, "type": "id", "selector": "#email"}"""
+    id: int
+    type: str
+    selector: str
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Target':
+        return cls(data.get('id', 0), data.get('type', ''), data.get('selector', ''))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "type": self.type, "selector": self.selector}
+
+
+_FIELD_KEYS = ('name', 'targets', 'type', 'label', 'place_holder', 'value', 'required', 'is_unique')
+
+
+@dataclass(**_SLOTS)
+class Field:
+    """A command field. Keys the reference schemas use that aren't modelled (e.g. a lookup's
+    `selected` and `values`) are kept in `extra`; optional keys that are None are left out."""
+    name: str
+    type: str = "text"
+    label: str = ""
+    place_holder: Optional[str] = None
+    value: Any = ""
+    required: bool = False
+    is_unique: Optional[bool] = None
+    targets: Optional[List[Target]] = None
+    extra: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Field':
+        targets = data.get('targets')
+        if isinstance(targets, list):
+            targets = [Target.from_dict(target) for target in targets if isinstance(target, dict)]
+        else:
+            targets = None
+        extra = {key: value for key, value in data.items() if key not in _FIELD_KEYS}
+        return cls(data['name'], data.get('type', 'text'), data.get('label', ''), data.get('place_holder'),
+                   data.get('value'), bool(data.get('required', False)), data.get('is_unique'), targets, extra or None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Same key order as the reference schemas
+        data: Dict[str, Any] = {"name": self.name}
+        if self.targets is not None:
+            data["targets"] = [target.to_dict() for target in self.targets]
+        data["type"] = self.type
+        data["label"] = self.label
+        if self.place_holder is not None:
+            data["place_holder"] = self.place_holder
+        if self.value is not None:
+            data["value"] = self.value
+        data["required"] = self.required
+        if self.is_unique is not None:
+            data["is_unique"] = self.is_unique
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+@dataclass(**_SLOTS)
+class Command:
+    name: str
+    fields: List[Field]
+    extra: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Command':
+        extra = {key: value for key, value in data.items() if key not in ('name', 'fields')}
+        return cls(data['name'], [Field.from_dict(field) for field in data.get('fields', [])], extra or None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"name": self.name, "fields": [field.to_dict() for field in self.fields]}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+@dataclass(**_SLOTS)
+class Step:
+    command: Command
+    order: int
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, Any], order: int) -> 'Step':
+        """Step from a mapping result ({"command": {...}}, as cached and stored in the manifest)"""
+        return cls(Command.from_dict(mapping['command']), order)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"command": self.command.to_dict(), "order": self.order}
+
+
+def selector_targets(selector: str) -> List[Target]:
+    """Ranked css_path targets for a Playwright selector (see selector_analysis.analyze_selector)"""
+    return [Target(i, kind, value) for i, (kind, value) in enumerate(analyze_selector(selector), 1)]
+
+
+_NAMED_SELECTOR = re.compile(r'#([\w-]+)|\[(?:name|id|data-testid)=["\']?([^"\'\]]+)')
+
+
+def selector_name(selector: str) -> str:
+    """The id or name a selector refers to ("#firstName" -> "firstName"), else the selector itself"""
+    matches = _NAMED_SELECTOR.findall(selector)
+    if matches:
+        return next(part for part in matches[-1] if part)
+    return selector
+
+
+@dataclass(frozen=True, **_SLOTS)
+class FieldTemplate:
+    """A field whose static parts are fixed and whose value comes from the action.
+
+    `source` is the action key the value is read from ('value', 'selector' or 'description');
+    'selector_name' uses selector_name() of the selector, and None always uses `default`.
+    """
+    name: str
+    label: str
+    place_holder: str
+    source: Optional[str] = None
+    default: Any = ""
+    type: str = "text"
+    required: bool = True
+    is_unique: Optional[bool] = None
+    targets: bool = False
+
+    def build(self, action: Dict[str, Any]) -> Field:
+        if self.source == 'selector_name':
+            value = selector_name(action.get('selector') or '')
+        elif self.source is not None:
+            value = action.get(self.source, self.default)
+        else:
+            value = self.default
+        targets = selector_targets(action.get('selector') or '') if self.targets else None
+        return Field(self.name, self.type, self.label, self.place_holder, value, self.required, self.is_unique, targets)
+
+
+@dataclass(frozen=True, **_SLOTS)
+class CommandTemplate:
+    name: str
+    fields: Tuple[FieldTemplate, ...]
+
+    def build(self, action: Dict[str, Any]) -> Command:
+        return Command(self.name, [field.build(action) for field in self.fields])
+
+
+def _css_path() -> FieldTemplate:
+    return FieldTemplate('css_path', "CSS Path", "Enter CSS Path", 'selector', targets=True)
+
+
+def _description() -> FieldTemplate:
+    return FieldTemplate('description', "Description", "Enter Description", 'description', required=False)
+
+
+# Playwright action type -> schema command, with the fields and labels used by sample_schemas/CustomerCreate.json
+# (upload and hover have no example there and follow the same conventions)
+FALLBACK_TEMPLATES: Dict[str, CommandTemplate] = {
+    'goto': CommandTemplate('visit', (
+        FieldTemplate('visit', "Browse to URL", "Browse to URL", 'value'),
+        _description(),
+    )),
+    'fill': CommandTemplate('type', (
+        FieldTemplate('name', "Name", "Enter Value", 'value', is_unique=False),
+        FieldTemplate('field_name', "Label Name", "Enter Label Name", 'selector_name'),
+        _css_path(),
+        _description(),
+    )),
+    'click': CommandTemplate('click', (
+        FieldTemplate('name', "Name", "Enter Name", 'description', default="Click element"),
+        FieldTemplate('force_click', "Force Invisible Element", "", type='checkbox', required=False),
+        _css_path(),
+        _description(),
+    )),
+    'select_option': CommandTemplate('select', (
+        FieldTemplate('value', "Value", "Enter Value", 'value'),
+        FieldTemplate('field_name', "Field Name", "Field Name", 'selector_name'),
+        _css_path(),
+        _description(),
+    )),
+    'upload': CommandTemplate('upload', (
+        FieldTemplate('name', "Name", "Enter Name", 'description', default="Upload file"),
+        _css_path(),
+        FieldTemplate('file_path', "File Path", "Enter File Path", 'value'),
+        _description(),
+    )),
+    'hover': CommandTemplate('hover', (
+        FieldTemplate('name', "Name", "Enter Name", 'description', default="Hover element"),
+        _css_path(),
+        _description(),
+    )),
+}
+
+# Changes whenever a template or the targets built for selectors do, so results built from older ones aren't reused
+TEMPLATES_VERSION = hashlib.sha256(
+    repr((sorted(FALLBACK_TEMPLATES.items()), SELECTOR_ANALYSIS_VERSION)).encode('utf-8')).hexdigest()[:12]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (Target, Field, Command, Step)):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any, compact: bool = False) -> bytes:
+    """UTF-8 JSON for schemas and reports, with orjson if it is installed.
+
+    Indented by two spaces like json.dump(indent=2) unless `compact`; models are written with
+    their to_dict() shape.
+    """
+    if orjson is not None:
+        option = orjson.OPT_PASSTHROUGH_DATACLASS | (0 if compact else orjson.OPT_INDENT_2)
+        return orjson.dumps(value, default=_default, option=option)
+    if compact:
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(value, default=_default, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def dump(value: Any, path: str, compact: bool = False):
+    with open(path, 'wb') as f:
+        f.write(dumps(value, compact))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+
+class SchemaRegistry:
+    """Named reference schemas, parsed once and reloaded only when the file changes on disk"""
+
+    def __init__(self, schemas: Optional[Dict[str, str]] = None):
+        self._paths: Dict[str, str] = {}
+        # name -> (mtime, parsed schema)
+        self._loaded: Dict[str, Tuple[float, Any]] = {}
+        # (name, mtime) pairs the cached catalogue was built from
+        self._catalogue_key: Optional[Tuple[Tuple[str, float], ...]] = None
+        self._catalogue: List[Dict[str, Any]] = []
+        self._catalogue_text = ""
+        self._missing: set = set()
+        self._lock = threading.Lock()
+
+        for name, path in (schemas or {}).items():
+            self.register(name, path)
+
+    def register(self, name: str, path: str):
+        """Add or replace a named reference schema"""
+        with self._lock:
+            self._paths[name] = path
+            self._loaded.pop(name, None)
+            self._catalogue_key = None
+
+    def names(self) -> List[str]:
+        return list(self._paths)
+
+    def get(self, name: str) -> Any:
+        """Return the parsed schema, reloading it if the file's mtime changed"""
+        with self._lock:
+            return self._load(name)
+
+    def _load(self, name: str) -> Any:
+        path = self._paths[name]
+        mtime = os.path.getmtime(path)
+        cached = self._loaded.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, 'r') as f:
+            schema = json.load(f)
+        self._loaded[name] = (mtime, schema)
+        return schema
+
+    def catalogue(self) -> List[Dict[str, Any]]:
+        """Compact list of commands with their field names and css_path target types"""
+        with self._lock:
+            self._refresh_catalogue()
+            return self._catalogue
+
+    def catalogue_text(self) -> str:
+        """Catalogue rendered as prompt lines, e.g. '- type: name, field_name, css_path[id|name]'"""
+        with self._lock:
+            self._refresh_catalogue()
+            return self._catalogue_text
+
+    def _refresh_catalogue(self):
+        key = []
+        for name, path in self._paths.items():
+            try:
+                key.append((name, os.path.getmtime(path)))
+            except OSError:
+                if name not in self._missing:
+                    self._missing.add(name)
+                    print(f"Reference schema '{name}' not found at {path}, skipping")
+        key = tuple(key)
+        if key == self._catalogue_key:
+            return
+
+        # command name -> {"fields": [...], "target_types": [...]}, in order of first appearance
+        commands: Dict[str, Dict[str, List[str]]] = {}
+        for name, _ in key:
+            for test in self._iter_tests(self._load(name)):
+                for step in test.get('steps', []):
+                    command = step.get('command') or {}
+                    if not command.get('name'):
+                        continue
+                    entry = commands.setdefault(command['name'], {"fields": [], "target_types": []})
+                    for field in command.get('fields', []):
+                        if field.get('name') and field['name'] not in entry['fields']:
+                            entry['fields'].append(field['name'])
+                        for target in field.get('targets') or []:
+                            if target.get('type') and target['type'] not in entry['target_types']:
+                                entry['target_types'].append(target['type'])
+
+        self._catalogue = [{"name": name, **entry} for name, entry in commands.items()]
+        lines = []
+        for command in self._catalogue:
+            fields = []
+            for field in command['fields']:
+                if field == 'css_path' and command['target_types']:
+                    field = f"css_path[{'|'.join(command['target_types'])}]"
+                fields.append(field)
+            lines.append(f"- {command['name']}: {', '.join(fields)}")
+        self._catalogue_text = "\n".join(lines)
+        self._catalogue_key = key
+
+    def _iter_tests(self, schema: Any) -> List[Dict[str, Any]]:
+        if isinstance(schema, dict):
+            return [schema]
+        return [test for test in schema if isinstance(test, dict)]
+
+
+def default_reference_schemas() -> Dict[str, str]:
+    """Reference schemas from SAMPLE_SCHEMA_PATH plus any 'name=path' pairs in REFERENCE_SCHEMAS"""
+    sample_schema_path = os.getenv(
+        'SAMPLE_SCHEMA_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_schemas', 'CustomerCreate.json')
+    )
+    schemas = {os.path.splitext(os.path.basename(sample_schema_path))[0]: sample_schema_path}
+
+    for entry in os.getenv('REFERENCE_SCHEMAS', '').split(','):
+        if '=' in entry:
+            name, path = entry.split('=', 1)
+            schemas[name.strip()] = path.strip()
+    return schemas
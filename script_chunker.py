@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import ast
+from typing import List, Tuple
+
+# Largest share of a chunk the repeated definitions may take before chunks are allowed to exceed the budget
+MAX_CONTEXT_SHARE = 0.75
+
+
+def split_script(source: str, max_chars: int) -> Tuple[str, List[str]]:
+    """Split a script into chunks of about max_chars for separate extraction prompts.
+
+    Returns (context, chunks). Imports, helper functions, non-test classes and module-level
+    assignments form the context, which is sent with every chunk for reference only. Test
+    functions and other executable statements are packed into chunks in source order, splitting
+    on statement boundaries. A statement too large for one chunk is split inside its body, and
+    every piece keeps the statement's header line (e.g. `def test_checkout(page):`). Scripts
+    that aren't valid Python are split on line boundaries.
+    """
+    if max_chars <= 0 or len(source) <= max_chars:
+        return "", [source]
+
+    lines = source.splitlines(keepends=True)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return "", _pack(lines, max_chars)
+
+    context: List[str] = []
+    statements: List[Tuple[ast.stmt, int]] = []
+    previous_end = 0
+    for node in tree.body:
+        # Each statement takes the comments and blank lines before it
+        if _is_definition(node):
+            context.append(''.join(lines[previous_end:node.end_lineno]))
+        else:
+            statements.append((node, previous_end))
+        previous_end = node.end_lineno
+
+    # The context goes with every chunk, so it comes out of each chunk's budget
+    context_text = ''.join(context)
+    budget = max(max_chars - len(context_text), int(max_chars * (1 - MAX_CONTEXT_SHARE)))
+    units: List[str] = []
+    for node, start in statements:
+        units.extend(_split_node(lines, node, start, budget))
+    if previous_end < len(lines) and units:
+        units[-1] += ''.join(lines[previous_end:])
+    return context_text, _pack(units, budget)
+
+
+def _is_definition(node: ast.stmt) -> bool:
+    """Statements that only define things the executable code uses"""
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.Assign, ast.AnnAssign)):
+        return True
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return not node.name.startswith('test')
+    if isinstance(node, ast.ClassDef):
+        return not node.name.startswith('Test')
+    # Module docstring
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def _split_node(lines: List[str], node: ast.stmt, start: int, max_chars: int) -> List[str]:
+    """Source of a statement (from line index `start`) as one unit, or as header-prefixed pieces of its body"""
+    text = ''.join(lines[start:node.end_lineno])
+    body = getattr(node, 'body', None)
+    if len(text) <= max_chars or not isinstance(body, list) or not body:
+        return [text]
+
+    header = ''.join(lines[start:body[0].lineno - 1])
+    pieces: List[str] = []
+    previous_end = body[0].lineno - 1
+    for child in body:
+        pieces.extend(_split_node(lines, child, previous_end, max_chars - len(header)))
+        previous_end = child.end_lineno
+    # else/except/finally blocks after the body
+    tail = ''.join(lines[previous_end:node.end_lineno])
+    if tail.strip():
+        pieces.append(tail)
+    return [header + chunk for chunk in _pack(pieces, max_chars - len(header))]
+
+
+def _pack(units: List[str], max_chars: int) -> List[str]:
+    """Greedily join consecutive units into chunks of at most max_chars (a larger unit stays whole)"""
+    chunks: List[str] = []
+    current = ""
+    for unit in units:
+        if current and len(current) + len(unit) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += unit
+    if current.strip():
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Changes whenever analyze_selector's output does, so results built with older targets aren't reused
+SELECTOR_ANALYSIS_VERSION = 2
+
+# Target types in the order a runner should try them, most stable first (as in sample_schemas/CustomerCreate.json)
+TARGET_TYPES = ('id', 'name', 'linkText', 'css:finder', 'xpath:full', 'xpath:link', 'xpath:attributes', 'xpath:img',
+                'xpath:innerText')
+
+# Distinct selectors whose analysis is kept for the rest of the run
+SELECTOR_CACHE_SIZE = 4096
+
+# Implicit element (and attributes) of the ARIA roles get_by_role is mostly used with
+_ROLE_ELEMENTS: Dict[str, Tuple[str, Dict[str, str]]] = {
+    'button': ('button', {}),
+    'link': ('a', {}),
+    'textbox': ('input', {}),
+    'checkbox': ('input', {'type': 'checkbox'}),
+    'radio': ('input', {'type': 'radio'}),
+    'combobox': ('select', {}),
+    'img': ('img', {}),
+}
+
+_QUOTED = r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\''
+
+# Simple selectors of a CSS compound. Escaped characters are allowed in ids (#fieldName\:TITLE), except
+# hexadecimal escapes; only exact [attr=value] matches become attributes.
+_CSS_PART = re.compile(
+    r'#(?P<id>(?:[\w-]|\\[^0-9a-fA-F\s])+)'
+    r'|\.(?P<class>[\w-]+)'
+    r'|\[\s*(?P<attr>[\w:-]+)\s*(?:(?P<op>[~|^$*]?=)\s*(?P<value>' + _QUOTED + r'|[^\]\s]+)\s*[is]?\s*)?\]'
+    r'|:(?:has-text|text|text-is)\((?P<text>' + _QUOTED + r')\)'
+    r'|::?[\w-]+(?:\((?:' + _QUOTED + r'|[^)])*\))?'
+)
+_CSS_TAG = re.compile(r'[a-zA-Z][\w-]*|\*')
+_ROLE = re.compile(r'role=(?P<role>[\w-]+)(?P<attributes>(?:\[[^\]]*\])*)$')
+_ROLE_ATTRIBUTE = re.compile(r'\[\s*([\w-]+)\s*=\s*(' + _QUOTED + r'|[^\]]*)\]')
+# Last step of an XPath that names the element by an attribute, e.g. //input[@id='email']
+_XPATH_ATTRIBUTE = re.compile(r'\[@(id|name)\s*=\s*(' + _QUOTED + r')\]\)?(?:\[\d+\])?$')
+
+
+class _Element:
+    """What a selector says about the element it locates"""
+
+    def __init__(self):
+        self.tag: Optional[str] = None
+        self.classes: List[str] = []
+        self.attributes: Dict[str, str] = {}
+        self.text: Optional[str] = None
+        self.label: Optional[str] = None
+        self.nth: Optional[int] = None
+        # Set when the selector constrains the element in ways no target expresses (pseudo-classes, partial matches)
+        self.partial = False
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value.strip()
+
+
+def _literal(text: str) -> str:
+    """XPath string literal for text, whatever quotes it contains"""
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    return "concat('" + text.replace("'", "', \"'\", '") + "')"
+
+
+def _split(selector: str, separators: str) -> List[str]:
+    """Parts of a selector split on any of `separators` outside brackets, parentheses and quotes"""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, char in enumerate(selector):
+        if quote:
+            if char == quote and selector[i - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '[(':
+            depth += 1
+        elif char in '])':
+            depth -= 1
+        elif depth == 0 and char in separators:
+            parts.append(selector[start:i])
+            start = i + 1
+    parts.append(selector[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _css_element(css: str) -> Optional[_Element]:
+    """The element a single CSS compound (e.g. input#email[name=email]) describes"""
+    element = _Element()
+    tag = _CSS_TAG.match(css)
+    position = 0
+    if tag:
+        element.tag = None if tag.group() == '*' else tag.group().lower()
+        position = tag.end()
+    while position < len(css):
+        part = _CSS_PART.match(css, position)
+        if part is None:
+            return None
+        if part.group('id'):
+            element.attributes['id'] = re.sub(r'\\(.)', r'\1', part.group('id'))
+        elif part.group('class'):
+            element.classes.append(part.group('class'))
+        elif part.group('text'):
+            element.text = _unquote(part.group('text'))
+        elif part.group('attr') and part.group('op') == '=':
+            element.attributes[part.group('attr')] = _unquote(part.group('value'))
+        else:
+            element.partial = True
+        position = part.end()
+    return element
+
+
+def _part_element(part: str) -> Tuple[Optional[_Element], bool]:
+    """The element one `>>` part of a Playwright selector describes (None for unsupported engines or
+    selector lists) and whether ancestors in the part scope it"""
+    engine, _, body = part.partition('=')
+    if engine in ('text', 'label'):
+        element = _Element()
+        setattr(element, engine, _unquote(body))
+        return element, False
+    if engine in ('id', 'data-testid', 'data-test-id', 'data-test'):
+        element = _Element()
+        element.attributes[engine] = _unquote(body)
+        return element, False
+    if engine == 'role':
+        role = _ROLE.match(part)
+        if role is None:
+            return None, False
+        element = _Element()
+        element.tag, attributes = _ROLE_ELEMENTS.get(role.group('role'), (None, {'role': role.group('role')}))
+        element.attributes.update(attributes)
+        options = {key: _unquote(value) for key, value in _ROLE_ATTRIBUTE.findall(role.group('attributes'))}
+        if 'name' in options:
+            # The accessible name of a button or link is its text, of an image its alt text
+            if element.tag == 'img':
+                element.attributes['alt'] = options['name']
+            elif element.tag in ('button', 'a') or element.tag is None:
+                element.text = options['name']
+            else:
+                element.label = options['name']
+        return element, False
+    if part.startswith('css='):
+        part = part[len('css='):]
+    if len(_split(part, ',')) != 1:
+        return None, False
+    compounds = _split(part, ' >+~')
+    return _css_element(compounds[-1]), len(compounds) > 1
+
+
+def _xpath_element(xpath: str) -> Optional[_Element]:
+    match = _XPATH_ATTRIBUTE.search(xpath)
+    if match is None:
+        return None
+    element = _Element()
+    element.attributes[match.group(1)] = _unquote(match.group(2))
+    return element
+
+
+def _element(selector: str) -> Tuple[Optional[_Element], bool]:
+    """The element a Playwright selector locates and whether it is scoped by other parts of the chain"""
+    parts = [part.strip() for part in selector.split(' >> ')]
+    element, scoped = None, False
+    nth, text, located = None, None, 0
+    for part in parts:
+        engine, _, body = part.partition('=')
+        if engine == 'nth':
+            nth = int(body) if body.lstrip('-').isdigit() else None
+        elif engine == 'has-text':
+            text = _unquote(body)
+        elif engine == 'visible':
+            continue
+        else:
+            located += 1
+            element, scoped = _part_element(part)
+            nth = text = None
+    if element is not None:
+        element.nth = nth
+        if text is not None and element.text is None:
+            element.text = text
+    return element, scoped or located > 1
+
+
+def _indexed(xpath: str, nth: Optional[int]) -> str:
+    position = 'last()' if nth == -1 else str((nth or 0) + 1)
+    return f"({xpath})[{position}]"
+
+
+def _element_targets(element: _Element, scoped: bool) -> List[Tuple[str, str]]:
+    """Targets derived from what the selector says about the element"""
+    targets = []
+    attributes = element.attributes
+    if 'id' in attributes:
+        targets.append(('id', '#' + attributes['id']))
+    if scoped:
+        # Anything but the id would also match elements outside the chain's scope
+        return targets
+    if 'name' in attributes:
+        targets.append(('name', attributes['name']))
+    if element.partial:
+        return targets
+
+    tag = element.tag or '*'
+    predicates = ''.join(f"[contains(concat(' ',normalize-space(@class),' '),' {name} ')]" for name in element.classes)
+    predicates += ''.join(f"[@{key}={_literal(value)}]" for key, value in attributes.items())
+    if element.label:
+        label = _literal(element.label)
+        predicates += f"[@aria-label={label} or @id=//label[contains(.,{label})]/@for]"
+    if 'alt' in attributes:
+        targets.append(('xpath:img', _indexed(f"//img[@alt={_literal(attributes['alt'])}]", element.nth)))
+    if element.text is None:
+        xpath = _indexed(f"//{tag}{predicates}", element.nth)
+        # An image found by its alt text alone is the xpath:img target already
+        if predicates and (tag, list(attributes)) != ('img', ['alt']):
+            targets.append(('xpath:attributes', xpath))
+        return targets
+
+    text = _literal(element.text)
+    if element.tag == 'a' or attributes.get('role') == 'link':
+        targets.append(('linkText', element.text))
+        targets.append(('xpath:link', _indexed(f"//a[contains(text(),{text})]", element.nth)))
+    if element.tag or predicates:
+        xpath = f"//{tag}{predicates}[contains(.,{text})]"
+    else:
+        # Only elements with the text of their own, not every ancestor containing it
+        xpath = f"//*[text()[contains(.,{text})]]"
+    targets.append(('xpath:innerText', xpath if element.nth is None else _indexed(xpath, element.nth)))
+    return targets
+
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def analyze_selector(selector: str) -> Tuple[Tuple[str, str], ...]:
+    """Ranked (type, selector) targets that locate the element of a Playwright selector.
+
+    Reads CSS, XPath and the selectors the extractors build from locator() and get_by_* calls
+    (text=, role=, label=, [placeholder=...], [data-testid=...], chained with >> and narrowed by
+    nth= or has-text=). The selector as written is always one of them: css:finder, or xpath:full
+    for an XPath. The others are id, name, linkText and XPaths by attribute, link text, alt text
+    or inner text, ordered as TARGET_TYPES. An element scoped by ancestors or earlier parts of a
+    chain only gets an id target, which is unique on the page anyway, and one constrained by
+    pseudo-classes or partial attribute matches only gets id and name targets. Results are
+    cached per selector string.
+    """
+    selector = selector.strip()
+    if not selector:
+        return ()
+    if selector.startswith(('/', '(/', 'xpath=')):
+        xpath = selector[len('xpath='):] if selector.startswith('xpath=') else selector
+        targets = [('xpath:full', xpath)]
+        element = _xpath_element(xpath)
+        if element is not None:
+            # Steps before the last one scope the element
+            targets.extend(_element_targets(element, scoped='/' in xpath.lstrip('(/')))
+    else:
+        targets = [('css:finder', selector)]
+        element, scoped = _element(selector)
+        if element is not None:
+            targets.extend(_element_targets(element, scoped))
+
+    ranked, types, xpaths = [], set(), set()
+    for kind, value in sorted(targets, key=lambda target: TARGET_TYPES.index(target[0])):
+        # One target per type, and an XPath only once whichever type found it first
+        if kind in types or (kind.startswith('xpath:') and value in xpaths):
+            continue
+        types.add(kind)
+        if kind.startswith('xpath:'):
+            xpaths.add(value)
+        ranked.append((kind, value))
+    return tuple(ranked)
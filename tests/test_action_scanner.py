@@ -0,0 +1,52 @@
+import glob
+import json
+import os
+
+import pytest
+
+from action_scanner import base_url, scan_actions
+from benchmarks.scanner_bench import multi_pass, synthetic_script
+from conftest import ROOT
+
+SAMPLE_SCRIPTS = sorted(glob.glob(os.path.join(ROOT, 'sample_scripts', '*.py')))
+
+
+def identities(actions):
+    return sorted(json.dumps({key: action[key] for key in ('action', 'selector', 'value', 'description')},
+                             sort_keys=True) for action in actions)
+
+
+@pytest.mark.parametrize('path', SAMPLE_SCRIPTS, ids=os.path.basename)
+def test_sample_scripts_match_the_old_parser(path):
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    assert identities(scan_actions(source)) == identities(multi_pass(source))
+
+
+@pytest.mark.parametrize('actions', [12, 120, 1200])
+def test_synthetic_scripts_match_the_old_parser(actions):
+    source = synthetic_script(actions)
+    assert identities(scan_actions(source)) == identities(multi_pass(source))
+
+
+def test_positions_and_source_order():
+    source = (
+        'page.goto("https://example.com/login")\n'
+        'text_fields_login = {\n'
+        '    "#email": "a@b.c",\n'
+        '}\n'
+        '    page.click("#submit")\n'
+        'page.goto("https://example.com/other")\n'
+    )
+    actions = scan_actions(source)
+    assert [(action['action'], action['line'], action['column']) for action in actions] == [
+        ('goto', 1, 1), ('fill', 3, 5), ('click', 5, 5)]
+    assert actions[1]['selector'] == '#email' and actions[1]['value'] == 'a@b.c'
+
+
+def test_base_url():
+    assert base_url(scan_actions('page.goto("https://example.com:8080/app/login")')) == "https://example.com:8080"
+    assert base_url(scan_actions('page.goto("/login")')) == ""
+    assert base_url(scan_actions('print("no navigation")')) == ""
+    # Extracted by the LLM, which may leave the value out
+    assert base_url([{"action": "click", "selector": "#a"}, {"action": "goto", "selector": ""}]) == ""
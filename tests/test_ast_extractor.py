@@ -0,0 +1,80 @@
+import ast_extractor
+from ast_extractor import extract_actions
+
+HELPERS = '''
+def login(page, user):
+    page.fill("#user", user)
+    page.click("#go")
+
+def test_login(page):
+    page.goto("https://example.com")
+    login(page, "alice")
+    login(page, "bob")
+'''
+
+
+def test_inlined_helper_actions_get_call_site_lines():
+    actions, unresolved = extract_actions(HELPERS)
+    assert unresolved == []
+    assert [(action['action'], action['value'], action['line']) for action in actions] == [
+        ('goto', 'https://example.com', 7), ('fill', 'alice', 8), ('click', '', 8), ('fill', 'bob', 9), ('click', '', 9)]
+
+
+def test_loops_without_actions_are_skipped():
+    actions, unresolved = extract_actions('''
+def test_sum(page):
+    total = 0
+    for i in range(1000000000000):
+        total += i
+    page.click("#done")
+    page.fill("#total", total)
+''')
+    # total is unknown after the skipped loop, so the fill keeps it as written
+    assert [(action['selector'], action['value']) for action in actions] == [('#done', ''), ('#total', 'total')]
+    assert unresolved == []
+
+
+def test_step_budget_hands_the_rest_to_the_llm(monkeypatch):
+    monkeypatch.setattr(ast_extractor, 'MAX_STEPS', 1000)
+    actions, unresolved = extract_actions('''
+def test_poll(page):
+    page.goto("https://example.com")
+    for i in range(1000000000):
+        if i == 5:
+            page.click("#five")
+    page.click("#after")
+''')
+    assert [action['action'] for action in actions] == ['goto']
+    # The loop is handed over whole, the iterations already run are dropped
+    assert [entry['line'] for entry in unresolved] == [4, 7]
+    assert all(entry['index'] == 1 for entry in unresolved)
+
+
+def test_huge_values_are_not_built():
+    actions, unresolved = extract_actions('''
+def test_big(page):
+    for i in list(range(1000000000)):
+        page.click("#a")
+    page.fill("#b", "x" * 1000000000)
+''')
+    assert [action['value'] for action in actions] == ['"x" * 1000000000']
+    assert [entry['line'] for entry in unresolved] == [3]
+
+
+def extracted_value(expression):
+    actions, _ = extract_actions('n = 300000000\ndef test_value(page):\n    page.fill("#x", ' + expression + ')\n')
+    return actions[0]['value']
+
+
+def test_oversized_strings_are_kept_as_written():
+    for expression in ('f"{\'a\':>300000000}"', 'f"{1.5:.300000000f}"', 'f"{\'a\':>{n}}"', '"%300000000s" % "a"',
+                       '"%*s" % (n, "a")', '"{:>300000000}".format("a")', '"a" * 50000 + "b" * 60000',
+                       '"ab".replace("", "x" * 90000)', '"-".join(["x" * 60000, "y" * 60000])'):
+        assert extracted_value(expression) == expression
+
+
+def test_ordinary_formatting_is_evaluated():
+    assert extracted_value('f"{\'ok\':>4}"') == '  ok'
+    assert extracted_value('"%-3s|" % "ab"') == 'ab |'
+    assert extracted_value('"{0:05.1f}".format(3.14159)') == '003.1'
+    assert extracted_value('", ".join(["a", "b"]) + "c" * 2') == 'a, bcc'
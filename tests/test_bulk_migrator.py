@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bulk_migrator
+from async_migrator import AsyncPlaywrightToSchemaMigrator
+from bulk_migrator import BulkMigrator
+from llm_cache import LLMCache
+
+SCRIPT = '''
+def test_login(page):
+    page.goto("https://example.com/login")
+    page.fill("#user", "{user}")
+    page.click("#go")
+'''
+
+
+def write_scripts(directory, users):
+    paths = []
+    for user in users:
+        path = directory / f"test_{user}.py"
+        path.write_text(SCRIPT.format(user=user))
+        paths.append(str(path))
+    return paths
+
+
+def bulk(tmp_path, **kwargs):
+    migrator = AsyncPlaywrightToSchemaMigrator(mapping_policy='rules-first', cache=LLMCache(enabled=False),
+                                               extraction_engine='ast')
+    return BulkMigrator(migrator, output_dir=str(tmp_path / "out"), root=str(tmp_path), **kwargs)
+
+
+def test_unchanged_scripts_are_skipped(tmp_path):
+    paths = write_scripts(tmp_path, ["alice", "bob"])
+    assert bulk(tmp_path, processes=1).migrate(paths)["summary"]["migrated"] == 2
+
+    (tmp_path / "test_bob.py").write_text(SCRIPT.format(user="carol"))
+    report = bulk(tmp_path, processes=1).migrate(paths)
+    assert [(entry["path"], entry["status"]) for entry in report["files"]] == [
+        (paths[0], "skipped"), (paths[1], "migrated")]
+    assert report["files"][1]["diff"] == {"added": 0, "removed": 0, "modified": 1}
+
+
+def test_files_in_flight_are_bounded(tmp_path, monkeypatch):
+    paths = write_scripts(tmp_path, [f"user{i}" for i in range(8)])
+    in_flight, peak = 0, 0
+    parse_script = bulk_migrator.parse_script
+    migrate_parsed = BulkMigrator._migrate_parsed
+
+    def counting_parse(*args):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        return parse_script(*args)
+
+    async def slow_migrate(self, parsed, semaphore):
+        nonlocal in_flight
+        await asyncio.sleep(0.01)
+        entry = await migrate_parsed(self, parsed, semaphore)
+        in_flight -= 1
+        return entry
+
+    # Threads rather than processes, so the counters are shared
+    monkeypatch.setattr(bulk_migrator, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(bulk_migrator, 'parse_script', counting_parse)
+    monkeypatch.setattr(BulkMigrator, '_migrate_parsed', slow_migrate)
+    report = bulk(tmp_path, processes=2, concurrency=1).migrate(paths)
+    assert report["summary"]["migrated"] == 8
+    assert peak <= 3
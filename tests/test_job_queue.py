@@ -0,0 +1,85 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from job_queue import JobQueue, JobStore
+
+
+class FakeMigrator:
+    def __init__(self):
+        self.stats = {}
+
+    def for_run(self):
+        return self
+
+    async def amigrate_content(self, script_content, chunk_size=None):
+        await asyncio.sleep(0.01)
+        return [{"name": script_content, "steps": [{"order": 1}]}]
+
+
+async def wait_for(queue, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await queue.get(job_id)
+        if job['status'] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never became {status}")
+
+
+def test_jobs_run_and_store_results(tmp_path):
+    async def run():
+        queue = JobQueue(FakeMigrator(), JobStore(str(tmp_path / "jobs.sqlite3")), workers=2, poll_interval=0.05)
+        await queue.start()
+        submitted = await queue.submit([{"name": "a", "code": "login"}, {"name": "b", "code": "logout"}], "client")
+        for job_id in submitted["jobs"]:
+            assert (await wait_for(queue, job_id, 'done'))['steps'] == 1
+        assert (await queue.result(submitted["jobs"][1]))[0]["name"] == "logout"
+        assert [job['name'] for job in await queue.list(client="client")] == ["b", "a"]
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_store_lock_held_elsewhere_does_not_block_the_loop(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    JobStore(path).counts()
+    other = sqlite3.connect(path, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    # Another process's write transaction, released after a while
+    threading.Timer(0.5, other.rollback).start()
+
+    async def run():
+        queue = JobQueue(FakeMigrator(), JobStore(path), workers=1, poll_interval=0.05)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.ensure_future(ticker())
+        await queue.start()
+        submitted = await queue.submit([{"name": "a", "code": "login"}], "client")
+        await wait_for(queue, submitted["jobs"][0], 'done')
+        ticking.cancel()
+        await queue.stop()
+        return ticks
+
+    # The loop kept running while the store waited for the lock
+    assert asyncio.run(run()) >= 20
+    other.close()
+
+
+def test_cancel_queued_job(tmp_path):
+    async def run():
+        queue = JobQueue(FakeMigrator(), JobStore(str(tmp_path / "jobs.sqlite3")), workers=1)
+        submitted = await queue.submit([{"name": "a", "code": "login"}], "client")
+        # Workers not started, so the job is still queued
+        assert (await queue.cancel(submitted["jobs"][0]))['status'] == 'cancelled'
+        assert await queue.cancel("missing") is None
+        await queue.stop()
+
+    asyncio.run(run())
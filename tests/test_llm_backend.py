@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_backend import CircuitBreaker, LLMBackend, LLMBackendError, OllamaBackend
+
+
+class FakeBackend(LLMBackend):
+    """Answers (or fails) from a list of outcomes, without a server"""
+    name = 'fake'
+
+    def __init__(self, outcomes, **kwargs):
+        super().__init__('fake-model', backoff_base=0, backoff_max=0, **kwargs)
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def _request(self, prompt, schema=None):
+        return self._next()
+
+    async def _arequest(self, prompt, schema=None):
+        outcome = self._next()
+        if outcome == 'hang':
+            await asyncio.sleep(60)
+        return outcome
+
+
+def half_open(breaker: CircuitBreaker):
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_trial_through_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    half_open(breaker)
+    assert breaker.allow() == 'trial'
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() == 'call'
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    half_open(breaker)
+    assert breaker.allow() == 'trial'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+
+def test_generate_retries_then_opens_breaker():
+    backend = FakeBackend([LLMBackendError("down")] * 2, max_retries=1,
+                          breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    assert backend.generate("prompt") == ""
+    assert backend.calls == 2
+    assert backend.breaker.state == 'open'
+    # Rejected without calling the backend
+    assert backend.generate("prompt") == ""
+    assert backend.calls == 2
+
+
+def test_cancelled_trial_frees_half_open_slot():
+    backend = FakeBackend(['hang'], max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    backend.breaker.record_failure()
+    half_open(backend.breaker)
+
+    async def cancel_trial():
+        task = asyncio.ensure_future(backend.agenerate("prompt"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert backend.breaker.state == 'half-open'
+    assert backend.breaker.allow() == 'trial'
+
+
+def test_unexpected_error_frees_half_open_slot():
+    backend = FakeBackend([KeyError('choices')], max_retries=0,
+                          breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    backend.breaker.record_failure()
+    half_open(backend.breaker)
+    with pytest.raises(KeyError):
+        backend.generate("prompt")
+    assert backend.breaker.allow() == 'trial'
+
+
+@pytest.mark.parametrize('body', ['<html>502 Bad Gateway</html>', '["not", "an", "object"]'])
+def test_malformed_ollama_response_is_a_backend_error(body):
+    with pytest.raises(LLMBackendError) as error:
+        OllamaBackend._completion(body)
+    assert not error.value.retryable
+
+
+def test_ollama_completion_text():
+    assert OllamaBackend._completion('{"response": "[]", "done": true}') == "[]"
@@ -0,0 +1,75 @@
+import asyncio
+import sqlite3
+import threading
+
+from async_migrator import AsyncPlaywrightToSchemaMigrator
+from llm_cache import LLMCache
+
+COMMAND = {"command": {"name": "Click", "fields": [{"name": "css_path", "value": "#go"}]}}
+
+
+def last_access(path, key):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT last_access FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_record_access_without_a_write_each(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = LLMCache(path=path)
+    cache.set("k", "map", COMMAND)
+    stored = last_access(path, "k")
+    changes = cache._conn.total_changes
+    for _ in range(10):
+        assert cache.get("k") == COMMAND
+    assert cache._conn.total_changes == changes
+    cache.flush()
+    assert last_access(path, "k") > stored
+    assert (cache.hits, cache.misses) == (10, 0)
+
+
+def test_reads_are_not_blocked_by_another_writer(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    LLMCache(path=path).set("k", "map", COMMAND)
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        assert LLMCache(path=path).get("k") == COMMAND
+    finally:
+        other.rollback()
+        other.close()
+
+
+def test_async_lookups_do_not_block_the_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    LLMCache(path=path).stats()
+    other = sqlite3.connect(path, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    # Another process's write transaction, released after a while
+    threading.Timer(0.5, other.rollback).start()
+    migrator = AsyncPlaywrightToSchemaMigrator(mapping_policy='llm-first', cache=LLMCache(path=path))
+
+    async def agenerate(prompt, schema=None):
+        return '{"command": {"name": "Click", "fields": [{"name": "css_path", "value": "#go"}]}}'
+
+    migrator._agenerate = agenerate
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.ensure_future(ticker())
+        command = await migrator.amap_to_schema_command({"action": "click", "selector": "#go", "description": "Go"})
+        ticking.cancel()
+        return command, ticks
+
+    command, ticks = asyncio.run(run())
+    # The loop kept running while the cache waited for the lock
+    assert ticks >= 20
+    assert command["command"]["name"] == "Click"
+    assert migrator.cache.stats()["entries"] == 1
+    other.close()
@@ -0,0 +1,76 @@
+from llm_cache import LLMCache
+from manifest import MigrationManifest, action_hash, diff_steps, diff_summary
+from playwright_to_schema_migrator import PlaywrightToSchemaMigrator
+
+SETTINGS = {"engine": "ast", "policy": "llm-only"}
+
+FILL = {"action": "fill", "selector": "#email", "value": "a@b.c", "description": "Fill #email"}
+CLICK = {"action": "click", "selector": "#submit", "value": "", "description": "Click #submit"}
+
+
+def command(name, selector):
+    return {"command": name, "target": selector, "value": ""}
+
+
+def schema(commands):
+    return [{"name": "login", "steps": [dict(step, order=i) for i, step in enumerate(commands, 1)]}]
+
+
+def test_action_hash_ignores_position():
+    assert action_hash(dict(FILL, line=3, column=5)) == action_hash(dict(FILL, line=40, column=1))
+    assert action_hash(FILL) != action_hash(dict(FILL, value="other"))
+
+
+def test_saved_manifest_is_reused(tmp_path):
+    path = tmp_path / "migration_manifest.json"
+    commands = [command("type", "#email"), command("click", "#submit")]
+    manifest = MigrationManifest(str(path), SETTINGS)
+    manifest.record("login.py", "sha-1", [action_hash(FILL), action_hash(CLICK)], commands, schema(commands))
+    manifest.save()
+
+    reloaded = MigrationManifest(str(path), SETTINGS)
+    assert reloaded.is_unchanged("login.py", "sha-1")
+    assert not reloaded.is_unchanged("login.py", "sha-2")
+    assert reloaded.reusable_commands("login.py") == {action_hash(FILL): commands[0], action_hash(CLICK): commands[1]}
+    assert reloaded.schema("login.py") == schema(commands)
+
+
+def test_changed_settings_discard_manifest(tmp_path):
+    path = tmp_path / "migration_manifest.json"
+    manifest = MigrationManifest(str(path), SETTINGS)
+    manifest.record("login.py", "sha-1", [action_hash(CLICK)], [command("click", "#submit")],
+                    schema([command("click", "#submit")]))
+    manifest.save()
+    assert MigrationManifest(str(path), dict(SETTINGS, policy="rules-first")).entry("login.py") is None
+
+
+def test_record_diffs_against_previous_run(tmp_path):
+    manifest = MigrationManifest(str(tmp_path / "m.json"), SETTINGS)
+    first = [command("click", "#submit")]
+    manifest.record("login.py", "sha-1", [action_hash(CLICK)], first, schema(first))
+    # A new action before the click is one added step, not a renumbered click
+    second = [command("type", "#email"), command("click", "#submit")]
+    diff = manifest.record("login.py", "sha-2", [action_hash(FILL), action_hash(CLICK)], second, schema(second))
+    assert diff_summary(diff) == {"added": 1, "removed": 0, "modified": 0}
+
+
+def test_replaced_actions_are_modified_only_when_the_command_changes():
+    old = [{"action": action_hash(FILL), "command": command("type", "#email")},
+           {"action": action_hash(CLICK), "command": command("click", "#submit")}]
+    # Both actions were edited; the fill still maps to the same command, the click doesn't
+    new = [{"action": action_hash(dict(FILL, description="Type email")), "command": command("type", "#email")},
+           {"action": action_hash(dict(CLICK, selector="#go")), "command": command("click", "#go")}]
+    diff = diff_steps(old, new)
+    assert diff_summary(diff) == {"added": 0, "removed": 0, "modified": 1}
+    assert diff["modified"][0]["after"] == command("click", "#go")
+
+
+def test_reused_actions_are_not_sent_to_the_llm():
+    migrator = PlaywrightToSchemaMigrator(mapping_policy='llm-only', cache=LLMCache(enabled=False))
+    prompts = []
+    migrator._generate = lambda prompt, schema=None: prompts.append(prompt) or ""
+    reused = command("type", "#email")
+    commands = migrator.map_actions([dict(FILL, line=7)], reuse={action_hash(FILL): reused})
+    assert prompts == []
+    assert migrator.stats["reused"] == 1
+    assert {key: value for key, value in commands[0].items() if key != "order"} == reused
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from result_cache import CachedResult, ResultCache
+
+
+def test_identical_requests_share_one_run():
+    cache = ResultCache(max_entries=8, ttl=60)
+    runs = []
+
+    async def run():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return CachedResult(b'{"schema": []}')
+
+    async def requests():
+        return await asyncio.gather(*(cache.get_or_run('key', run) for _ in range(5)))
+
+    results = asyncio.run(requests())
+    assert len(runs) == 1
+    assert sorted(source for _, source in results) == ['coalesced'] * 4 + ['miss']
+    assert len({entry.etag for entry, _ in results}) == 1
+    assert asyncio.run(cache.get_or_run('key', run))[1] == 'hit'
+
+
+def test_failures_reach_every_caller_and_are_not_cached():
+    cache = ResultCache(max_entries=8, ttl=60)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("backend down")
+
+    async def requests():
+        return await asyncio.gather(*(cache.get_or_run('key', fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(requests()))
+    assert len(cache) == 0
+
+
+def test_entries_expire_and_are_bounded():
+    cache = ResultCache(max_entries=2, ttl=60)
+
+    async def body():
+        return CachedResult(b'{}')
+
+    for key in ('a', 'b', 'c'):
+        asyncio.run(cache.get_or_run(key, body))
+    assert cache.get('a') is None and len(cache) == 2
+    cache.ttl = 0
+    assert cache.get('c') is None
+
+
+def test_cache_key_covers_settings_and_chunk_size():
+    key = ResultCache.make_key("page.goto('/')", None, {"policy": "rules-first"})
+    assert key == ResultCache.make_key("page.goto('/')", None, {"policy": "rules-first"})
+    assert key != ResultCache.make_key("page.goto('/')", 10, {"policy": "rules-first"})
+    assert key != ResultCache.make_key("page.goto('/')", None, {"policy": "llm-only"})
+
+
+class FakeMigrator:
+    """Counts migrations; the API only needs for_run(), amigrate_content() and migration_settings()"""
+
+    def __init__(self):
+        self.migrations = 0
+        self.stats = {}
+
+    def for_run(self):
+        return self
+
+    def migration_settings(self):
+        return {"policy": "rules-first"}
+
+    async def amigrate_content(self, script_content, chunk_size=None):
+        self.migrations += 1
+        self.stats = {"llm_calls": self.migrations}
+        return [{"name": "test", "description": script_content, "steps": []}]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    migrator = FakeMigrator()
+    monkeypatch.setattr(api, 'migrator', migrator)
+    monkeypatch.setattr(api, 'result_cache', ResultCache(max_entries=8, ttl=60))
+    # Not entered as a context manager, so the lifespan (and its OpenAI client) doesn't start
+    return TestClient(api.app), migrator
+
+
+def test_etag_answers_304(client):
+    client, migrator = client
+    first = client.post("/migrate/text", json={"code": "page.goto('https://example.com')"})
+    assert first.status_code == 200 and first.headers["x-cache"] == "miss"
+
+    second = client.post("/migrate/text", json={"code": "page.goto('https://example.com')"},
+                         headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 304
+    assert second.headers["x-cache"] == "hit"
+    assert migrator.migrations == 1
+
+    other = client.post("/migrate/text", json={"code": "page.goto('https://example.org')"},
+                        headers={"If-None-Match": first.headers["etag"]})
+    assert other.status_code == 200 and other.headers["etag"] != first.headers["etag"]
+
+
+def test_etag_ignores_per_run_stats_and_weak_prefix(client, monkeypatch):
+    client, migrator = client
+    # Nothing kept, so every request migrates again
+    monkeypatch.setattr(api, 'result_cache', ResultCache(max_entries=0, ttl=60))
+    first = client.post("/migrate/text", json={"code": "page.goto('https://example.com')"})
+    second = client.post("/migrate/text", json={"code": "page.goto('https://example.com')"})
+    assert first.json()["stats"] != second.json()["stats"]
+    assert first.headers["etag"] == second.headers["etag"]
+
+    weak = client.post("/migrate/text", json={"code": "page.goto('https://example.com')"},
+                       headers={"If-None-Match": '"other", W/' + first.headers["etag"]})
+    assert weak.status_code == 304
+    assert migrator.migrations == 3
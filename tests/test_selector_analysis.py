@@ -0,0 +1,104 @@
+import pytest
+
+from llm_cache import LLMCache
+from playwright_to_schema_migrator import PlaywrightToSchemaMigrator
+from selector_analysis import _css_element, _element, _literal, _split, analyze_selector
+
+CLASS = "[contains(concat(' ',normalize-space(@class),' '),' {} ')]"
+
+
+@pytest.mark.parametrize('selector, targets', [
+    ('#email', [('id', '#email'), ('css:finder', '#email'), ('xpath:attributes', "(//*[@id='email'])[1]")]),
+    ('#fieldName\\:TITLE', [('id', '#fieldName:TITLE'), ('css:finder', '#fieldName\\:TITLE'),
+                            ('xpath:attributes', "(//*[@id='fieldName:TITLE'])[1]")]),
+    ('input[name="email"]', [('name', 'email'), ('css:finder', 'input[name="email"]'),
+                             ('xpath:attributes', "(//input[@name='email'])[1]")]),
+    ('div.card.active', [('css:finder', 'div.card.active'),
+                         ('xpath:attributes', f"(//div{CLASS.format('card')}{CLASS.format('active')})[1]")]),
+    ('[data-testid="save"]', [('css:finder', '[data-testid="save"]'),
+                              ('xpath:attributes', "(//*[@data-testid='save'])[1]")]),
+    ('a:has-text("Sign in")', [('linkText', 'Sign in'), ('css:finder', 'a:has-text("Sign in")'),
+                               ('xpath:link', "(//a[contains(text(),'Sign in')])[1]"),
+                               ('xpath:innerText', "//a[contains(.,'Sign in')]")]),
+    ('role=button[name="Sign in"]', [('css:finder', 'role=button[name="Sign in"]'),
+                                     ('xpath:innerText', "//button[contains(.,'Sign in')]")]),
+    ('role=img[name="Logo"]', [('css:finder', 'role=img[name="Logo"]'), ('xpath:img', "(//img[@alt='Logo'])[1]")]),
+    ('text="Submit"', [('css:finder', 'text="Submit"'), ('xpath:innerText', "//*[text()[contains(.,'Submit')]]")]),
+    ('label="Email"', [('css:finder', 'label="Email"'),
+                       ('xpath:attributes', "(//*[@aria-label='Email' or @id=//label[contains(.,'Email')]/@for])[1]")]),
+    ('button >> has-text="OK"', [('css:finder', 'button >> has-text="OK"'),
+                                 ('xpath:innerText', "//button[contains(.,'OK')]")]),
+    ('button.primary >> nth=-1', [('css:finder', 'button.primary >> nth=-1'),
+                                  ('xpath:attributes', f"(//button{CLASS.format('primary')})[last()]")]),
+    # Scoped by ancestors or an earlier part of the chain: only an id is still unique
+    ('form#main input#q', [('id', '#q'), ('css:finder', 'form#main input#q')]),
+    ('form#main >> input >> nth=0', [('css:finder', 'form#main >> input >> nth=0')]),
+    # Constraints no target can express
+    ('input#q:visible', [('id', '#q'), ('css:finder', 'input#q:visible')]),
+    ('[name^="user"]', [('css:finder', '[name^="user"]')]),
+    ('a, b', [('css:finder', 'a, b')]),
+    ('//input[@id="email"]', [('id', '#email'), ('xpath:full', '//input[@id="email"]'),
+                              ('xpath:attributes', "(//*[@id='email'])[1]")]),
+    ("//form//input[@name='q']", [('xpath:full', "//form//input[@name='q']")]),
+    ('xpath=//button', [('xpath:full', '//button')]),
+    ('   ', []),
+])
+def test_analyze_selector(selector, targets):
+    assert list(analyze_selector(selector)) == targets
+
+
+@pytest.mark.parametrize('text, literal', [
+    ('abc', "'abc'"),
+    ("it's", '"it\'s"'),
+    ('it\'s "x"', 'concat(\'it\', "\'", \'s "x"\')'),
+])
+def test_literal(text, literal):
+    assert _literal(text) == literal
+
+
+@pytest.mark.parametrize('selector, separators, parts', [
+    ('a, b[x="1,2"], c(d, e)', ',', ['a', 'b[x="1,2"]', 'c(d, e)']),
+    ('form > input + label ~ span div', ' >+~', ['form', 'input', 'label', 'span', 'div']),
+    ("a[title='x > y'] b", ' >+~', ["a[title='x > y']", 'b']),
+])
+def test_split(selector, separators, parts):
+    assert _split(selector, separators) == parts
+
+
+@pytest.mark.parametrize('css, tag, classes, attributes, text, partial', [
+    ('input#email.wide[name="email"]', 'input', ['wide'], {'id': 'email', 'name': 'email'}, None, False),
+    ("*[type='submit']", None, [], {'type': 'submit'}, None, False),
+    ('button:text("Go")', 'button', [], {}, 'Go', False),
+    ('li:nth-child(2)', 'li', [], {}, None, True),
+    ('a[href*="docs"]', 'a', [], {}, None, True),
+])
+def test_css_element(css, tag, classes, attributes, text, partial):
+    element = _css_element(css)
+    assert (element.tag, element.classes, element.attributes, element.text, element.partial) == (
+        tag, classes, attributes, text, partial)
+
+
+def test_css_element_rejects_unparseable_compounds():
+    assert _css_element('input!') is None
+
+
+@pytest.mark.parametrize('selector, tag, attributes, text, nth, scoped', [
+    ('role=checkbox[name="Agree"]', 'input', {'type': 'checkbox'}, None, None, False),
+    ('role=tab[name="Billing"]', None, {'role': 'tab'}, 'Billing', None, False),
+    ('data-testid=save', None, {'data-testid': 'save'}, None, None, False),
+    ('ul >> li >> nth=2', 'li', {}, None, 2, True),
+    ('#menu >> visible=true', None, {'id': 'menu'}, None, None, False),
+])
+def test_element(selector, tag, attributes, text, nth, scoped):
+    element, is_scoped = _element(selector)
+    assert (element.tag, element.attributes, element.text, element.nth, is_scoped) == (tag, attributes, text, nth, scoped)
+
+
+def test_llm_mappings_get_targets():
+    migrator = PlaywrightToSchemaMigrator(mapping_policy='llm-first', cache=LLMCache(enabled=False))
+    migrator._generate = lambda prompt, schema=None: (
+        '{"command": {"name": "Type", "fields": [{"name": "css_path", "value": "#email"}, {"name": "value", "value": "x"}]}}')
+    command = migrator.map_to_schema_command({"action": "fill", "selector": "#email", "value": "x", "description": "Fill"})
+    css_path, value = command["command"]["fields"]
+    assert [target["type"] for target in css_path["targets"]] == ['id', 'css:finder', 'xpath:attributes']
+    assert "targets" not in value
@@ -0,0 +1,127 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from uploads import RequestSizeLimit, ScriptDecoder, UploadError, archive_kind, iter_archive
+
+SCRIPT = 'page.goto("https://example.com")  # café\n'
+
+
+def zip_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def tar_archive(members, symlinks=()):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        for name, target in symlinks:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            archive.addfile(info)
+    buffer.seek(0)
+    return buffer
+
+
+def test_decoder_handles_characters_split_across_chunks():
+    decoder = ScriptDecoder('test_x.py', max_bytes=1024)
+    data = SCRIPT.encode('utf-8')
+    split = data.index('é'.encode('utf-8')) + 1
+    decoder.feed(data[:split])
+    decoder.feed(data[split:])
+    assert decoder.text() == SCRIPT
+
+
+def test_decoder_rejects_oversized_and_non_utf8_scripts():
+    with pytest.raises(UploadError) as error:
+        ScriptDecoder('big.py', max_bytes=10).feed(b'x' * 11)
+    assert error.value.status_code == 413
+    with pytest.raises(UploadError) as error:
+        ScriptDecoder('latin1.py').feed('café'.encode('latin-1') + b'\n')
+    assert error.value.status_code == 400
+
+
+def test_archive_kind():
+    assert archive_kind(zip_archive({'test_a.py': SCRIPT})) == 'zip'
+    assert archive_kind(tar_archive({'test_a.py': SCRIPT.encode('utf-8')})) == 'tar'
+    assert archive_kind(io.BytesIO(SCRIPT.encode('utf-8'))) is None
+
+
+@pytest.mark.parametrize('make', [zip_archive, lambda members: tar_archive(
+    {name: data.encode('utf-8') if isinstance(data, str) else data for name, data in members.items()})])
+def test_archive_members_are_matched_and_checked(make):
+    members = iter_archive(make({
+        'suite/test_login.py': SCRIPT,
+        'suite/helpers.py': SCRIPT,
+        'suite/test_big.py': 'x' * 2048,
+        'suite/test_binary.py': b'\xff\xfe\x00',
+    }), max_script_bytes=1024)
+    results = {member['name']: member for member in members}
+    assert set(results) == {'suite/test_login.py', 'suite/test_big.py', 'suite/test_binary.py'}
+    assert results['suite/test_login.py']['code'] == SCRIPT
+    assert 'larger than' in results['suite/test_big.py']['error']
+    assert 'not UTF-8' in results['suite/test_binary.py']['error']
+
+
+def test_archive_limits():
+    archive = zip_archive({f'test_{i}.py': SCRIPT for i in range(3)})
+    with pytest.raises(UploadError) as error:
+        list(iter_archive(archive, max_files=2))
+    assert error.value.status_code == 413
+
+    archive = zip_archive({f'test_{i}.py': 'x' * 600 for i in range(3)})
+    with pytest.raises(UploadError) as error:
+        list(iter_archive(archive, max_bytes=1000))
+    assert error.value.status_code == 413
+
+
+def test_archive_paths_are_never_extracted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'inner').mkdir()
+    monkeypatch.chdir(tmp_path / 'inner')
+    archive = tar_archive({'../test_escape.py': SCRIPT.encode('utf-8'), '/tmp/test_absolute.py': SCRIPT.encode('utf-8')},
+                          symlinks=[('test_passwd.py', '/etc/passwd')])
+    members = list(iter_archive(archive))
+    # Names are only labels for the results; links aren't followed and nothing is written
+    assert [member['name'] for member in members] == ['../test_escape.py', '/tmp/test_absolute.py']
+    assert all(member['code'] == SCRIPT for member in members)
+    assert sorted(os.listdir(tmp_path)) == ['inner'] and os.listdir(tmp_path / 'inner') == []
+
+
+def test_corrupt_archive():
+    with pytest.raises(UploadError):
+        list(iter_archive(io.BytesIO(b'PK\x03\x04' + b'\x00' * 100)))
+
+
+@pytest.fixture
+def limited_client():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(RequestSizeLimit, max_bytes=100)
+    return TestClient(app)
+
+
+def test_request_size_limit(limited_client):
+    assert limited_client.post("/echo", content=b'x' * 100).json() == {"size": 100}
+    assert limited_client.post("/echo", content=b'x' * 101).status_code == 413
+    # Chunked, without a Content-Length to check up front
+    chunked = limited_client.post("/echo", content=iter([b'x' * 60, b'x' * 60]))
+    assert chunked.status_code == 413
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import codecs
+import fnmatch
+import os
+import posixpath
+import tarfile
+import zipfile
+from typing import IO, Any, Dict, Iterator, Optional, Sequence
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from bulk_migrator import DEFAULT_PATTERNS
+
+_MB = 2 ** 20
+
+# Largest request body the API reads, archives included
+DEFAULT_MAX_REQUEST_BYTES = int(float(os.getenv('API_MAX_REQUEST_MB', '50')) * _MB)
+# Largest script, uploaded on its own or inside an archive
+DEFAULT_MAX_SCRIPT_BYTES = int(float(os.getenv('API_MAX_SCRIPT_MB', '5')) * _MB)
+# Most scripts, and most decompressed script bytes, taken from one archive
+DEFAULT_MAX_ARCHIVE_FILES = int(os.getenv('API_MAX_ARCHIVE_FILES', '1000'))
+DEFAULT_MAX_ARCHIVE_BYTES = int(float(os.getenv('API_MAX_ARCHIVE_MB', '200')) * _MB)
+
+# Bytes read from an upload or archive member at a time
+READ_CHUNK = 64 * 1024
+
+
+class UploadError(Exception):
+    """An upload that can't be migrated, with the HTTP status to answer it with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _too_large(name: str, limit: int) -> UploadError:
+    return UploadError(f"{name} is larger than {limit / _MB:g} MB", status_code=413)
+
+
+class ScriptDecoder:
+    """UTF-8 decoding of a script fed in chunks, failing as soon as it grows past `max_bytes`.
+
+    Only the decoded text is kept, never the whole undecoded upload.
+    """
+
+    def __init__(self, name: str, max_bytes: Optional[int] = None):
+        self.name = name
+        self.max_bytes = DEFAULT_MAX_SCRIPT_BYTES if max_bytes is None else max_bytes
+        self.size = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._parts = []
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise _too_large(self.name, self.max_bytes)
+        try:
+            self._parts.append(self._decoder.decode(chunk))
+        except UnicodeDecodeError as e:
+            raise UploadError(f"{self.name} is not UTF-8 text: {e}")
+
+    def text(self) -> str:
+        try:
+            self._parts.append(self._decoder.decode(b'', final=True))
+        except UnicodeDecodeError as e:
+            raise UploadError(f"{self.name} is not UTF-8 text: {e}")
+        text = ''.join(self._parts)
+        self._parts = []
+        return text
+
+
+async def read_script(file: UploadFile, max_bytes: Optional[int] = None) -> str:
+    """The text of an uploaded script, read and decoded chunk by chunk"""
+    if archive_kind(file.file) is not None:
+        raise UploadError(f"{file.filename} is an archive; upload it to /migrate/archive or /jobs/files")
+    decoder = ScriptDecoder(file.filename or 'upload', max_bytes)
+    while True:
+        chunk = await file.read(READ_CHUNK)
+        if not chunk:
+            return decoder.text()
+        decoder.feed(chunk)
+
+
+def _read_member(stream: IO[bytes], name: str, max_bytes: int) -> ScriptDecoder:
+    decoder = ScriptDecoder(name, max_bytes)
+    while True:
+        # Never more than the limit allows, whatever size the archive claims the member has
+        chunk = stream.read(min(READ_CHUNK, decoder.max_bytes - decoder.size + 1))
+        if not chunk:
+            return decoder
+        decoder.feed(chunk)
+
+
+def archive_kind(fileobj: IO[bytes]) -> Optional[str]:
+    """'zip' or 'tar' (possibly gzip, bzip2 or xz compressed) from the file's first bytes, else None"""
+    position = fileobj.tell()
+    head = fileobj.read(512)
+    fileobj.seek(position)
+    if head.startswith((b'PK\x03\x04', b'PK\x05\x06')):
+        return 'zip'
+    if head.startswith((b'\x1f\x8b', b'BZh', b'\xfd7zXZ\x00')) or head[257:262] == b'ustar':
+        return 'tar'
+    return None
+
+
+def iter_archive(fileobj: IO[bytes], patterns: Sequence[str] = DEFAULT_PATTERNS,
+                 max_files: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_script_bytes: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """The test scripts in a zip or tar archive, one at a time, in archive order.
+
+    Members are matched by file name against `patterns`, as directories are by the bulk migrator.
+    Each yields {"name", "code"}, or {"name", "error"} if it is too large or not UTF-8 text. Tar
+    archives are read as a stream; zip members are decompressed one at a time. Going over
+    `max_files` or `max_bytes` of scripts ends the archive with an UploadError.
+    """
+    max_files = DEFAULT_MAX_ARCHIVE_FILES if max_files is None else max_files
+    max_bytes = DEFAULT_MAX_ARCHIVE_BYTES if max_bytes is None else max_bytes
+    max_script_bytes = DEFAULT_MAX_SCRIPT_BYTES if max_script_bytes is None else max_script_bytes
+    kind = archive_kind(fileobj)
+    if kind is None:
+        raise UploadError("Not a zip or tar archive")
+
+    files = 0
+    total = 0
+
+    def member(name: str, stream: IO[bytes]) -> Dict[str, Any]:
+        nonlocal files, total
+        files += 1
+        if files > max_files:
+            raise UploadError(f"Archive has more than {max_files} scripts", status_code=413)
+        limit = min(max_script_bytes, max_bytes - total)
+        try:
+            decoder = _read_member(stream, name, limit)
+            code = decoder.text()
+        except UploadError as e:
+            if e.status_code == 413 and limit < max_script_bytes:
+                # What's left of the archive's budget ran out, not the script's own limit
+                raise _too_large("Archive", max_bytes)
+            return {"name": name, "error": str(e)}
+        total += decoder.size
+        return {"name": name, "code": code}
+
+    def matches(name: str) -> bool:
+        return any(fnmatch.fnmatch(posixpath.basename(name), pattern) for pattern in patterns)
+
+    try:
+        if kind == 'zip':
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and matches(info.filename):
+                        with archive.open(info) as stream:
+                            yield member(info.filename, stream)
+        else:
+            with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+                for info in archive:
+                    if info.isfile() and matches(info.name):
+                        yield member(info.name, archive.extractfile(info))
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        raise UploadError(f"Unreadable {kind} archive: {e}")
+
+
+class RequestSizeLimit:
+    """ASGI middleware answering 413 to requests whose body is larger than `max_bytes`.
+
+    A declared Content-Length is checked before anything is read; chunked bodies are counted as
+    they arrive and cut off once they pass the limit.
+    """
+
+    def __init__(self, app, max_bytes: Optional[int] = None):
+        self.app = app
+        self.max_bytes = DEFAULT_MAX_REQUEST_BYTES if max_bytes is None else max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        detail = f"Request body is larger than {self.max_bytes / _MB:g} MB"
+        length = dict(scope['headers']).get(b'content-length')
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    # FastAPI passes HTTPExceptions raised while it reads the body on as they are
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)